@@ -0,0 +1,129 @@
+# amazon_urls.py
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse, parse_qsl, unquote_plus
+
+PRODUCT = "product"
+SEARCH  = "search"
+OTHER   = "other"
+
+# Submission country (main.VALID_COUNTRIES) -> Amazon marketplace
+COUNTRY_MARKETPLACES = {
+    "US":  "amazon.com",
+    "UK":  "amazon.co.uk",
+    "CAN": "amazon.ca",
+    "AUS": "amazon.com.au",
+    "DE":  "amazon.de",
+    "UAE": "amazon.ae",
+}
+
+# Tracking parameters: they never change what a page shows, so they are dropped.
+# Everything else is kept as submitted.
+_TRACKING_PARAMS = {
+    "ref", "ref_", "qid", "sr", "crid", "sprefix", "dib", "dib_tag", "_encoding",
+    "content-id", "tag", "linkCode", "linkId", "ascsubtag",
+}
+_TRACKING_PREFIXES = ("pd_rd_", "pf_rd_")
+
+
+class AmazonUrl(NamedTuple):
+    kind: str            # PRODUCT / SEARCH / OTHER
+    marketplace: str     # "amazon.com", "amazon.co.uk", ... ("" for non-Amazon URLs)
+    asin: Optional[str]  # product ASIN (PRODUCT only)
+    keyword: str         # normalized search keyword (k=), "" if none
+    url: str             # canonical URL: https://<host>/dp/<ASIN> or https://<host>/s?k=...
+
+
+_ASIN_PATTERNS = [
+    re.compile(r"/dp/([A-Z0-9]{10})(?:[/?]|$)", re.I),
+    re.compile(r"/gp/product/([A-Z0-9]{10})(?:[/?]|$)", re.I),
+    re.compile(r"[?&]asin=([A-Z0-9]{10})(?:[&#]|$)", re.I),
+]
+
+
+def extract_asin_from_url(url: str) -> Optional[str]:
+    if not url:
+        return None
+    for rx in _ASIN_PATTERNS:
+        m = rx.search(url)
+        if m:
+            return m.group(1).upper()
+    return None
+
+
+def normalize_keyword(keyword: str) -> str:
+    return re.sub(r"\s+", " ", (keyword or "").strip().lower())
+
+
+def _is_tracking(param: str) -> bool:
+    return param in _TRACKING_PARAMS or param.startswith(_TRACKING_PREFIXES)
+
+
+def parse(url: str) -> AmazonUrl:
+    """
+    Split an Amazon URL into marketplace / ASIN / keyword and its canonical
+    form. Product URLs become /dp/<ASIN>; search and category URLs lose their
+    tracking parameters and /ref= path segment, everything else (including
+    the case of k=) is kept. A search URL without k= (e.g. the old
+    field-keywords form) is returned unchanged, since its keyword can't be
+    identified. Non-Amazon URLs pass through.
+    """
+    raw = (url or "").strip()
+    u = urlparse(raw)
+    host = (u.hostname or "").lower()
+    if "amazon." not in host:
+        return AmazonUrl(OTHER, "", None, "", raw)
+    marketplace = host[4:] if host.startswith("www.") else host
+
+    asin = extract_asin_from_url(raw)
+    if asin:
+        return AmazonUrl(PRODUCT, marketplace, asin, "", f"https://{host}/dp/{asin}")
+
+    # filter the raw "name=value" pairs so kept ones stay byte-for-byte as submitted
+    pairs = [p for p in u.query.split("&") if p and not _is_tracking(unquote_plus(p.split("=", 1)[0]))]
+    pairs.sort(key=lambda p: not p.startswith("k="))  # stable: "k" first, the rest in submitted order
+    keyword = normalize_keyword(dict(parse_qsl(u.query)).get("k", ""))
+    path = re.sub(r"/ref=[^/]*$", "", u.path).rstrip("/") or "/"
+    kind = SEARCH if path == "/s" else OTHER
+    if kind == SEARCH and not keyword:
+        return AmazonUrl(SEARCH, marketplace, None, "", raw)
+    query = "&".join(pairs)
+    return AmazonUrl(
+        kind,
+        marketplace,
+        None,
+        keyword,
+        f"https://{host}{path}" + (f"?{query}" if query else ""),
+    )
+
+
+def canonical_url(url: str) -> str:
+    return parse(url).url
+
+
+def asin_of(url: str) -> Optional[str]:
+    return parse(url).asin
+
+
+def product_key(url: str) -> Optional[str]:
+    """'<marketplace>:<ASIN>' (the same ASIN differs per marketplace), or None without an ASIN."""
+    p = parse(url)
+    return f"{p.marketplace}:{p.asin}" if p.asin else None
+
+
+def page_key(url: str) -> str:
+    """Canonical URL without scheme/www, so the same page always maps to the same key."""
+    p = parse(url)
+    if not p.marketplace:
+        return p.url
+    return p.marketplace + p.url.split(p.marketplace, 1)[1]
+
+
+def marketplace_for(*, url: str = "", country: str = "") -> str:
+    """Marketplace of an Amazon URL, else of a submission country; amazon.com if neither says."""
+    return parse(url).marketplace or COUNTRY_MARKETPLACES.get((country or "").strip().upper(), "amazon.com")
+
+
+def on_marketplace(url: str, marketplace: str) -> bool:
+    """True if url is a page of that marketplace (www. or not; amazon.com doesn't match amazon.com.au)."""
+    return bool(marketplace) and parse(url).marketplace == marketplace
@@ -0,0 +1,170 @@
+# browser_session.py
+import os, threading
+
+from helium_boot import ensure_chrome, connect_cdp, disconnect_cdp, shutdown_chrome, send_xray_open, wait_for_results_tab
+from stage_graph import StageRunner
+
+# Recycle Chrome after this many products even if it looks healthy (memory creep, stale extension state)
+SESSION_MAX_PRODUCTS = int(os.getenv("BROWSER_RECYCLE_AFTER", "25"))
+
+
+class BrowserSession:
+    """
+    Long-lived Playwright driver + CDP connection to one Chrome instance.
+
+    The driver, CDP connection and Chrome process stay warm across products and
+    payloads; the browser is only recycled when a health check fails, when a
+    caller asks for it (e.g. XRAY not detected), or after `max_products`.
+
+    Playwright's sync API is bound to the thread that started it, so a session
+    must only be used from its owner thread (see `get_session`).
+    """
+
+    def __init__(
+        self,
+        *,
+        chrome_path: str,
+        user_data_dir: str,
+        profile_dir: str = "Default",
+        ext_id: str,
+        cdp_port: int = 28000,
+        max_products: int = SESSION_MAX_PRODUCTS,
+    ):
+        self.chrome_path = chrome_path
+        self.user_data_dir = user_data_dir
+        self.profile_dir = profile_dir
+        self.ext_id = ext_id
+        self.cdp_port = cdp_port
+        self.max_products = max_products
+
+        self.pw = None
+        self.browser = None
+        self.ctx = None
+        self.products_served = 0
+        self._keeper = None  # blank tab that keeps the Chrome window alive between products
+        self._runner = None  # StageRunner lanes attached to this Chrome (see stage_runner())
+
+    # ---------- lifecycle ----------
+    def is_healthy(self) -> bool:
+        if not (self.pw and self.browser and self.ctx):
+            return False
+        try:
+            if not self.browser.is_connected():
+                return False
+            _ = self.ctx.pages  # raises if the context is gone
+            return True
+        except Exception:
+            return False
+
+    def start(self):
+        self.cdp_port = ensure_chrome(
+            chrome_path=self.chrome_path,
+            user_data_dir=self.user_data_dir,
+            profile_dir=self.profile_dir,
+            cdp_port=self.cdp_port,
+        )
+        self.pw, self.browser, self.ctx = connect_cdp(self.cdp_port)
+        self.products_served = 0
+        self._keeper = None
+        print(f"[SESSION] Connected to Chrome on {self.cdp_port}")
+
+    def ensure(self):
+        """Connect if needed; recycle if unhealthy or past the product budget."""
+        if self.pw is not None and not self.is_healthy():
+            self.recycle("health check failed")
+        elif self.pw is not None and self.max_products and self.products_served >= self.max_products:
+            self.recycle(f"served {self.products_served} products")
+        if self.pw is None:
+            self.start()
+
+    def stage_runner(self) -> StageRunner:
+        """Stage lanes for this Chrome; created once and kept warm like the session itself."""
+        if self._runner is None or self._runner.cdp_port != self.cdp_port:
+            if self._runner is not None:
+                self._runner.close()
+            self._runner = StageRunner(self.cdp_port)
+        return self._runner
+
+    def release(self):
+        """Disconnect the driver but leave Chrome (and its keeper tab) running for the next connect."""
+        if self._runner is not None:
+            self._runner.close()
+            self._runner = None
+        disconnect_cdp(self.pw, self.browser, self.ctx)
+        self.pw = self.browser = self.ctx = self._keeper = None
+
+    def recycle(self, reason: str = ""):
+        """Close every tab, shut Chrome down (debug port closed) and disconnect; next ensure() relaunches."""
+        print(f"[SESSION] Recycling browser{': ' + reason if reason else ''}")
+        try:
+            for p in list(self.ctx.pages):
+                try: p.close()
+                except Exception: pass
+        except Exception:
+            pass
+        shutdown_chrome(self.browser, self.cdp_port)
+        self.release()
+
+    # ---------- per-product ----------
+    def _reset_tabs(self):
+        """Close everything except one blank keeper tab."""
+        keeper = self._keeper
+        try:
+            if keeper is None or keeper.is_closed():
+                keeper = self.ctx.new_page()
+        except Exception:
+            keeper = self.ctx.new_page()
+        self._keeper = keeper
+        for p in list(self.ctx.pages):
+            if p is keeper:
+                continue
+            try: p.close()
+            except Exception: pass
+
+    def prepare(self):
+        """Make sure the session is live and clear leftover tabs. Returns (browser, context)."""
+        self.ensure()
+        self._reset_tabs()
+        return self.browser, self.ctx
+
+    def open_xray(self, target_url: str, *, wait_secs: int = 60, popup_visible: bool = False, country: str = ""):
+        """
+        Make sure the session is live, clear leftover tabs and have Helium open
+        target_url with XRAY (results tab looked for on target_url's marketplace,
+        else `country`'s). Returns (browser, context, target_page).
+        """
+        self.prepare()
+        send_xray_open(self.ctx, ext_id=self.ext_id, target_url=target_url, popup_visible=popup_visible)
+        page = wait_for_results_tab(self.ctx, wait_secs=wait_secs, target_url=target_url, country=country)
+        return self.browser, self.ctx, page
+
+    def finish_product(self):
+        """Close the product's tabs but keep the driver/CDP connection warm."""
+        self.products_served += 1
+        try:
+            self._reset_tabs()
+        except Exception as e:
+            print(f"[SESSION] Tab cleanup failed ({e}); will recycle on next product")
+            self.recycle("tab cleanup failed")
+
+
+# ---------------------------
+# Per-thread sessions
+# ---------------------------
+_local = threading.local()
+
+
+def get_session(**kwargs) -> BrowserSession:
+    """Return this thread's session, creating it on first use (kwargs go to BrowserSession)."""
+    sess = getattr(_local, "session", None)
+    if sess is None:
+        sess = _local.session = BrowserSession(**kwargs)
+    return sess
+
+
+def release_session():
+    """Disconnect this thread's session (Chrome keeps running for the next thread)."""
+    sess = getattr(_local, "session", None)
+    if sess is not None:
+        sess.release()
+        _local.session = None
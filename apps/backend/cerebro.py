@@ -77,8 +77,7 @@
 
 from playwright.sync_api import TimeoutError as PwTimeout
 import os, time
-
-CEREBRO_PATH_FRAGMENT = "cerebro/index-extension"
+from tab_tracker import track_tabs, CEREBRO_PATH_FRAGMENT
 
 def open_amazon_page(ctx, url: str, wait_until: str = "domcontentloaded"):
     """Open an Amazon product page in the existing context and return the Page."""
@@ -87,65 +86,30 @@ def open_amazon_page(ctx, url: str, wait_until: str = "domcontentloaded"):
     pg.bring_to_front()
     return pg
 
-def _wait_for_url_contains(page, needle: str, timeout_ms: int = 30000):
-    page.wait_for_url(lambda u: needle in str(u), timeout=timeout_ms)
-
 def open_cerebro_from_xray(browser, amazon_page, asin: str, timeout_s: int = 60):
     """
     Clicks the Cerebro link on the product page and returns the Cerebro Page.
-    Handles both popup (new tab) and same-tab navigation.
+    Handles both popup (new tab) and same-tab navigation: whichever tab reaches
+    Cerebro first after the click wins (tab_tracker events, no polling).
     """
     link_sel = f'a[href*="{CEREBRO_PATH_FRAGMENT}?asin={asin}"]'
     cerebro_link = amazon_page.locator(link_sel)
     cerebro_link.wait_for(state="visible", timeout=20_000)
 
-    new_tab = None
+    tracker = track_tabs(amazon_page.context)
+    with tracker.expect(lambda url: CEREBRO_PATH_FRAGMENT in url) as found:
+        cerebro_link.click()
+    tab = found.wait(timeout_s)
+    if tab is None:
+        for pg in tracker.tabs():
+            print(" - open page:", pg.url)
+        raise RuntimeError("Cerebro tab not detected after clicking the XRAY link.")
     try:
-        with amazon_page.expect_popup(timeout=8_000) as popup_info:
-            cerebro_link.click()
-        new_tab = popup_info.value
+        tab.wait_for_load_state("domcontentloaded", timeout=15_000)
     except PwTimeout:
-        # Likely same-tab navigation
-        cerebro_link.click()
-
-    if new_tab:
-        try:
-            new_tab.wait_for_load_state("domcontentloaded", timeout=15_000)
-        except PwTimeout:
-            pass
-        try:
-            _wait_for_url_contains(new_tab, CEREBRO_PATH_FRAGMENT, timeout_ms=20_000)
-        except PwTimeout:
-            # last resort: scan all pages
-            candidates = [pg for c in browser.contexts for pg in c.pages
-                          if CEREBRO_PATH_FRAGMENT in pg.url]
-            if candidates:
-                new_tab = candidates[-1]
-            else:
-                # dump open pages for debugging
-                for c in browser.contexts:
-                    for pg in c.pages:
-                        print(" - open page:", pg.url)
-                raise RuntimeError("Cerebro tab not found after popup.")
-        new_tab.bring_to_front()
-        return new_tab
-    else:
-        # same-tab
-        try:
-            _wait_for_url_contains(amazon_page, CEREBRO_PATH_FRAGMENT, timeout_ms=timeout_s * 1000)
-            amazon_page.bring_to_front()
-            return amazon_page
-        except PwTimeout:
-            candidates = [pg for c in browser.contexts for pg in c.pages
-                          if CEREBRO_PATH_FRAGMENT in pg.url]
-            if candidates:
-                tab = candidates[-1]
-                tab.bring_to_front()
-                return tab
-            for c in browser.contexts:
-                for pg in c.pages:
-                    print(" - open page:", pg.url)
-            raise RuntimeError("Cerebro page not detected in same-tab or elsewhere.")
+        pass
+    tab.bring_to_front()
+    return tab
 
 def cerebro_search(cerebro_page, keyword: str):
     """Type the keyword in Cerebro and wait for results to be ready."""
@@ -1,26 +1,17 @@
 # competitors.py
-import os, re, time
+import os, re
 from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any
 
 from playwright.sync_api import Browser, Page
-from csv_picker import find_top_recent_product
+from csv_picker import find_top_recent_product, PICKER_COLUMNS
+from xray_capture import captured_rows
+from xray_registry import find_xray_page
+from page_extract import read_total_revenue
+from selector_cache import try_strategies
 
 
 # ---------- helpers ----------
-def _find_xray_page(browser: Browser, timeout_ms: int = 1500) -> Optional[Page]:
-    """Return the Amazon tab that actually has the XRAY overlay text visible."""
-    for ctx in browser.contexts:
-        for pg in ctx.pages:
-            if "amazon." not in pg.url:
-                continue
-            try:
-                pg.get_by_text("Xray", exact=False).first.wait_for(timeout=timeout_ms)
-                return pg
-            except Exception:
-                pass
-    return None
-
 def _click_like_a_human_then_programmatic(page: Page, loc) -> bool:
     """Try normal click, then JS click if needed. Return True if clicked."""
     try:
@@ -40,115 +31,45 @@ def _click_like_a_human_then_programmatic(page: Page, loc) -> bool:
             return False
     return False
 
-def _extract_total_revenue(page: Page) -> Tuple[str, str]:
-    """Find the 'Total Revenue' label and extract the nearest numeric value."""
-    label = page.get_by_text("Total Revenue", exact=True).first
-    label.wait_for(timeout=5000)
-    el = label.element_handle()
-    if not el:
-        raise RuntimeError("Couldn't get handle for 'Total Revenue' label.")
-
-    value_text = page.evaluate(
-        """
-        (labelEl) => {
-          function findValueWithin(root) {
-            const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
-            while (walker.nextNode()) {
-              const n = walker.currentNode;
-              const txt = (n.innerText || "").trim();
-              if (!txt) continue;
-              if (/^\\$?\\s*\\d[\\d,]*(?:\\.\\d+)?$/.test(txt) && !/total\\s*revenue/i.test(txt)) {
-                return txt;
-              }
-            }
-            return null;
-          }
-          let root = labelEl.parentElement;
-          for (let i = 0; i < 5 && root; i++) {
-            const val = findValueWithin(root);
-            if (val) return val;
-            root = root.parentElement;
-          }
-          return null;
-        }
-        """,
-        el
-    )
-    if not value_text:
-        raise RuntimeError("Couldn't locate the Total Revenue value near the label.")
-    value_text = re.sub(r"\s+", " ", value_text).strip()
-    number_only = re.sub(r"[^0-9.]", "", value_text)
-    return value_text, number_only
-
 
 # ---------- main function ----------
-def run_competitors_flow(
-    browser: Browser,
-    *,
-    download_dir: str = r"E:\automation\exports",
-    max_input_visible_index: int = 7,   # 8th visible "Max" input
-    max_value: str = "1000",
-    title_keyword: str = "candy",
-    wait_after_apply_ms: int = 8000,
-    picker_within_years: int = 2,
-    try_read_updated_revenue: bool = True
-) -> Dict[str, Any]:
-    """
-    Uses an existing Playwright Browser to:
-      1) find the XRAY page
-      2) open Filters
-      3) set the Nth visible 'Max' input to max_value
-      4) set Title Keyword Search to `title_keyword`
-      5) Apply Filters and wait
-      6) Export -> CSV (native download or response-sniff fallback)
-      7) Run csv_picker.find_top_recent_product on the CSV
-      8) (optional) read updated 'Total Revenue' again
-
-    Returns a dict with keys:
-      {
-        "downloaded_path": <str | None>,
-        "picker_best": <dict | None>,
-        "updated_total_revenue_text": <str | None>,
-        "updated_total_revenue_number": <str | None>
-      }
-    """
-    # 1) locate XRAY page
-    page = _find_xray_page(browser, timeout_ms=1200)
-    if not page:
-        raise RuntimeError("XRAY not detected on any Amazon tab.")
-    page.bring_to_front()
-    page.wait_for_timeout(400)
-
-
-    # 5) EXPORT -> CSV
+def _export_xray_csv(page: Page, download_dir: str) -> Optional[str]:
+    """Export -> CSV (native download or response-sniff fallback); returns the saved path."""
     os.makedirs(download_dir, exist_ok=True)
-    export_btn = page.get_by_role("button", name=re.compile(r"\bExport\b", re.I))
-    try:
-        export_btn.click(timeout=2000)
-    except Exception:
+    def open_by_role():
+        page.get_by_role("button", name=re.compile(r"\bExport\b", re.I)).click(timeout=2000)
+
+    def open_by_css():
         page.locator("button:has-text('Export'), .sc-eoEtVK:has-text('Export')").first.evaluate("el=>el.click()")
+
+    try_strategies("xray_export.open", [("role", open_by_role), ("css", open_by_css)])
     print("[INFO] Export menu opened.")
 
-    menu_root = page.locator("div.sc-eWhHU").filter(has=page.locator("div.sc-brSOsn")).first
-    try:
+    # CSV tile: inside the export menu, anywhere on the page, or by text (last working one first)
+    def tile_in_menu():
+        menu_root = page.locator("div.sc-eWhHU").filter(has=page.locator("div.sc-brSOsn")).first
         menu_root.wait_for(timeout=5000)
-    except Exception:
-        menu_root = None
-        print("[WARN] .sc-eWhHU not visible; searching CSV tile globally.")
+        tile = menu_root.locator("div.sc-brSOsn", has_text=re.compile(r"CSV", re.I)).first
+        tile.wait_for(state="visible", timeout=2000)
+        return tile
 
-    csv_tile = None
-    try:
-        if menu_root:
-            csv_tile = menu_root.locator("div.sc-brSOsn", has_text=re.compile(r"CSV", re.I)).first
-            csv_tile.wait_for(state="visible", timeout=2000)
-        else:
-            csv_tile = page.locator("div.sc-brSOsn", has_text=re.compile(r"CSV", re.I)).first
-            csv_tile.wait_for(state="visible", timeout=3000)
-    except Exception:
-        csv_tile = page.locator(
+    def tile_global():
+        tile = page.locator("div.sc-brSOsn", has_text=re.compile(r"CSV", re.I)).first
+        tile.wait_for(state="visible", timeout=3000)
+        return tile
+
+    def tile_by_text():
+        tile = page.locator(
             ":is(div,button,span,a):has-text('as a CSV file'), :is(div,button,span,a):has-text('CSV')"
         ).first
-        csv_tile.wait_for(state="visible", timeout=3000)
+        tile.wait_for(state="visible", timeout=3000)
+        return tile
+
+    _, csv_tile = try_strategies("xray_export.csv_tile", [
+        ("menu", tile_in_menu),
+        ("tile", tile_global),
+        ("text", tile_by_text),
+    ])
 
     # print("found csv tile")
     downloaded_path = None
@@ -208,27 +129,83 @@ def run_competitors_flow(
         with open(downloaded_path, "wb") as f:
             f.write(body)
         print(f"[success] Saved CSV via response sniffing: {downloaded_path}")
+    return downloaded_path
 
-    # 6) Pick best product from CSV
+
+def run_competitors_flow(
+    browser: Browser,
+    *,
+    download_dir: str = r"E:\automation\exports",
+    max_input_visible_index: int = 7,   # 8th visible "Max" input
+    max_value: str = "1000",
+    title_keyword: str = "candy",
+    wait_after_apply_ms: int = 8000,
+    picker_within_years: int = 2,
+    try_read_updated_revenue: bool = True,
+    page: Optional[Page] = None
+) -> Dict[str, Any]:
+    """
+    Uses an existing Playwright Browser to:
+      1) find the XRAY page (or use `page` when the caller already knows the tab)
+      2) open Filters
+      3) set the Nth visible 'Max' input to max_value
+      4) set Title Keyword Search to `title_keyword`
+      5) Apply Filters and wait
+      6) Pick the best recent product from the XRAY rows captured off the
+         network; fall back to Export -> CSV + csv_picker.find_top_recent_product
+      7) (optional) read updated 'Total Revenue' again
+
+    Returns a dict with keys:
+      {
+        "downloaded_path": <str | None>,
+        "picker_best": <dict | None>,
+        "source": "network" | "csv" | None,
+        "updated_total_revenue_text": <str | None>,
+        "updated_total_revenue_number": <str | None>
+      }
+    """
+    # 1) locate XRAY page
+    page = page or find_xray_page(browser, timeout_ms=1200)
+    if not page:
+        raise RuntimeError("XRAY not detected on any Amazon tab.")
+    page.bring_to_front()
+    page.wait_for_timeout(400)
+
+
+    # 5) Network capture first: pick from XRAY's own JSON responses (no export round-trip)
+    downloaded_path = None
     picker_best = None
-    if downloaded_path:
-        picker_best = find_top_recent_product(downloaded_path, title_keyword, within_years=picker_within_years)
-        if not picker_best:
-            print("[INFO] No qualifying product found in CSV.")
+    source = None
+    rows = captured_rows(page, required=PICKER_COLUMNS)
+    if rows:
+        source = "network"
+        picker_best = find_top_recent_product(rows, title_keyword, within_years=picker_within_years)
+        print(f"[INFO] Picked from {len(rows)} captured XRAY rows.")
+    if not picker_best:
+        # 6) Fallback (no usable capture, or nothing qualified in it): Export -> CSV, then pick from the file
+        if source == "network":
+            print("[INFO] No qualifying product in captured rows; checking the CSV export.")
+        downloaded_path = _export_xray_csv(page, download_dir)
+        if downloaded_path:
+            source = "csv"
+            picker_best = find_top_recent_product(downloaded_path, title_keyword, within_years=picker_within_years)
         else:
-            print("[INFO] Top recent product:", picker_best.get("product_details"))
-            print("       URL:", picker_best.get("url"))
-            print("       Parent Revenue:", picker_best.get("parent_level_revenue"))
-            print("       Creation Date:", picker_best.get("creation_date"))
-    else:
-        print("[ERROR] No CSV file was downloaded.")
+            print("[ERROR] No CSV file was downloaded.")
+
+    if source and not picker_best:
+        print(f"[INFO] No qualifying product found ({source}).")
+    elif picker_best:
+        print("[INFO] Top recent product:", picker_best.get("product_details"))
+        print("       URL:", picker_best.get("url"))
+        print("       Parent Revenue:", picker_best.get("parent_level_revenue"))
+        print("       Creation Date:", picker_best.get("creation_date"))
 
     # 7) (optional) read updated Total Revenue again
     updated_text = None
     updated_num = None
     if try_read_updated_revenue:
         try:
-            updated_text, updated_num = _extract_total_revenue(page)
+            updated_text, updated_num = read_total_revenue(page)
             print(f"[INFO] Updated Total Revenue: {updated_text} | number: {updated_num}")
         except Exception as e:
             print("[WARN] Total Revenue read failed:", e)
@@ -236,6 +213,7 @@ def run_competitors_flow(
     return {
         "downloaded_path": downloaded_path,
         "picker_best": picker_best,
+        "source": source,
         "updated_total_revenue_text": updated_text,
         "updated_total_revenue_number": updated_num,
     }
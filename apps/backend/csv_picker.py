@@ -1,15 +1,23 @@
 # csv_picker.py
 from __future__ import annotations
 import csv
+import io
 import os
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Iterator, Union
+
+# A CSV path, raw CSV bytes (e.g. a sniffed download) or already-parsed rows
+RowSource = Union[str, "os.PathLike[str]", bytes, bytearray, Iterable[Dict[str, str]]]
 
 # --- config: match your exact CSV column names ---
 COL_PRODUCT_DETAILS = "Product Details"
 COL_URL             = "URL"
 COL_PARENT_REVENUE  = "Parent Level Revenue"
 COL_CREATION_DATE   = "Creation Date"
+COL_REVIEW_COUNT    = "Review Count"
+
+# Columns find_top_recent_product reads; row sources without them can't be picked from
+PICKER_COLUMNS = (COL_PRODUCT_DETAILS, COL_URL, COL_PARENT_REVENUE, COL_CREATION_DATE, COL_REVIEW_COUNT)
 
 # Try a few common date formats you may see in exports
 _DATE_FORMATS = (
@@ -66,85 +74,111 @@ def _parse_date(s: str) -> Optional[datetime]:
         pass
     return None
 
-def filter_csv_by_reviews_and_keyword(input_csv, keyword_phrase, max_reviews=1000):
-    """
-    Filters input CSV rows where:
-      - Review Count <= max_reviews i.e. 1000
-      - Display Order column includes the keyword_phrase (case-insensitive)
+# Formats that parse some of the same strings as an earlier entry of _DATE_FORMATS
+_AMBIGUOUS_BEFORE = {"%d/%m/%Y": ("%m/%d/%Y",)}
 
-    Saves filtered rows to output_csv.
+class _DateParser:
     """
-    filtered_rows = []
-    # print(keyword_phrase.lower())
-
-    # Open and read input CSV
-    with open(input_csv, newline='', encoding='utf-8-sig') as infile:
-        reader = csv.DictReader(infile)
-        fieldnames = reader.fieldnames
-        for row in reader:
-            # Parse Review Count as integer, handle commas
+    _parse_date with the detected format cached: exports use one date format
+    throughout, so after the first hit every row costs a single strptime
+    (two for d/m/Y, which first checks the m/d reading like _parse_date does).
+    """
+
+    def __init__(self):
+        self.fmt: Optional[str] = None
+
+    def __call__(self, s: Optional[str]) -> Optional[datetime]:
+        if s is None:
+            return None
+        s = s.strip()
+        if not s:
+            return None
+        if self.fmt:
+            # a value an earlier format also reads (03/04/2025) keeps _parse_date's per-value order
+            for fmt in _AMBIGUOUS_BEFORE.get(self.fmt, ()):
+                try:
+                    return datetime.strptime(s, fmt)
+                except ValueError:
+                    pass
             try:
-                review_count = int(str(row.get('Review Count', '0')).replace(',', '').strip())
+                return datetime.strptime(s, self.fmt)
             except ValueError:
-                review_count = 0
-
-            display_order = str(row.get('Product Details', '')).lower()
-            keyword_lower = keyword_phrase.lower()
+                pass
+        for fmt in _DATE_FORMATS:
+            if fmt == self.fmt:
+                continue
+            try:
+                dt = datetime.strptime(s, fmt)
+            except ValueError:
+                continue
+            self.fmt = fmt
+            return dt
+        return _parse_date(s)
 
-            # print(review_count,display_order)
-            if review_count <= max_reviews and keyword_lower in display_order:
-                # print(review_count, display_order)
-                filtered_rows.append(row)
+def _review_count(row: Dict[str, str]) -> int:
+    # Parse Review Count as integer, handle commas
+    try:
+        return int(str(row.get('Review Count', '0')).replace(',', '').strip())
+    except ValueError:
+        return 0
 
-    # print(input_csv)
-    output_csv = os.path.join(os.getcwd(), "exports", f"filtered_{os.path.basename(input_csv)}")
-    # Write filtered rows to output CSV
-    with open(output_csv, 'w', newline='', encoding='utf-8') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(filtered_rows)
+def _passes_filter(row: Dict[str, str], keyword_lower: str, max_reviews: int = 1000) -> bool:
+    """Review Count <= max_reviews and keyword in 'Product Details' (case-insensitive)."""
+    return keyword_lower in str(row.get('Product Details', '')).lower() and _review_count(row) <= max_reviews
 
-    print(f"[SUCCESS] Filtered CSV saved to {output_csv} ({len(filtered_rows)} rows).")
-    return output_csv
+def _strip_headers(reader: csv.DictReader) -> csv.DictReader:
+    # Normalize headers by stripping whitespace
+    reader.fieldnames = [h.strip() for h in reader.fieldnames] if reader.fieldnames else None
+    return reader
 
-def find_top_recent_product(csv_path: str, keyword_phrase: str, within_years: int = 2) -> Optional[Dict[str, str]]:
+def iter_rows(source: RowSource) -> Iterator[Dict[str, str]]:
+    """
+    Stream rows from a CSV path, raw CSV bytes or an iterable of dict rows.
+    Files and bytes are read row by row, so memory stays bounded by one row.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        # utf-8-sig handles BOM if present
+        with io.TextIOWrapper(io.BytesIO(source), encoding="utf-8-sig", newline="") as f:
+            yield from _strip_headers(csv.DictReader(f))
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8-sig", newline="") as f:
+            yield from _strip_headers(csv.DictReader(f))
+    else:
+        yield from source
+
+def find_top_recent_product(
+    source: RowSource, keyword_phrase: str, within_years: int = 2, max_reviews: int = 1000
+) -> Optional[Dict[str, str]]:
     """
-    Scan the CSV and return a dict with the best recent product:
-    - Max 'Parent Level Revenue'
+    Stream the rows once and return a dict with the best recent product:
+    - 'Review Count' <= max_reviews and keyword_phrase in 'Product Details'
     - 'Creation Date' within last `within_years` years (approx. 365*years days)
+    - Max 'Parent Level Revenue' (ties: most recent Creation Date)
 
-    Returns None if no qualifying rows found.
+    `source` is a CSV path, CSV bytes, or an iterable of row dicts (e.g. XRAY
+    rows captured off the network). Returns None if no qualifying rows found.
     """
-    csv_path = filter_csv_by_reviews_and_keyword(csv_path, keyword_phrase)
+    keyword_lower = (keyword_phrase or "").lower()
     cutoff = datetime.now() - timedelta(days=365 * within_years)
+    parse_date = _DateParser()  # format detected once per source
     best_row = None
     best_rev = float("-inf")
+    best_dt = None
 
-    # utf-8-sig handles BOM if present
-    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        # Normalize headers by stripping whitespace
-        reader.fieldnames = [h.strip() for h in reader.fieldnames] if reader.fieldnames else None
-
-        for row in reader:
-            # Access columns defensively
-            created_at = _parse_date(row.get(COL_CREATION_DATE))
-            if not created_at or created_at < cutoff:
-                continue
-
-            rev = _to_number(row.get(COL_PARENT_REVENUE))
-            if rev is None:
-                continue
+    for row in iter_rows(source):
+        # cheapest checks first; dates are only parsed for rows that can still win
+        if not _passes_filter(row, keyword_lower, max_reviews):
+            continue
+        rev = _to_number(row.get(COL_PARENT_REVENUE))
+        if rev is None or rev < best_rev:
+            continue
+        created_at = parse_date(row.get(COL_CREATION_DATE))
+        if not created_at or created_at < cutoff:
+            continue
 
-            if rev > best_rev:
-                best_rev = rev
-                best_row = row
-            elif rev == best_rev and best_row:
-                # Tie-breaker 1: most recent Creation Date wins
-                prev_dt = _parse_date(best_row.get(COL_CREATION_DATE))
-                if prev_dt and created_at > prev_dt:
-                    best_row = row
-                # (Optional) add more tie-breakers if you like (e.g., higher Review Count)
+        if rev > best_rev or (best_dt and created_at > best_dt):
+            # Tie-breaker: most recent Creation Date wins
+            best_rev, best_row, best_dt = rev, row, created_at
 
     if not best_row:
         return None
@@ -166,7 +200,7 @@ def find_top_recent_product(csv_path: str, keyword_phrase: str, within_years: in
 if __name__ == "__main__":
     import sys, json
     if len(sys.argv) < 2:
-        print("Usage: python csv_picker.py <path_to_csv>")
+        print("Usage: python csv_picker.py <path_to_csv> [keyword]")
         sys.exit(1)
-    res = find_top_recent_product(sys.argv[1])
+    res = find_top_recent_product(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "")
     print(json.dumps(res, indent=2) if res else "No qualifying product found.")
@@ -112,120 +112,171 @@
 
 
 # get_category_rev.py
-import re, time
-from typing import Optional, Tuple, Dict
+import os, re, time
+from typing import Optional, Dict
 from playwright.sync_api import Browser, Page
+from xray_registry import find_xray_page
+from page_extract import ensure_extractors, read_total_revenue
+from selector_cache import try_strategies
 
-def _clean(s: Optional[str]) -> str:
-    import re
-    return re.sub(r"\s+", " ", s or "").strip()
-
-def _find_xray_page(browser: Browser, timeout_ms: int = 1500) -> Optional[Page]:
-    """Return the Amazon tab that actually has the XRAY overlay text visible."""
-    for ctx in browser.contexts:
-        for pg in ctx.pages:
-            if "amazon." not in pg.url:
-                continue
-            try:
-                pg.get_by_text("Xray", exact=False).first.wait_for(timeout=timeout_ms)
-                return pg
-            except Exception:
-                pass
-    return None
+# After 'Load More', Total Revenue counts as settled once it has not changed for this long
+SETTLE_QUIET_MS = int(os.getenv("CATEGORY_REV_SETTLE_MS", "4000"))
+# ...counted from the first change seen on the page, or from this long after the click if nothing moves
+SETTLE_GRACE_MS = int(os.getenv("CATEGORY_REV_GRACE_MS", "2000"))
 
 def _click_load_more(page: Page) -> bool:
-    """Try multiple strategies to click 'Load More'. Return True if clicked."""
-    clicked = False
-    load_more = page.get_by_role("button", name=re.compile(r"^\s*Load More\s*$", re.I))
-    try:
+    """Try multiple strategies to click 'Load More' (last working one first). Return True if clicked."""
+    def by_role():
+        load_more = page.get_by_role("button", name=re.compile(r"^\s*Load More\s*$", re.I))
         load_more.wait_for(timeout=4000)
         load_more.scroll_into_view_if_needed()
         try:
             load_more.click(timeout=1500)
-            print("[INFO] Load More clicked (normal).")
-            return True
+            return "normal"
         except Exception:
             el = load_more.element_handle()
-            if el:
-                page.evaluate("(el)=>el.click()", el)
-                print("[INFO] Load More clicked (programmatic).")
-                return True
+            if not el:
+                raise
+            page.evaluate("(el)=>el.click()", el)
+            return "programmatic"
+
+    def by_text():
+        load_more = page.locator("button:has-text('Load More')").first
+        load_more.scroll_into_view_if_needed()
+        el = load_more.element_handle()
+        if not el:
+            raise RuntimeError("'Load More' button not found")
+        page.evaluate("(el)=>el.dispatchEvent(new MouseEvent('click',{bubbles:true,cancelable:true}))", el)
+        return "dispatchEvent fallback"
+
+    try:
+        _, how = try_strategies("category.load_more", [("role", by_role), ("text", by_text)])
     except Exception:
-        # fallback selector
-        try:
-            load_more = page.locator("button:has-text('Load More')").first
-            load_more.scroll_into_view_if_needed()
-            el = load_more.element_handle()
-            if el:
-                page.evaluate("(el)=>el.dispatchEvent(new MouseEvent('click',{bubbles:true,cancelable:true}))", el)
-                print("[INFO] Load More clicked (dispatchEvent fallback).")
-                return True
-        except Exception:
-            pass
-    return clicked
-
-def _extract_total_revenue(page: Page) -> Tuple[str, str]:
-    """Find the 'Total Revenue' label and extract the nearest numeric value."""
-    label = page.get_by_text("Total Revenue", exact=True).first
-    label.wait_for(timeout=5000)
-    el = label.element_handle()
-    if not el:
-        raise RuntimeError("Couldn't get handle for 'Total Revenue' label.")
-
-    value_text = page.evaluate(
+        return False
+    print(f"[INFO] Load More clicked ({how}).")
+    return True
+
+def _read_total_revenue_text(page: Page) -> Optional[str]:
+    """Best-effort, non-waiting read of the current Total Revenue text (None if not rendered)."""
+    try:
+        return read_total_revenue(page, timeout_ms=1000)[0]
+    except Exception:
+        return None
+
+def _wait_total_revenue_settled(
+    page: Page,
+    *,
+    baseline: Optional[str],
+    quiet_ms: int = SETTLE_QUIET_MS,
+    grace_ms: int = SETTLE_GRACE_MS,
+    max_ms: int = 60000
+) -> Dict[str, str]:
+    """
+    Install a MutationObserver on the page and resolve once Total Revenue has
+    stayed unchanged for `quiet_ms`. The quiet timer starts at the first DOM
+    mutation (or right away if the value already moved off `baseline`), or
+    after `grace_ms` if the page doesn't change at all; each later change of
+    the value restarts it. `max_ms` is only an upper bound (value kept changing).
+    Returns {'value': <text or None>, 'reason': 'settled' | 'timeout'}.
+    """
+    if not ensure_extractors(page):
+        raise RuntimeError("page extractors unavailable")
+    return page.evaluate(
         """
-        (labelEl) => {
-          function findValueWithin(root) {
-            const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
-            while (walker.nextNode()) {
-              const n = walker.currentNode;
-              const txt = (n.innerText || "").trim();
-              if (!txt) continue;
-              if (/^\\$?\\s*\\d[\\d,]*(?:\\.\\d+)?$/.test(txt) && !/total\\s*revenue/i.test(txt)) {
-                return txt;
-              }
+        ([baseline, quietMs, graceMs, maxMs]) => new Promise((resolve) => {
+          const readValue = () => window.__amzExtract.total_revenue();
+
+          let last = readValue();
+          let quietTimer = null, checkQueued = false, armed = false;
+          const obs = new MutationObserver(() => {
+            if (checkQueued) return;      // coalesce bursts of table mutations
+            checkQueued = true;
+            setTimeout(check, 100);
+          });
+          const finish = (reason) => {
+            obs.disconnect();
+            clearTimeout(quietTimer);
+            clearTimeout(graceTimer);
+            clearTimeout(hardTimer);
+            resolve({ value: readValue(), reason });
+          };
+          const arm = () => {
+            armed = true;
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(() => finish("settled"), quietMs);
+          };
+          function check() {
+            checkQueued = false;
+            const v = readValue();
+            if (v !== last) {             // the value moved: wait for it to hold still again
+              last = v;
+              arm();
+            } else if (!armed) {          // first activity after the click: start counting
+              arm();
             }
-            return null;
           }
-          let root = labelEl.parentElement;
-          for (let i = 0; i < 5 && root; i++) {
-            const val = findValueWithin(root);
-            if (val) return val;
-            root = root.parentElement;
-          }
-          return null;
-        }
+          obs.observe(document.body, { subtree: true, childList: true, characterData: true });
+          const hardTimer = setTimeout(() => finish("timeout"), maxMs);
+          const graceTimer = setTimeout(() => { if (!armed) arm(); }, graceMs);
+          if (last !== null && last !== baseline) arm();
+        })
         """,
-        el
+        [baseline, quiet_ms, grace_ms, max_ms],
     )
-    if not value_text:
-        raise RuntimeError("Couldn't locate the Total Revenue value near the label.")
-    value_text = _clean(value_text)
-    number_only = re.sub(r"[^0-9.]", "", value_text)
-    return value_text, number_only
 
-def get_category_revenue(browser: Browser, *, wait_after_click_ms: int = 15000) -> Dict[str, str]:
+def load_more_and_settle(
+    page: Page,
+    *,
+    wait_after_click_ms: int = 15000,
+    settle_quiet_ms: int = SETTLE_QUIET_MS
+) -> bool:
+    """
+    Click 'Load More' on an XRAY table (best effort) and wait until 'Total Revenue'
+    settles (quiet for settle_quiet_ms; wait_after_click_ms is the cap).
+    Returns True if Load More was clicked.
+    """
+    baseline = _read_total_revenue_text(page)
+    if not _click_load_more(page):
+        print("[WARN] Could not click 'Load More' (overlay likely intercepting). Continuing anyway.")
+        return False
+    print(f"[INFO] Waiting for Total Revenue to settle (quiet {settle_quiet_ms} ms, max {wait_after_click_ms} ms)…")
+    t0 = time.time()
+    try:
+        settled = _wait_total_revenue_settled(
+            page, baseline=baseline, quiet_ms=settle_quiet_ms, max_ms=wait_after_click_ms
+        )
+        print(f"[INFO] Total Revenue {settled.get('reason')} after {time.time() - t0:.1f}s "
+              f"({baseline} -> {settled.get('value')})")
+    except Exception as e:
+        # observer could not be installed (navigation, page closed): keep the old fixed wait
+        print("[WARN] Settle observer failed, falling back to fixed wait:", e)
+        remaining_ms = wait_after_click_ms - int((time.time() - t0) * 1000)
+        if remaining_ms > 0:
+            page.wait_for_timeout(remaining_ms)
+    return True
+
+def get_category_revenue(
+    browser: Browser,
+    *,
+    wait_after_click_ms: int = 15000,
+    settle_quiet_ms: int = SETTLE_QUIET_MS,
+    page: Optional[Page] = None
+) -> Dict[str, str]:
     """
     Uses an existing Playwright Browser to:
-      - find the XRAY page
-      - click 'Load More' (best effort)
+      - find the XRAY page (or use `page` when the caller already knows the tab)
+      - click 'Load More' and wait for 'Total Revenue' to settle (load_more_and_settle)
       - read 'Total Revenue' (both text and numeric)
     Returns: {'text': <e.g. '$123,456'>, 'number': <e.g. '123456'>}
     """
-    page = _find_xray_page(browser, timeout_ms=1200)
+    page = page or find_xray_page(browser, timeout_ms=1200)
     if not page:
         raise RuntimeError("XRAY not detected on any Amazon tab.")
     page.bring_to_front()
     page.wait_for_timeout(500)
 
-    if _click_load_more(page):
-        print("[INFO] Waiting 15s for data to refresh…")
-        page.wait_for_timeout(wait_after_click_ms)
-    else:
-        print("[WARN] Could not click 'Load More' (overlay likely intercepting). Continuing anyway.")
+    load_more_and_settle(page, wait_after_click_ms=wait_after_click_ms, settle_quiet_ms=settle_quiet_ms)
 
-    value_text, number_only = _extract_total_revenue(page)
+    value_text, number_only = read_total_revenue(page)
     print(f"[RESULT] Total Revenue: {value_text}  |  number: {number_only}")
     return {"text": value_text, "number": number_only}
-
-
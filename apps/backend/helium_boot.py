@@ -321,9 +321,20 @@
 
 import sys, time, socket, subprocess
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 from urllib.request import urlopen
-from urllib.error import URLError
 from playwright.sync_api import sync_playwright
+from amazon_urls import extract_asin_from_url, marketplace_for, on_marketplace
+from xray_capture import attach_capture, detach_capture
+from page_extract import install_extractors, forget_extractors
+from tab_tracker import track_tabs, untrack_tabs
+import xray_registry
+
+# Chrome processes launched by ensure_chrome, by CDP port (shutdown_chrome kills them if they hang)
+_launched = {}
+
+# How long find_tab waits for a tab another connection opened to reach this one's registry
+FIND_TAB_WAIT_S = 5
 
 def _find_free_port() -> int:
     s = socket.socket(); s.bind(("127.0.0.1", 0))
@@ -336,23 +347,14 @@ def _cdp_ready(port: int) -> bool:
     except Exception:
         return False
 
-def boot_and_xray(
+def ensure_chrome(
     *,
     chrome_path: str,
     user_data_dir: str,
     profile_dir: str = "Default",
-    ext_id: str,
-    target_url: str,
     cdp_port: int | None = 28000,      # None => auto free port
-    wait_secs: int = 60,
-    popup_visible: bool = False       # open -> send -> (optionally) close
-):
-    """
-    Launch Chrome (CDP), connect Playwright, trigger Helium XRAY for target_url,
-    and return as soon as the Amazon results tab is detected.
-
-    Returns: (playwright, browser, context, target_page)
-    """
+) -> int:
+    """Launch Chrome with remote debugging unless it is already listening. Returns the CDP port."""
     chrome = Path(chrome_path)
     if not chrome.exists():
         raise FileNotFoundError(f"Chrome not found: {chrome_path}")
@@ -373,12 +375,18 @@ def boot_and_xray(
             "--no-first-run",
             "--no-default-browser-check",
             "--disable-gpu",
+            # stages run on several tabs at once; keep background tabs at full speed
+            "--disable-background-timer-throttling",
+            "--disable-backgrounding-occluded-windows",
+            "--disable-renderer-backgrounding",
             "about:blank",
         ]
         creationflags = 0
         if sys.platform.startswith("win"):
             creationflags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
-        subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=creationflags)
+        _launched[cdp_port] = subprocess.Popen(
+            args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=creationflags
+        )
 
         deadline = time.time() + 25
         while time.time() < deadline and not _cdp_ready(cdp_port):
@@ -388,14 +396,71 @@ def boot_and_xray(
         print(f"[info] Chrome launched and CDP ready on {cdp_port}")
     else:
         print(f"[info] Reusing existing Chrome CDP on {cdp_port}")
+    return cdp_port
 
-    cdp_url  = f"http://127.0.0.1:{cdp_port}"
-    popup_url = f"chrome-extension://{ext_id}/popup.html"
+def _wait_cdp_closed(cdp_port: int, timeout_s: float) -> bool:
+    deadline = time.time() + timeout_s
+    while time.time() < deadline and _cdp_ready(cdp_port):
+        time.sleep(0.2)
+    return not _cdp_ready(cdp_port)
+
+def shutdown_chrome(browser, cdp_port: int, *, timeout_s: float = 15) -> bool:
+    """
+    Make the Chrome on cdp_port exit and wait until its debug port is closed, so the
+    next ensure_chrome launches a fresh one instead of attaching to a dying browser.
+    Over CDP browser.close() only disconnects, so this sends Browser.close; a Chrome
+    we launched that still won't go is killed. Returns True once the port is closed.
+    """
+    try:
+        if browser is not None:
+            browser.new_browser_cdp_session().send("Browser.close")
+    except Exception:
+        pass  # already disconnected, or Chrome went away mid-call
+    closed = _wait_cdp_closed(cdp_port, timeout_s)
+    proc = _launched.get(cdp_port)
+    if not closed and proc is not None and proc.poll() is None:
+        print(f"[warn] Chrome on {cdp_port} did not exit; killing it")
+        try:
+            proc.kill()
+            proc.wait(timeout=10)
+        except Exception:
+            pass
+        closed = _wait_cdp_closed(cdp_port, 5)
+    if closed:
+        _launched.pop(cdp_port, None)
+    else:
+        print(f"[warn] Chrome debug port {cdp_port} is still open after shutdown")
+    return closed
 
+def connect_cdp(cdp_port: int):
+    """Start a Playwright driver and attach to Chrome over CDP. Returns (playwright, browser, context)."""
+    cdp_url  = f"http://127.0.0.1:{cdp_port}"
     print("[info] Connecting Playwright to Chrome...")
     pw = sync_playwright().start()
     browser = pw.chromium.connect_over_cdp(cdp_url)
     ctx = browser.contexts[0] if browser.contexts else browser.new_context()
+    attach_capture(ctx)  # record XRAY JSON from the start (see xray_capture)
+    track_tabs(ctx)      # event-fed tab registry (see tab_tracker)
+    install_extractors(ctx)  # one-call metric reads on every page (see page_extract)
+    return pw, browser, ctx
+
+def disconnect_cdp(pw, browser, ctx):
+    """Undo connect_cdp: drop this connection's per-context registries, then stop the driver (Chrome keeps running)."""
+    if browser is not None:
+        xray_registry.forget(browser)
+    if ctx is not None:
+        detach_capture(ctx)
+        untrack_tabs(ctx)
+        forget_extractors(ctx)
+    try:
+        if pw:
+            pw.stop()
+    except Exception:
+        pass
+
+def send_xray_open(ctx, *, ext_id: str, target_url: str, popup_visible: bool = False):
+    """Ask the Helium background page to open target_url and run XRAY on it."""
+    popup_url = f"chrome-extension://{ext_id}/popup.html"
 
     # Open extension popup just to send the message
     popup = ctx.new_page()
@@ -421,24 +486,76 @@ def boot_and_xray(
         except Exception:
             pass
 
-    # Wait for Amazon results tab to appear (simple wait)
-    target_page = None
-    deadline = time.time() + wait_secs
-    while time.time() < deadline and target_page is None:
-        for pg in ctx.pages:
-            if pg.url.startswith("https://www.amazon.com/s?"):
-                target_page = pg
-                break
-        if target_page:
-            break
-        time.sleep(0.25)
+def page_matches_target(page_url: str, target_url: str) -> bool:
+    """True if an open tab is the page Helium opened for target_url (same ASIN, or same search keyword)."""
+    if not page_url or "amazon." not in page_url:
+        return False
+    asin = extract_asin_from_url(target_url)
+    if asin:
+        return extract_asin_from_url(page_url) == asin
+    want = parse_qs(urlparse(target_url).query).get("k")
+    if want:
+        got = parse_qs(urlparse(page_url).query).get("k")
+        return bool(got) and got[0].strip().lower() == want[0].strip().lower()
+    return page_url.split("?")[0].rstrip("/") == target_url.split("?")[0].rstrip("/")
+
+def find_tab(ctx, target_url: str, timeout_s: float = FIND_TAB_WAIT_S):
+    """
+    Tab in ctx matching target_url, or None after timeout_s. Pumps this
+    connection's events while waiting, so a tab opened or navigated through
+    another connection (stage lanes vs. the session) shows up with its current URL.
+    """
+    return track_tabs(ctx).wait_for(lambda url: page_matches_target(url, target_url), timeout_s)
+
+def _is_results_tab(page_url: str, marketplace: str, target_url: str = "") -> bool:
+    """The Helium-opened tab: on the submission's marketplace and showing target_url (any search page if no target)."""
+    if not on_marketplace(page_url, marketplace):
+        return False
+    if target_url and "amazon." in target_url:
+        return page_matches_target(page_url, target_url)
+    return urlparse(page_url).path.rstrip("/") == "/s"
+
+def wait_for_results_tab(ctx, *, wait_secs: int = 60, target_url: str = "", country: str = ""):
+    """
+    Wait for the Helium-opened Amazon results tab on the right marketplace
+    (taken from target_url's domain, else the submission country, else US);
+    bring it to front. Returns the Page or None.
+    """
+    marketplace = marketplace_for(url=target_url, country=country)
+    target_page = track_tabs(ctx).wait_for(lambda url: _is_results_tab(url, marketplace, target_url), wait_secs)
 
     if target_page:
         target_page.bring_to_front()
-        print("[SUCCESS] Amazon tab for XRAY is active. Helium should be running now.")
+        print(f"[SUCCESS] Amazon tab for XRAY is active on {marketplace}. Helium should be running now.")
     else:
-        print("[warn] Could not detect the Helium-opened Amazon tab within wait time.")
-
-    return pw, browser, ctx, target_page
+        print(f"[warn] Could not detect the Helium-opened Amazon tab on {marketplace} within wait time.")
+    return target_page
 
+def boot_and_xray(
+    *,
+    chrome_path: str,
+    user_data_dir: str,
+    profile_dir: str = "Default",
+    ext_id: str,
+    target_url: str,
+    cdp_port: int | None = 28000,      # None => auto free port
+    wait_secs: int = 60,
+    popup_visible: bool = False,      # open -> send -> (optionally) close
+    country: str = ""                 # submission country; only used if target_url has no Amazon domain
+):
+    """
+    Launch Chrome (CDP), connect Playwright, trigger Helium XRAY for target_url,
+    and return as soon as the Amazon results tab is detected.
 
+    Returns: (playwright, browser, context, target_page)
+    """
+    cdp_port = ensure_chrome(
+        chrome_path=chrome_path,
+        user_data_dir=user_data_dir,
+        profile_dir=profile_dir,
+        cdp_port=cdp_port,
+    )
+    pw, browser, ctx = connect_cdp(cdp_port)
+    send_xray_open(ctx, ext_id=ext_id, target_url=target_url, popup_visible=popup_visible)
+    target_page = wait_for_results_tab(ctx, wait_secs=wait_secs, target_url=target_url, country=country)
+    return pw, browser, ctx, target_page
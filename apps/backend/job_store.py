@@ -0,0 +1,323 @@
+# job_store.py
+import os, json, time
+from typing import Dict, Any, List, Optional, Tuple
+
+from local_db import connect, transaction
+
+# Job states: pending -> leased -> done | failed
+STATUS_PENDING = "pending"
+STATUS_LEASED  = "leased"
+STATUS_DONE    = "done"
+STATUS_FAILED  = "failed"
+
+# Legacy JSON files (imported once, then renamed to *.migrated)
+LEGACY_QUEUE_FILE        = "queue.json"
+LEGACY_FAILED_QUEUE_FILE = "failed_queue.json"
+LEGACY_LOCK_FILE         = "queue.lock"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    status     TEXT    NOT NULL DEFAULT 'pending',
+    payload    TEXT    NOT NULL,
+    retries    INTEGER NOT NULL DEFAULT 0,
+    error      TEXT,
+    created_at REAL    NOT NULL,
+    updated_at REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+
+-- One row per product of a job; results are committed per item so a
+-- restarted worker resumes at the first unfinished product.
+CREATE TABLE IF NOT EXISTS job_items (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id     INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    seq        INTEGER NOT NULL,
+    brand      TEXT    NOT NULL DEFAULT '',
+    country    TEXT    NOT NULL DEFAULT '',
+    product    TEXT    NOT NULL,
+    status     TEXT    NOT NULL DEFAULT 'pending',
+    result     TEXT,
+    error      TEXT,
+    updated_at REAL    NOT NULL,
+    UNIQUE(job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(job_id, status, seq);
+CREATE INDEX IF NOT EXISTS idx_job_items_queue ON job_items(status, job_id, seq);
+"""
+
+
+def iter_payload_products(payload: Dict[str, Any]):
+    """Yield (seq, brand, country, product) in brand -> country -> product order."""
+    seq = 0
+    for b in payload.get("brands", []):
+        brand_name = (b.get("brand") or "").strip()
+        for c in b.get("countries", []):
+            country_name = (c.get("name") or "").strip()
+            for p in c.get("products", []):
+                yield seq, brand_name, country_name, p
+                seq += 1
+
+
+# ---------------------------
+# Setup / migration
+# ---------------------------
+def init_store(*, migrate: bool = True, recover: bool = True):
+    """Create tables, import legacy queue files, and re-queue jobs orphaned by a crash."""
+    conn = connect()
+    conn.executescript(_SCHEMA)
+    if migrate:
+        migrate_json_files()
+    if recover:
+        n = requeue_leased()
+        if n:
+            print(f"[QUEUE] Re-queued {n} job(s) left leased by a previous process")
+
+
+def _safe_read_json(path: str):
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except Exception:
+        # Corrupt file fallback
+        return []
+
+
+def migrate_json_files(
+    queue_file: str = LEGACY_QUEUE_FILE,
+    failed_file: str = LEGACY_FAILED_QUEUE_FILE,
+) -> int:
+    """One-time import of queue.json / failed_queue.json; files are renamed afterwards."""
+    moved = 0
+    for path, status in ((queue_file, STATUS_PENDING), (failed_file, STATUS_FAILED)):
+        if not os.path.exists(path):
+            continue
+        items = _safe_read_json(path)
+        conn = connect()
+        now = time.time()
+        with transaction(conn):
+            for payload in items:
+                payload = dict(payload)
+                err = payload.pop("error", None) if status == STATUS_FAILED else None
+                cur = conn.execute(
+                    "INSERT INTO jobs(status, payload, retries, error, created_at, updated_at) VALUES (?,?,?,?,?,?)",
+                    (status, json.dumps(payload, ensure_ascii=False), int(payload.get("retries") or 0), err, now, now),
+                )
+                _insert_items(conn, cur.lastrowid, payload, now)
+        os.replace(path, f"{path}.migrated")
+        moved += len(items)
+        print(f"[QUEUE] Migrated {len(items)} item(s) from {path} ({status})")
+    try:
+        os.remove(LEGACY_LOCK_FILE)
+    except FileNotFoundError:
+        pass
+    return moved
+
+
+def requeue_leased() -> int:
+    """Put every leased job/item back to pending (call only when no worker is running)."""
+    conn = connect()
+    now = time.time()
+    with transaction(conn):
+        conn.execute(
+            "UPDATE job_items SET status=?, updated_at=? WHERE status=?",
+            (STATUS_PENDING, now, STATUS_LEASED),
+        )
+        cur = conn.execute(
+            "UPDATE jobs SET status=?, updated_at=? WHERE status=?",
+            (STATUS_PENDING, now, STATUS_LEASED),
+        )
+    return cur.rowcount
+
+
+# ---------------------------
+# Queue operations
+# ---------------------------
+def enqueue(payload: Dict[str, Any], *, status: str = STATUS_PENDING) -> int:
+    """Insert one job plus its per-product items; returns the job id (no queue rewrite)."""
+    conn = connect()
+    now = time.time()
+    with transaction(conn):
+        cur = conn.execute(
+            "INSERT INTO jobs(status, payload, retries, created_at, updated_at) VALUES (?,?,?,?,?)",
+            (status, json.dumps(payload, ensure_ascii=False), int(payload.get("retries") or 0), now, now),
+        )
+        job_id = cur.lastrowid
+        _insert_items(conn, job_id, payload, now)
+    return job_id
+
+
+def _insert_items(conn, job_id: int, payload: Dict[str, Any], now: float):
+    conn.executemany(
+        "INSERT OR IGNORE INTO job_items(job_id, seq, brand, country, product, updated_at) VALUES (?,?,?,?,?,?)",
+        [
+            (job_id, seq, brand, country, json.dumps(p, ensure_ascii=False), now)
+            for seq, brand, country, p in iter_payload_products(payload)
+        ],
+    )
+
+
+def lease_next() -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Atomically move the oldest pending job to leased. Returns (job_id, payload) or None."""
+    conn = connect()
+    with transaction(conn):
+        row = conn.execute(
+            "SELECT id, payload FROM jobs WHERE status=? ORDER BY id LIMIT 1",
+            (STATUS_PENDING,),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status=?, updated_at=? WHERE id=?",
+            (STATUS_LEASED, time.time(), row["id"]),
+        )
+    return row["id"], json.loads(row["payload"])
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    row = connect().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+def mark_done(job_id: int):
+    connect().execute(
+        "UPDATE jobs SET status=?, error=NULL, updated_at=? WHERE id=?",
+        (STATUS_DONE, time.time(), job_id),
+    )
+
+
+def mark_failed(job_id: int, err_msg: str):
+    connect().execute(
+        "UPDATE jobs SET status=?, error=?, updated_at=? WHERE id=?",
+        (STATUS_FAILED, err_msg, time.time(), job_id),
+    )
+
+
+def list_payloads(status: str = STATUS_PENDING) -> List[Dict[str, Any]]:
+    """Payloads in FIFO order for one state; failed jobs carry their 'error'."""
+    rows = connect().execute(
+        "SELECT payload, error FROM jobs WHERE status=? ORDER BY id", (status,)
+    ).fetchall()
+    out = []
+    for r in rows:
+        payload = json.loads(r["payload"])
+        if r["error"]:
+            payload["error"] = r["error"]
+        out.append(payload)
+    return out
+
+
+def count(status: str = STATUS_PENDING) -> int:
+    row = connect().execute("SELECT COUNT(*) FROM jobs WHERE status=?", (status,)).fetchone()
+    return int(row[0])
+
+
+def delete_status(status: str = STATUS_PENDING) -> int:
+    cur = connect().execute("DELETE FROM jobs WHERE status=?", (status,))
+    return cur.rowcount
+
+
+# ---------------------------
+# Per-product items (checkpoint / resume)
+# ---------------------------
+def ensure_items(job_id: int, payload: Dict[str, Any]):
+    """Create items for jobs that predate item splitting (e.g. migrated from queue.json)."""
+    conn = connect()
+    with transaction(conn):
+        _insert_items(conn, job_id, payload, time.time())
+
+
+def unfinished_items(job_id: int) -> List[Dict[str, Any]]:
+    """Items of a job that have no committed result yet, in submission order."""
+    rows = connect().execute(
+        "SELECT id, seq, brand, country, product FROM job_items WHERE job_id=? AND status!=? ORDER BY seq",
+        (job_id, STATUS_DONE),
+    ).fetchall()
+    return [
+        {"id": r["id"], "seq": r["seq"], "brand": r["brand"], "country": r["country"],
+         "product": json.loads(r["product"])}
+        for r in rows
+    ]
+
+
+def complete_item(item_id: int, result: Dict[str, Any]):
+    """Commit one finished product result (durable before the next product starts)."""
+    connect().execute(
+        "UPDATE job_items SET status=?, result=?, error=NULL, updated_at=? WHERE id=?",
+        (STATUS_DONE, json.dumps(result, ensure_ascii=False), time.time(), item_id),
+    )
+
+
+def lease_next_item() -> Optional[Dict[str, Any]]:
+    """
+    Worker-pool dequeue: atomically lease the oldest pending product across all
+    open jobs (its job becomes leased too). Returns the item dict or None.
+    """
+    conn = connect()
+    now = time.time()
+    with transaction(conn):
+        row = conn.execute(
+            "SELECT i.id, i.job_id, i.seq, i.brand, i.country, i.product "
+            "FROM job_items i JOIN jobs j ON j.id = i.job_id "
+            "WHERE i.status=? AND j.status IN (?, ?) ORDER BY i.job_id, i.seq LIMIT 1",
+            (STATUS_PENDING, STATUS_PENDING, STATUS_LEASED),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE job_items SET status=?, updated_at=? WHERE id=?", (STATUS_LEASED, now, row["id"]))
+        conn.execute(
+            "UPDATE jobs SET status=?, updated_at=? WHERE id=? AND status=?",
+            (STATUS_LEASED, now, row["job_id"], STATUS_PENDING),
+        )
+    return {"id": row["id"], "job_id": row["job_id"], "seq": row["seq"], "brand": row["brand"],
+            "country": row["country"], "product": json.loads(row["product"])}
+
+
+def close_job_if_finished(job_id: int) -> bool:
+    """
+    Mark the job done (or failed, if any product failed) once no item is
+    pending/leased. Returns True for exactly one caller, who should finalize it.
+    """
+    conn = connect()
+    with transaction(conn):
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM job_items WHERE job_id=? GROUP BY status", (job_id,)
+        ).fetchall())
+        if counts.get(STATUS_PENDING) or counts.get(STATUS_LEASED):
+            return False
+        n_failed = counts.get(STATUS_FAILED, 0)
+        status = STATUS_FAILED if n_failed else STATUS_DONE
+        err = f"{n_failed} product(s) failed" if n_failed else None
+        cur = conn.execute(
+            "UPDATE jobs SET status=?, error=?, updated_at=? WHERE id=? AND status IN (?, ?)",
+            (status, err, time.time(), job_id, STATUS_PENDING, STATUS_LEASED),
+        )
+        return cur.rowcount == 1
+
+
+def count_items(status: str = STATUS_PENDING) -> int:
+    row = connect().execute("SELECT COUNT(*) FROM job_items WHERE status=?", (status,)).fetchone()
+    return int(row[0])
+
+
+def fail_item(item_id: int, err_msg: str):
+    connect().execute(
+        "UPDATE job_items SET status=?, error=?, updated_at=? WHERE id=?",
+        (STATUS_FAILED, err_msg, time.time(), item_id),
+    )
+
+
+def item_results(job_id: int) -> Dict[int, Dict[str, Any]]:
+    """{seq: committed product block} for every finished item of a job."""
+    rows = connect().execute(
+        "SELECT seq, result FROM job_items WHERE job_id=? AND status=? ORDER BY seq",
+        (job_id, STATUS_DONE),
+    ).fetchall()
+    return {r["seq"]: json.loads(r["result"]) for r in rows}
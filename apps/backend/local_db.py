@@ -0,0 +1,43 @@
+# local_db.py
+import os, sqlite3, threading
+from contextlib import contextmanager
+
+# Single SQLite file shared by the queue and other local state (lives next to the old queue.json)
+DB_PATH = os.getenv("SCRAPER_DB_PATH", "scraper.db")
+BUSY_TIMEOUT_MS = 15000
+
+_local = threading.local()
+
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the local DB (sqlite3 connections are
+    thread-bound). Opened in WAL mode so readers never block the writer, with
+    autocommit on; callers wrap multi-statement writes in `transaction()`.
+    """
+    path = path or DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conns[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """`with transaction(conn):` -> BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -17,7 +17,13 @@ except ImportError:
     print("   Or set environment variables manually.")
 
 # Import scraper functions directly from current directory
-from main_loop import run_scraper_main, is_scraper_running, add_to_queue
+from main_loop import (
+    run_scraper_main, is_scraper_running, add_to_queue, get_queue_size, process_queue,
+    start_worker_pool, get_pool_status,
+)
+from result_sinks import close_sinks
+from sheets_sink import get_sink as get_sheets_sink
+from amazon_urls import canonical_url, normalize_keyword, product_key
 
 # Load API key from environment variable
 API_KEY = os.getenv("API_KEY")
@@ -53,6 +59,7 @@ class Product(BaseModel):
     url: str
     keyword: str
     categoryUrl: str
+    forceRefresh: bool = False  # ignore cached stage results for this product
 
 class Country(BaseModel):
     name: str
@@ -64,14 +71,44 @@ class Brand(BaseModel):
 
 class SubmissionRequest(BaseModel):
     brands: List[Brand]
+    forceRefresh: bool = False  # re-scrape every product instead of serving cached stage results
 
 class SubmissionResponse(BaseModel):
     ok: bool
     message: str
     payload: dict
+    duplicates: List[dict] = []  # products dropped at ingest as repeats of an earlier ASIN + keyword
 
 VALID_COUNTRIES = ["US", "UK", "CAN", "AUS", "DE", "UAE"]
 
+def canonical_products(
+    products: List[Product],
+    force_refresh: bool = False,
+    duplicates: Optional[List[dict]] = None
+) -> List[dict]:
+    """
+    Canonical product/category URLs (/dp/ASIN, search URLs without tracking params);
+    repeats of the same ASIN + keyword are dropped and appended to `duplicates`.
+    """
+    out, seen = [], set()
+    for product in products:
+        url = canonical_url(product.url)
+        key = (product_key(url) or url, normalize_keyword(product.keyword))
+        if key in seen:
+            print(f"[INGEST] Skipping duplicate product {url} ({product.keyword!r})")
+            if duplicates is not None:
+                duplicates.append({"productname": product.productname, "url": product.url, "keyword": product.keyword})
+            continue
+        seen.add(key)
+        out.append({
+            "productname": product.productname,
+            "url": url,
+            "keyword": product.keyword,
+            "categoryUrl": canonical_url(product.categoryUrl),
+            **({"forceRefresh": True} if force_refresh or product.forceRefresh else {})
+        })
+    return out
+
 def normalize_country(country_name: str) -> str:
     """Normalize country name to standard format"""
     country = country_name.strip().upper()
@@ -79,6 +116,30 @@ def normalize_country(country_name: str) -> str:
         return "AUS"
     return country
 
+@app.on_event("startup")
+def resume_queued_jobs():
+    """Drain jobs left pending/leased by a previous process; each resumes at its first unfinished product."""
+    # Start the Sheets writer now so rows spooled by a previous run are replayed even if no job comes in
+    get_sheets_sink()
+    if start_worker_pool():
+        # pool workers pick up pending items on their own
+        return
+    if get_queue_size() and not is_scraper_running():
+        import threading
+        print(f"[QUEUE] Resuming {get_queue_size()} queued job(s) from previous run")
+        from browser_session import release_session
+
+        def drain_queue_background():
+            process_queue()
+            release_session()
+
+        threading.Thread(target=drain_queue_background, daemon=True).start()
+
+@app.on_event("shutdown")
+def flush_result_sinks():
+    """Write any product rows still queued (Google Sheets, Parquet buffers) before the process exits."""
+    close_sinks()
+
 @app.get("/")
 def ping():
     return {"status": "ok", "via": "ipv6"}
@@ -92,11 +153,12 @@ async def health_check():
 @app.get("/api/scraper-status")
 async def get_scraper_status(api_key: str = Depends(verify_api_key)):
     """Get current scraper status"""
-    from main_loop import get_queue
-    queue_items = get_queue()
+    pool = get_pool_status()
     return {
-        "running": is_scraper_running(),
-        "queue_size": len(queue_items)
+        "running": is_scraper_running() or pool["active_workers"] > 0,
+        "queue_size": get_queue_size(),
+        "pool_size": pool["pool_size"],
+        "active_workers": pool["active_workers"]
     }
 
 @app.post("/api/submissions", response_model=SubmissionResponse)
@@ -111,6 +173,7 @@ async def create_submission(request: SubmissionRequest, api_key: str = Depends(v
         scraper_payload = {
             "brands": []
         }
+        duplicates: List[dict] = []
 
         for brand in request.brands:
             # Filter valid countries
@@ -118,18 +181,12 @@ async def create_submission(request: SubmissionRequest, api_key: str = Depends(v
             for country in brand.countries:
                 normalized_country = normalize_country(country.name)
                 if normalized_country in VALID_COUNTRIES:
+                    dropped: List[dict] = []
                     valid_countries.append({
                         "name": normalized_country,
-                        "products": [
-                            {
-                                "productname": product.productname,
-                                "url": product.url,
-                                "keyword": product.keyword,
-                                "categoryUrl": product.categoryUrl
-                            }
-                            for product in country.products
-                        ]
+                        "products": canonical_products(country.products, request.forceRefresh, dropped)
                     })
+                    duplicates += [{"brand": brand.brand, "country": normalized_country, **d} for d in dropped]
 
             if valid_countries:
                 scraper_payload["brands"].append({
@@ -141,6 +198,22 @@ async def create_submission(request: SubmissionRequest, api_key: str = Depends(v
             raise HTTPException(status_code=400, detail="No valid countries found")
 
         print("Prepared scraper payload:", json.dumps(scraper_payload, indent=2))
+        skipped = f" ({len(duplicates)} duplicate product(s) skipped)" if duplicates else ""
+        if duplicates:
+            print(f"[INGEST] {len(duplicates)} duplicate product(s) dropped from this submission")
+
+        # Worker pool mode: every submission is split into per-product items for the pool
+        pool = start_worker_pool()
+        if pool:
+            if add_to_queue(scraper_payload):
+                pool.notify()
+                return SubmissionResponse(
+                    ok=True,
+                    message=f"Data submitted to queue, {pool.size} worker(s) will process it{skipped}",
+                    payload=scraper_payload,
+                    duplicates=duplicates
+                )
+            raise HTTPException(status_code=500, detail="Failed to add to queue")
 
         # Check if scraper is already running
         if is_scraper_running():
@@ -150,8 +223,9 @@ async def create_submission(request: SubmissionRequest, api_key: str = Depends(v
             if add_to_queue(scraper_payload):
                 return SubmissionResponse(
                     ok=True,
-                    message="Data submitted to queue, will start processing once scraper is free",
-                    payload=scraper_payload
+                    message=f"Data submitted to queue, will start processing once scraper is free{skipped}",
+                    payload=scraper_payload,
+                    duplicates=duplicates
                 )
             else:
                 raise HTTPException(status_code=500, detail="Failed to add to queue")
@@ -176,8 +250,9 @@ async def create_submission(request: SubmissionRequest, api_key: str = Depends(v
             
             return SubmissionResponse(
                 ok=True,
-                message="Scraper started successfully in the background",
-                payload=scraper_payload
+                message=f"Scraper started successfully in the background{skipped}",
+                payload=scraper_payload,
+                duplicates=duplicates
             )
 
     except HTTPException:
@@ -1,71 +1,36 @@
 # Launch.py
 import os, re, time, json
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional
 from playwright.sync_api import Browser
-from helium_boot import boot_and_xray
-from getCategoryRev import get_category_revenue
+from browser_session import BrowserSession, get_session, release_session
+from helium_boot import find_tab, page_matches_target, send_xray_open, wait_for_results_tab
+from tab_tracker import track_tabs
+import xray_registry
+from stage_graph import Stage
+from getCategoryRev import get_category_revenue, load_more_and_settle
 from competitors import run_competitors_flow
 from monthlyrev import run_monthlyrev
 from profitcal import get_profitability_metrics
 from cerebro import open_amazon_page, open_cerebro_from_xray, cerebro_search, export_cerebro_csv
 from gpt import get_keywords_volumes_from_csv, get_gpt_response
-from sheet_writer import write_results_to_country_tabs
+from result_sinks import publish, flush_sinks, get_sinks
+import job_store
+import run_history
+import stage_cache
+import selector_cache
+from amazon_urls import canonical_url, asin_of
+from worker_pool import WorkerPool, POOL_SIZE
 
 # ---------------------------
 # QUEUE MANAGEMENT
 # ---------------------------
-QUEUE_FILE = "queue.json"
-FAILED_QUEUE_FILE = "failed_queue.json"
-LOCK_FILE = "queue.lock"
+# Jobs live in a SQLite (WAL) store; legacy queue.json / failed_queue.json are
+# imported on first start. See job_store.py.
+job_store.init_store()
 
 scraper_running = False
 queue_draining = False  # guard to avoid nested drains
 
-LOCK_TIMEOUT_SEC = 15
-LOCK_RETRY_MS = 100
-
-def _acquire_lock(timeout_sec: int = LOCK_TIMEOUT_SEC, retry_ms: int = LOCK_RETRY_MS):
-    """Create a lock file exclusively; retry until timeout."""
-    deadline = time.time() + timeout_sec
-    while True:
-        try:
-            fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_RDWR)
-            os.write(fd, str(os.getpid()).encode("utf-8"))
-            return fd
-        except FileExistsError:
-            if time.time() > deadline:
-                raise TimeoutError("[QUEUE] Could not acquire lock")
-            time.sleep(retry_ms / 1000.0)
-
-
-def _release_lock(fd: int):
-    """Remove lock file and close FD."""
-    try:
-        os.close(fd)
-    finally:
-        try:
-            os.remove(LOCK_FILE)
-        except FileNotFoundError:
-            pass
-
-
-def _safe_read_json(path: str):
-    if not os.path.exists(path):
-        return []
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        # Corrupt file fallback
-        return []
-
-
-def _safe_write_json(path: str, data):
-    tmp = f"{path}.tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)  # atomic on same filesystem
-
 
 def is_scraper_running():
     global scraper_running
@@ -78,74 +43,61 @@ def set_scraper_running(status: bool):
 
 
 def add_to_queue(payload: Dict[str, Any]):
-    """Append payload atomically under lock."""
+    """Append payload as a pending job (single INSERT)."""
     try:
-        fd = _acquire_lock()
-        try:
-            queue_data = _safe_read_json(QUEUE_FILE)
-            # optional: initialize a retry counter if you want later
-            if "retries" not in payload:
-                payload["retries"] = 0
-            queue_data.append(payload)
-            _safe_write_json(QUEUE_FILE, queue_data)
-            print(f"[QUEUE] Added payload. New size: {len(queue_data)}")
-            return True
-        finally:
-            _release_lock(fd)
+        # optional: initialize a retry counter if you want later
+        if "retries" not in payload:
+            payload["retries"] = 0
+        job_store.enqueue(payload)
+        print(f"[QUEUE] Added payload. New size: {job_store.count()}")
+        return True
     except Exception as e:
         print(f"[QUEUE ERROR] Failed to add to queue: {e}")
         return False
 
 
 def get_queue():
-    """Read current queue (non-locking read for informational purposes)."""
+    """Pending payloads in FIFO order (informational)."""
     try:
-        return _safe_read_json(QUEUE_FILE)
+        return job_store.list_payloads(job_store.STATUS_PENDING)
     except Exception as e:
         print(f"[QUEUE ERROR] Failed to read queue: {e}")
         return []
 
 
-def _pop_next_queue_item():
-    """Atomically pop the next item from the queue (FIFO). Returns None if empty."""
-    fd = _acquire_lock()
+def get_queue_size() -> int:
+    """Number of pending jobs (indexed COUNT, no payload decoding)."""
     try:
-        queue_data = _safe_read_json(QUEUE_FILE)
-        if not queue_data:
-            return None
-        item = queue_data.pop(0)
-        if queue_data:
-            _safe_write_json(QUEUE_FILE, queue_data)
-        else:
-            # queue now empty; remove file to avoid stale re-reads
-            try:
-                os.remove(QUEUE_FILE)
-            except FileNotFoundError:
-                pass
-        return item
-    finally:
-        _release_lock(fd)
+        return job_store.count(job_store.STATUS_PENDING)
+    except Exception as e:
+        print(f"[QUEUE ERROR] Failed to read queue size: {e}")
+        return 0
 
 
-def _push_failed_item(payload: Dict[str, Any], err_msg: str):
-    """Record failures for visibility/retry; does not requeue automatically."""
-    payload = dict(payload)
-    payload["error"] = err_msg
-    fd = _acquire_lock()
+def get_failed_queue():
+    """Failed payloads, each with its 'error' message."""
     try:
-        failed = _safe_read_json(FAILED_QUEUE_FILE)
-        failed.append(payload)
-        _safe_write_json(FAILED_QUEUE_FILE, failed)
-    finally:
-        _release_lock(fd)
+        return job_store.list_payloads(job_store.STATUS_FAILED)
+    except Exception as e:
+        print(f"[QUEUE ERROR] Failed to read failed queue: {e}")
+        return []
+
+
+def _pop_next_queue_item():
+    """Atomically lease the next pending job (FIFO). Returns (job_id, payload) or None."""
+    return job_store.lease_next()
+
+
+def _push_failed_item(job_id: int, err_msg: str):
+    """Record failures for visibility/retry; does not requeue automatically."""
+    job_store.mark_failed(job_id, err_msg)
 
 
 def clear_queue():
-    """Remove queue file (rarely needed now)."""
+    """Drop all pending jobs (rarely needed now)."""
     try:
-        if os.path.exists(QUEUE_FILE):
-            os.remove(QUEUE_FILE)
-            print("[QUEUE] Queue cleared")
+        n = job_store.delete_status(job_store.STATUS_PENDING)
+        print(f"[QUEUE] Queue cleared ({n} item(s))")
         return True
     except Exception as e:
         print(f"[QUEUE ERROR] Failed to clear queue: {e}")
@@ -165,23 +117,24 @@ def process_queue():
         failed = 0
 
         # quick peek for log
-        initial = len(get_queue())
+        initial = get_queue_size()
         if initial == 0:
             print("[QUEUE] No items in queue to process")
             return
         print(f"[QUEUE] Draining {initial} item(s)")
 
         while True:
-            payload = _pop_next_queue_item()  # <-- per-item commit
-            if payload is None:
+            leased = _pop_next_queue_item()  # <-- per-item commit
+            if leased is None:
                 break
+            job_id, payload = leased
 
             idx = processed + failed + 1
-            print(f"[QUEUE] Processing item {idx}")
+            print(f"[QUEUE] Processing item {idx} (job {job_id})")
 
             try:
                 # VERY IMPORTANT: mark as from_queue to prevent re-entrancy
-                result = run_scraper_main(payload, from_queue=True)
+                result = run_scraper_main(payload, from_queue=True, job_id=job_id)
                 if result.get("success"):
                     print(f"[QUEUE] Item {idx} processed successfully")
                     processed += 1
@@ -189,11 +142,11 @@ def process_queue():
                     msg = result.get("error", "Unknown error")
                     print(f"[QUEUE] Item {idx} failed: {msg}")
                     failed += 1
-                    _push_failed_item(payload, msg)
+                    _push_failed_item(job_id, msg)
             except Exception as e:
                 print(f"[QUEUE] Item {idx} failed with exception: {e}")
                 failed += 1
-                _push_failed_item(payload, str(e))
+                _push_failed_item(job_id, str(e))
 
         print(f"[QUEUE] Drain complete. Successful: {processed}, Failed: {failed}")
 
@@ -329,7 +282,7 @@ for d in [CEREBRO_DOWNLOAD_DIR, COMPETITORS_DOWNLOAD_DIR, MONTHLY_REV_DOWNLOAD_D
 MAX_RETRIES = 8
 
 # ---------------------------
-# XRAY opener (unchanged)
+# XRAY opener
 # ---------------------------
 def open_with_xray(
     browser: Browser,
@@ -367,48 +320,96 @@ def open_with_xray(
         try: popup.close()
         except Exception: pass
 
-    # Optional: light wait loop so navigation starts before next step
+    # Only the tab opened for target_url counts: other XRAY tabs (e.g. the category) may be open too.
     deadline = time.time() + wait_secs
-    while time.time() < deadline:
-        for pg in ctx.pages:
-            if "amazon." in pg.url:
-                try:
-                    pg.get_by_role("button", name=re.compile(r"\bExport\b", re.I)).first.wait_for(timeout=300)
-                    print("[SUCCESS] XRAY export UI detected.")
-                    return pg
-                except Exception:
-                    pass
-        time.sleep(0.25)
+    tracker = track_tabs(ctx)
+    pg = tracker.wait_for(lambda url: page_matches_target(url, target_url), wait_secs)
+    if pg is not None:
+        try:
+            left_ms = max(1000, (deadline - time.time()) * 1000)
+            pg.get_by_role("button", name=re.compile(r"\bExport\b", re.I)).first.wait_for(timeout=left_ms)
+            xray_registry.remember(browser, pg)
+            print("[SUCCESS] XRAY export UI detected.")
+            return pg
+        except Exception:
+            pass
     print("[warn] Did not positively detect XRAY within wait; proceeding anyway.")
     return None
 
 # ---------------------------
 # Per-product run
 # ---------------------------
+def _default_session() -> BrowserSession:
+    """This thread's warm Chrome session for the single-runner mode."""
+    return get_session(
+        chrome_path=CHROME_PATH,
+        user_data_dir=USER_DATA_DIR,
+        profile_dir=PROFILE_DIR,
+        ext_id=EXT_ID,
+        cdp_port=28000,
+    )
+
 def run_single_product(
     *,
     category_url: str,
     product_url: str,
-    keyword: str
+    keyword: str,
+    country: str = "",
+    session: Optional[BrowserSession] = None,
+    dirs: Optional[Dict[str, str]] = None,
+    force_refresh: bool = False,
+    memo_scope: Any = None
 ) -> Dict[str, Any]:
     """
-    Boot Chrome+XRAY, run full pipeline for one product, return structured results.
+    Open category with XRAY on a warm browser session, run full pipeline for one product,
+    return structured results. The session (driver + CDP connection) is reused across products.
+    `dirs` overrides the download dirs (keys: competitors, monthlyrev, cerebro) for pool workers.
+    `country` (the submission's) picks the marketplace when category_url doesn't name one.
+    Stage results still fresh in stage_cache are reused without touching the browser;
+    `force_refresh` re-scrapes everything (and refreshes the cache).
+    Products with the same `memo_scope` (the job id) compute category revenue and the
+    competitor pick once per category / category + keyword and share the result.
     """
     print("\n" + "="*80)
     print(f"[RUN] category_url={category_url}\n      product_url={product_url}\n      keyword={keyword}")
     print("="*80)
 
-    # Boot & land on category (ensures Helium is initialized for the marketplace)
-    pw, browser, ctx, _ = boot_and_xray(
-        chrome_path=CHROME_PATH,
-        user_data_dir=USER_DATA_DIR,
-        profile_dir=PROFILE_DIR,
-        ext_id=EXT_ID,
-        target_url=category_url,
-        cdp_port=28000,
-        wait_secs=60
-    )
-    print("[ok] boot complete; XRAY should be running.")
+    session = session or _default_session()
+    dirs = dirs or {}
+    competitors_dir = dirs.get("competitors", COMPETITORS_DOWNLOAD_DIR)
+    monthly_dir     = dirs.get("monthlyrev", MONTHLY_REV_DOWNLOAD_DIR)
+    cerebro_dir     = dirs.get("cerebro", CEREBRO_DOWNLOAD_DIR)
+
+    # Cache keys for this product's stages
+    cat_key      = stage_cache.category_key(category_url)
+    monthly_key  = stage_cache.asin_key(product_url)
+    comp_key     = stage_cache.competitors_key(category_url, keyword)
+    cerebro_key  = stage_cache.cerebro_key(product_url, keyword)
+
+    def cached(stage: str, key: Optional[str]):
+        hit = stage_cache.group_memo.peek((memo_scope, stage, key)) if memo_scope is not None and key else None
+        if hit is not None:
+            print(f"[MEMO] {stage}: shared from an earlier product of this job")
+            return hit
+        if force_refresh:
+            return None
+        hit = stage_cache.get(stage, key)
+        if hit is not None:
+            print(f"[CACHE] {stage}: fresh entry for {key}")
+        return hit
+
+    cached_category    = cached(stage_cache.CATEGORY_REVENUE, cat_key)
+    cached_competitors = cached(stage_cache.COMPETITORS, comp_key)
+    cached_monthly     = cached(stage_cache.MONTHLY_REVENUE, monthly_key)
+    cached_cerebro     = cached(stage_cache.CEREBRO, cerebro_key)
+    competitor_url     = ((cached_competitors or {}).get("picker_best") or {}).get("url")
+    cached_fees        = cached(stage_cache.FEES, stage_cache.asin_key(competitor_url)) if competitor_url else None
+
+    def shared(stage: str, key: str, scrape):
+        """Run scrape() once per job for this key; concurrent products wait and reuse its result."""
+        if memo_scope is None:
+            return scrape()
+        return stage_cache.group_memo.do((memo_scope, stage, key), scrape)
 
     # Initialize results container
     run_results: Dict[str, Any] = {
@@ -431,128 +432,220 @@ def run_single_product(
         "errors": []
     }
 
+    errors = run_results["errors"]  # list.append is atomic; stages may run on different threads
+
+    # Everything fresh in the cache: no browser work at all for this product
+    if all(v is not None for v in (cached_category, cached_competitors, cached_monthly, cached_fees, cached_cerebro)):
+        run_results["category_revenue"].update(cached_category)
+        run_results["competitors_flow"].update(cached_competitors)
+        run_results["monthly_revenue"]["meta"] = cached_monthly
+        run_results["profitability_metrics"] = cached_fees
+        run_results["keywords_volumes"].update(cached_cerebro)
+        _gpt_projection(run_results, errors)
+        print("[CACHE] All stages served from cache; browser not used.")
+        return run_results
+
+    if cached_category is not None and cached_competitors is not None:
+        # Category tab not needed: the remaining stages open their own tabs
+        browser, ctx = session.prepare()
+        print("[ok] session ready (category stages cached).")
+    else:
+        # Land on category (ensures Helium is initialized for the marketplace)
+        browser, ctx, _ = session.open_xray(category_url, wait_secs=60, country=country)
+        print("[ok] boot complete; XRAY should be running.")
+
+    # Set once this product's category tab has had 'Load More' clicked (by get_category_revenue or competitors)
+    category_expanded = [False]
+
     # ---- Category revenue (retry) ----
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            print("[Info] Getting Category Revenue")
-            rev = get_category_revenue(browser, wait_after_click_ms=60000)
-            run_results["category_revenue"]["text"]   = rev.get("text")
-            run_results["category_revenue"]["number"] = rev.get("number")
-            break
-        except Exception as e:
-            msg = f"category_revenue attempt {attempt} failed: {e}"
-            print("[ERROR]", msg)
-            run_results["errors"].append(msg)
-            if "xray not detected" in str(e).lower():
-                print("[WARN] XRAY not detected, rebooting browser...")
+    def stage_category_revenue(browser, ctx, upstream):
+        if cached_category is not None:
+            # tab stays unexpanded; competitors clicks Load More itself if it has to scrape
+            run_results["category_revenue"].update(cached_category)
+            return category_url
+        tab_url = [category_url]
+
+        def scrape():
+            for attempt in range(1, MAX_RETRIES + 1):
                 try:
-                    [p.close() for p in ctx.pages]
-                except Exception:
-                    pass
-                browser.close(); pw.stop()
-                pw, browser, ctx, _ = boot_and_xray(
-                    chrome_path=CHROME_PATH,
-                    user_data_dir=USER_DATA_DIR,
-                    profile_dir=PROFILE_DIR,
-                    ext_id=EXT_ID,
-                    target_url=category_url,
-                    cdp_port=28000,
-                    wait_secs=60
-                )
-            if attempt == MAX_RETRIES:
-                print("[ERROR] Category revenue: max retries reached.")
+                    print("[Info] Getting Category Revenue")
+                    page = find_tab(ctx, category_url)
+                    if page is None:
+                        raise RuntimeError("XRAY not detected on the category tab.")
+                    rev = get_category_revenue(browser, wait_after_click_ms=60000, page=page)
+                    category_expanded[0] = True
+                    tab_url[0] = page.url
+                    value = {"text": rev.get("text"), "number": rev.get("number")}
+                    run_results["category_revenue"].update(value)
+                    if value["number"] is None:
+                        return None
+                    stage_cache.put(stage_cache.CATEGORY_REVENUE, cat_key, value)
+                    return value
+                except Exception as e:
+                    msg = f"category_revenue attempt {attempt} failed: {e}"
+                    print("[ERROR]", msg)
+                    errors.append(msg)
+                    if "xray not detected" in str(e).lower():
+                        # other stages share this Chrome, so re-open the category tab instead of rebooting
+                        print("[WARN] XRAY not detected, re-opening category with XRAY...")
+                        stale = find_tab(ctx, category_url, timeout_s=0)
+                        if stale:
+                            try: stale.close()
+                            except Exception: pass
+                        send_xray_open(ctx, ext_id=EXT_ID, target_url=category_url)
+                        wait_for_results_tab(ctx, wait_secs=60, target_url=category_url, country=country)
+                    if attempt == MAX_RETRIES:
+                        print("[ERROR] Category revenue: max retries reached.")
+            return None
 
-    # ---- Monthly revenue for THIS product ----
-    try:
-        print("[Info] Opening product for monthly revenue + profit calc.")
-        open_with_xray(browser, ext_id=EXT_ID, target_url=product_url, wait_secs=50, popup_visible=False)
-    except Exception as e:
-        msg = f"open_with_xray(product) failed: {e}"
-        print("[ERROR]", msg)
-        run_results["errors"].append(msg)
+        value = shared(stage_cache.CATEGORY_REVENUE, cat_key, scrape)
+        if value is not None:
+            run_results["category_revenue"].update(value)
+        return tab_url[0]
 
-    try:
-        print("[Info] Getting Monthly Revenue CSV.")
-        meta = run_monthlyrev(browser, download_dir=MONTHLY_REV_DOWNLOAD_DIR)
-        run_results["monthly_revenue"]["meta"] = meta
-    except Exception as e:
-        msg = f"run_monthlyrev failed: {e}"
-        print("[ERROR]", msg)
-        run_results["errors"].append(msg)
-    finally:
-        # cleanup monthlyrev CSVs
-        for file in os.listdir(MONTHLY_REV_DOWNLOAD_DIR):
-            if file.endswith(".csv"):
-                try: os.remove(os.path.join(MONTHLY_REV_DOWNLOAD_DIR, file))
-                except Exception: pass
+    # ---- Monthly revenue for THIS product ----
+    def stage_monthly_revenue(browser, ctx, upstream):
+        if cached_monthly is not None:
+            run_results["monthly_revenue"]["meta"] = cached_monthly
+            return
+        page = None
+        try:
+            print("[Info] Opening product for monthly revenue + profit calc.")
+            page = open_with_xray(browser, ext_id=EXT_ID, target_url=product_url, wait_secs=50, popup_visible=False)
+        except Exception as e:
+            msg = f"open_with_xray(product) failed: {e}"
+            print("[ERROR]", msg)
+            errors.append(msg)
 
-    # ---- Competitors flow (retry) ----
-    COMPETITOR_PRODUCT_URL = None
-    for attempt in range(1, MAX_RETRIES + 1):
         try:
-            print("[Info] Running Competitors flow.")
-            result = run_competitors_flow(
-                browser,
-                download_dir=COMPETITORS_DOWNLOAD_DIR,
-                max_input_visible_index=7,
-                max_value="1000",
-                title_keyword=keyword,
-                wait_after_apply_ms=8000,
-                picker_within_years=2,
-                try_read_updated_revenue=True,
-            )
-            run_results["competitors_flow"]["raw_result"] = result
-            pb = result.get("picker_best") or {}
-            if pb.get("url") and pb.get("product_details") and pb.get("parent_level_revenue"):
-                run_results["competitors_flow"]["picker_best"] = pb
-                COMPETITOR_PRODUCT_URL = pb["url"]
-                break
-            else:
-                raise ValueError("No qualifying product found in CSV.")
+            print("[Info] Getting Monthly Revenue CSV.")
+            page = page or find_tab(ctx, product_url)
+            if page is None:
+                # never fall back to "any XRAY tab": the category tab may be open alongside
+                raise RuntimeError("XRAY not detected on the product tab (monthlyrev).")
+            meta = run_monthlyrev(browser, download_dir=monthly_dir, page=page)
+            run_results["monthly_revenue"]["meta"] = meta
+            if meta and meta.get("parent_level_revenue") is not None:
+                stage_cache.put(stage_cache.MONTHLY_REVENUE, monthly_key, meta)
         except Exception as e:
-            msg = f"competitors_flow attempt {attempt} failed: {e}"
+            msg = f"run_monthlyrev failed: {e}"
             print("[ERROR]", msg)
-            run_results["errors"].append(msg)
-            if attempt == MAX_RETRIES:
-                print("[ERROR] Competitors flow: max retries reached.")
+            errors.append(msg)
         finally:
-            # cleanup competitor CSVs
-            for file in os.listdir(COMPETITORS_DOWNLOAD_DIR):
+            # cleanup monthlyrev CSVs
+            for file in os.listdir(monthly_dir):
                 if file.endswith(".csv"):
-                    try: os.remove(os.path.join(COMPETITORS_DOWNLOAD_DIR, file))
+                    try: os.remove(os.path.join(monthly_dir, file))
                     except Exception: pass
 
+    # ---- Competitors flow (retry) ----
+    # Reads the same category XRAY table after 'Load More', so it follows category revenue.
+    def stage_competitors(browser, ctx, upstream):
+        if cached_competitors is not None:
+            run_results["competitors_flow"].update(cached_competitors)
+            return competitor_url
+        category_tab_url = upstream.get("category_revenue") or category_url
+
+        def scrape():
+            for attempt in range(1, MAX_RETRIES + 1):
+                try:
+                    print("[Info] Running Competitors flow.")
+                    page = find_tab(ctx, category_tab_url) or find_tab(ctx, category_url, timeout_s=0)
+                    if page is None:
+                        raise RuntimeError("XRAY not detected on the category tab (competitors).")
+                    if not category_expanded[0]:
+                        # category revenue came from the job memo / stage cache: nobody clicked Load More on this tab
+                        print("[Info] Expanding the category table for the competitor pick.")
+                        page.bring_to_front()
+                        load_more_and_settle(page, wait_after_click_ms=60000)
+                        category_expanded[0] = True
+                    result = run_competitors_flow(
+                        browser,
+                        download_dir=competitors_dir,
+                        max_input_visible_index=7,
+                        max_value="1000",
+                        title_keyword=keyword,
+                        wait_after_apply_ms=8000,
+                        picker_within_years=2,
+                        try_read_updated_revenue=True,
+                        page=page,
+                    )
+                    run_results["competitors_flow"]["raw_result"] = result
+                    pb = result.get("picker_best") or {}
+                    if pb.get("url") and pb.get("product_details") and pb.get("parent_level_revenue"):
+                        run_results["competitors_flow"]["picker_best"] = pb
+                        value = dict(run_results["competitors_flow"])
+                        stage_cache.put(stage_cache.COMPETITORS, comp_key, value)
+                        return value
+                    else:
+                        raise ValueError("No qualifying product found in CSV.")
+                except Exception as e:
+                    msg = f"competitors_flow attempt {attempt} failed: {e}"
+                    print("[ERROR]", msg)
+                    errors.append(msg)
+                    if attempt == MAX_RETRIES:
+                        print("[ERROR] Competitors flow: max retries reached.")
+                finally:
+                    # cleanup competitor CSVs
+                    for file in os.listdir(competitors_dir):
+                        if file.endswith(".csv"):
+                            try: os.remove(os.path.join(competitors_dir, file))
+                            except Exception: pass
+            return None
+
+        value = shared(stage_cache.COMPETITORS, comp_key, scrape)
+        if value is None:
+            return None
+        run_results["competitors_flow"].update(value)
+        return value["picker_best"]["url"]
+
     # ---- Profitability metrics (retry, only if we got a competitor URL) ----
-    if COMPETITOR_PRODUCT_URL:
+    def stage_profitability(browser, ctx, upstream):
+        competitor_product_url = upstream.get("competitors")
+        if not competitor_product_url:
+            return
+        fees_key = stage_cache.asin_key(competitor_product_url)
+        hit = cached_fees if competitor_product_url == competitor_url else None
+        hit = hit if hit is not None else cached(stage_cache.FEES, fees_key)
+        if hit is not None:
+            run_results["profitability_metrics"] = hit
+            return
         for attempt in range(1, MAX_RETRIES + 1):
             try:
                 print("[Info] Getting Profitability Calculator metrics.")
                 metrics = get_profitability_metrics(
                     browser,
-                    product_url=COMPETITOR_PRODUCT_URL,
+                    product_url=competitor_product_url,
                     wait_secs=60,
                     close_all_tabs_first=False,
-                    close_others_after_open=True,
+                    close_others_after_open=False,  # other stages' tabs may still be working
+                    close_page_after=True,
                 )
                 for k in run_results["profitability_metrics"]:
                     run_results["profitability_metrics"][k]["text"]   = metrics[k]["text"]
                     run_results["profitability_metrics"][k]["number"] = metrics[k]["number"]
+                if any(v["number"] is not None for v in run_results["profitability_metrics"].values()):
+                    stage_cache.put(stage_cache.FEES, fees_key, run_results["profitability_metrics"])
                 break
             except Exception as e:
                 msg = f"profitability_metrics attempt {attempt} failed: {e}"
                 print("[ERROR]", msg)
-                run_results["errors"].append(msg)
+                errors.append(msg)
                 if attempt == MAX_RETRIES:
                     print("[ERROR] Profitability: max retries reached.")
 
     # ---- Cerebro: extract ASIN, search keyword, export CSV, GPT step ----
-    asin_match = re.search(r"/dp/([A-Z0-9]{10})", product_url)
-    ASIN = asin_match.group(1) if asin_match else None
-    if not ASIN:
-        msg = "[WARN] Could not parse ASIN from product_url; skipping Cerebro."
-        print(msg)
-        run_results["errors"].append(msg)
-    else:
+    def stage_cerebro(browser, ctx, upstream):
+        if cached_cerebro is not None:
+            run_results["keywords_volumes"].update(cached_cerebro)
+            _gpt_projection(run_results, errors)
+            return
+        ASIN = asin_of(product_url)
+        if not ASIN:
+            msg = "[WARN] Could not parse ASIN from product_url; skipping Cerebro."
+            print(msg)
+            errors.append(msg)
+            return
         for attempt in range(1, MAX_RETRIES + 1):
             try:
                 print("[Info] Cerebro flow.")
@@ -562,7 +655,7 @@ def run_single_product(
 
                 csv_path = export_cerebro_csv(
                     cerebro_tab,
-                    CEREBRO_DOWNLOAD_DIR,
+                    cerebro_dir,
                     filename_hint=f"cerebro_{ASIN}_{keyword}.csv"
                 )
                 print("[DONE] Cerebro CSV saved to:", csv_path)
@@ -570,6 +663,8 @@ def run_single_product(
                 user_prompt, search_volumes = get_keywords_volumes_from_csv(csv_path)
                 run_results["keywords_volumes"]["user_prompt"]    = user_prompt
                 run_results["keywords_volumes"]["search_volumes"] = search_volumes
+                if search_volumes:
+                    stage_cache.put(stage_cache.CEREBRO, cerebro_key, run_results["keywords_volumes"])
 
                 projections = get_gpt_response(user_prompt, search_volumes)
                 run_results["gpt_projection"]["response"] = projections
@@ -577,40 +672,69 @@ def run_single_product(
             except Exception as e:
                 msg = f"cerebro attempt {attempt} failed: {e}"
                 print("[ERROR]", msg)
-                run_results["errors"].append(msg)
+                errors.append(msg)
                 if attempt == MAX_RETRIES:
                     print("[ERROR] Cerebro: max retries reached.")
             finally:
-                for file in os.listdir(CEREBRO_DOWNLOAD_DIR):
+                for file in os.listdir(cerebro_dir):
                     if file.endswith(".csv"):
-                        try: os.remove(os.path.join(CEREBRO_DOWNLOAD_DIR, file))
+                        try: os.remove(os.path.join(cerebro_dir, file))
                         except Exception: pass
-    try:
-        for p in ctx.pages:
-            try:
-                p.close()
-            except Exception:
-                pass
-    except Exception:
-        pass
 
-    # teardown for this product
-    try:
-        browser.close()
-    except Exception:
-        pass
-    try:
-        pw.stop()
-    except Exception:
-        pass
+    # Stage graph: category -> competitors -> profitability is the critical path;
+    # monthly revenue and Cerebro+GPT run alongside it on their own tabs.
+    stages = [
+        Stage("category_revenue", stage_category_revenue),
+        Stage("competitors", stage_competitors, deps=("category_revenue",)),
+        Stage("profitability", stage_profitability, deps=("competitors",)),
+        Stage("monthly_revenue", stage_monthly_revenue),
+        Stage("cerebro", stage_cerebro),
+    ]
+    outcome = session.stage_runner().run(stages, browser=browser, ctx=ctx)
+    for name, (_, err) in outcome.items():
+        if err is not None:
+            msg = f"{name} stage failed: {err}"
+            print("[ERROR]", msg)
+            errors.append(msg)
+
+    # close this product's tabs; driver + CDP connection stay warm for the next product
+    session.finish_product()
 
     return run_results
 
 
+def _gpt_projection(run_results: Dict[str, Any], errors: List[str]):
+    """GPT step on cached Cerebro volumes (no browser needed)."""
+    kv = run_results["keywords_volumes"]
+    try:
+        run_results["gpt_projection"]["response"] = get_gpt_response(kv["user_prompt"], kv["search_volumes"])
+    except Exception as e:
+        msg = f"gpt projection (cached volumes) failed: {e}"
+        print("[ERROR]", msg)
+        errors.append(msg)
+
+
 # ---------------------------
 # Payload processor
 # ---------------------------
-def process_brands(payload: Dict[str, Any]) -> Dict[str, Any]:
+def _assemble_runs(payload: Dict[str, Any], results_by_seq: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Rebuild the brand -> country -> product output from committed per-product results."""
+    out: Dict[str, Any] = {"runs": []}
+    seq = 0
+    for b in payload.get("brands", []):
+        brand_block = {"brand": (b.get("brand") or "").strip(), "countries": []}
+        for c in b.get("countries", []):
+            country_block = {"name": (c.get("name") or "").strip(), "products": []}
+            for _ in c.get("products", []):
+                if seq in results_by_seq:
+                    country_block["products"].append(results_by_seq[seq])
+                seq += 1
+            brand_block["countries"].append(country_block)
+        out["runs"].append(brand_block)
+    return out
+
+
+def process_brands(payload: Dict[str, Any], *, job_id: Optional[int] = None) -> Dict[str, Any]:
     """
     payload format (Python dict from frontend JSON):
     {
@@ -630,48 +754,95 @@ def process_brands(payload: Dict[str, Any]) -> Dict[str, Any]:
         }
       ]
     }
-    """
-    out: Dict[str, Any] = {"runs": []}
 
-    for b in payload.get("brands", []):
-        brand_name = (b.get("brand") or "").strip()
-        brand_block = {"brand": brand_name, "countries": []}
+    Each product is a work item in the job store; its result is committed as
+    soon as it finishes, and products already committed for `job_id` are
+    skipped (resume after a crash/restart).
+    """
+    if job_id is None:
+        job_id = job_store.enqueue(payload, status=job_store.STATUS_LEASED)
+    job_store.ensure_items(job_id, payload)
+
+    todo = job_store.unfinished_items(job_id)
+    total = sum(1 for _ in job_store.iter_payload_products(payload))
+    if todo and len(todo) < total:
+        print(f"[RESUME] Job {job_id}: {total - len(todo)}/{total} product(s) already done; "
+              f"resuming at product {todo[0]['seq'] + 1}")
+
+    for item in todo:
+        item["job_id"] = job_id
+        try:
+            block = _run_work_item(item)
+        except Exception as e:
+            # Record it and keep going; the job's status is decided once every item is settled
+            print(f"[ERROR] Product {item['seq'] + 1} failed: {e}")
+            job_store.fail_item(item["id"], str(e))
+            continue
 
-        for c in b.get("countries", []):
-            country_name = (c.get("name") or "").strip()
-            country_block = {"name": country_name, "products": []}
-
-            for p in c.get("products", []):
-                productname = p.get("productname") or ""
-                product_url = p.get("url") or ""
-                keyword     = p.get("keyword") or ""
-                categoryUrl = p.get("categoryUrl") or ""
-
-                # Run full pipeline for this product
-                result = run_single_product(
-                    category_url=categoryUrl,
-                    product_url=product_url,
-                    keyword=keyword
-                )
+        # Checkpoint: this product survives a crash on the next one
+        job_store.complete_item(item["id"], block)
+        _publish_item(item, block)
 
-                country_block["products"].append({
-                    "productname": productname,
-                    "url": product_url,
-                    "keyword": keyword,
-                    "categoryUrl": categoryUrl,
-                    "result": result
-                })
+    return _assemble_runs(payload, job_store.item_results(job_id))
 
-            brand_block["countries"].append(country_block)
-        out["runs"].append(brand_block)
 
-    return out
+def _run_work_item(
+    item: Dict[str, Any],
+    session: Optional[BrowserSession] = None,
+    dirs: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Run the full pipeline for one job item; returns the product block stored as its result."""
+    p = item["product"]
+    productname = p.get("productname") or ""
+    product_url = canonical_url(p.get("url") or "")  # no-op for submissions canonicalized at ingest
+    keyword     = p.get("keyword") or ""
+    categoryUrl = canonical_url(p.get("categoryUrl") or "")
+
+    result = run_single_product(
+        category_url=categoryUrl,
+        product_url=product_url,
+        keyword=keyword,
+        country=item.get("country") or "",
+        session=session,
+        dirs=dirs,
+        force_refresh=bool(p.get("forceRefresh")),
+        memo_scope=item.get("job_id")
+    )
+    return {
+        "productname": productname,
+        "url": product_url,
+        "keyword": keyword,
+        "categoryUrl": categoryUrl,
+        "result": result
+    }
 
 # ---------------------------
 # Main function for backend integration
 # ---------------------------
-
-def run_scraper_main(payload, *, from_queue: bool = False):
+def _publish_item(item: Dict[str, Any], block: Dict[str, Any]):
+    """Append a finished product to the run history, then fan it out to the result sinks (RESULT_SINKS)."""
+    try:
+        run_history.append(item.get("job_id"), item.get("seq"), item.get("brand"), item.get("country"), block)
+    except Exception as e:
+        # job_items still holds the result; a history write must not fail the product
+        print(f"[WARN] Run history append failed for product {item.get('seq')}: {e}")
+    publish({
+        "job_id": item.get("job_id"),
+        "seq": item.get("seq"),
+        "brand": item.get("brand") or "",
+        "country": item.get("country") or "",
+        "block": block,
+    })
+
+def _finish_run(job_id: int):
+    """Flush the result sinks; every product line is already in the job's run history file."""
+    stage_cache.group_memo.forget(job_id)
+    flush_sinks()
+    print(f"[DONE] All runs complete. History: {run_history.run_path(job_id)}")
+    print(f"[Info] Results published to: {', '.join(s.name for s in get_sinks()) or 'no sinks'}")
+    selector_cache.report()
+
+def run_scraper_main(payload, *, from_queue: bool = False, job_id: Optional[int] = None):
     """
     Main function to run the scraper with payload from backend
     Returns: dict with results and status
@@ -680,20 +851,22 @@ def run_scraper_main(payload, *, from_queue: bool = False):
     try:
         print(f"[INFO] Starting scraper with {len(payload.get('brands', []))} brands")
 
-        results = process_brands(payload)
-
-        with open("full_runs.json", "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-
-        print("[DONE] All runs complete. Saved to full_runs.json")
-
-        print("\n[Info] Logging to googlesheet")
-        try:
-            write_results_to_country_tabs(results)
-            print("[SUCCESS] Results logged to Google Sheets")
-        except Exception as e:
-            print(f"[WARNING] Error logging to sheets: {e}")
-
+        # Direct submissions are recorded as a (leased) job too, so a crash mid-run resumes on restart
+        if job_id is None:
+            job_id = job_store.enqueue(payload, status=job_store.STATUS_LEASED)
+
+        results = process_brands(payload, job_id=job_id)
+        _finish_run(job_id)
+        job_store.close_job_if_finished(job_id)  # done, or failed if any product failed
+
+        job = job_store.get_job(job_id) or {}
+        if job.get("status") == job_store.STATUS_FAILED:
+            return {
+                "success": False,
+                "results": results,
+                "error": job.get("error") or "Some products failed",
+                "message": "Scraper finished with failed products",
+            }
         return {
             "success": True,
             "results": results,
@@ -703,6 +876,8 @@ def run_scraper_main(payload, *, from_queue: bool = False):
     except Exception as e:
         error_msg = f"[ERROR] Failed to process brands: {e}"
         print(error_msg)
+        if job_id is not None:
+            job_store.mark_failed(job_id, str(e))
         return {
             "success": False,
             "error": str(e),
@@ -715,6 +890,8 @@ def run_scraper_main(payload, *, from_queue: bool = False):
         if not from_queue:
             print("[INFO] Checking for queued items...")
             process_queue()
+            # this thread is done; drop its driver (Chrome keeps running for the next run)
+            release_session()
 
 # def run_scraper_main(payload):
 #     """
@@ -764,6 +941,42 @@ def run_scraper_main(payload, *, from_queue: bool = False):
 #         print("[INFO] Checking for queued items...")
 #         process_queue()
 
+# ---------------------------
+# Worker pool mode (SCRAPER_POOL_SIZE > 0)
+# ---------------------------
+worker_pool: Optional[WorkerPool] = None
+
+def _finalize_pool_job(job_id: int):
+    """Called by the pool once the last product of a job is committed."""
+    job = job_store.get_job(job_id)
+    if not job:
+        return
+    print(f"[POOL] Job {job_id} finished ({job['status']})")
+    _finish_run(job_id)
+
+def start_worker_pool(size: int = POOL_SIZE) -> Optional[WorkerPool]:
+    """Start N Chrome workers draining per-product items from the job store (idempotent)."""
+    global worker_pool
+    if worker_pool is None and size > 0:
+        worker_pool = WorkerPool(
+            size,
+            run_item=_run_work_item,
+            finalize_job=_finalize_pool_job,
+            on_item_done=_publish_item,
+            chrome_path=CHROME_PATH,
+            user_data_dir=USER_DATA_DIR,
+            profile_dir=PROFILE_DIR,
+            ext_id=EXT_ID,
+            base_export_dir=BASE_EXPORT_DIR,
+        )
+        worker_pool.start()
+    return worker_pool
+
+def get_pool_status() -> Dict[str, Any]:
+    if worker_pool is None:
+        return {"pool_size": 0, "active_workers": 1 if is_scraper_running() else 0}
+    return worker_pool.status()
+
 # ---------------------------
 # Standalone entrypoint (for testing)
 # ---------------------------
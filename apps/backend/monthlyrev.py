@@ -222,21 +222,13 @@ import os, re, time, csv
 from datetime import datetime
 from typing import Optional, Dict, Any
 from playwright.sync_api import Browser, Page
+from xray_capture import captured_rows
+from page_extract import extract_all, wait_for_field
+from selector_cache import try_strategies
+from amazon_urls import extract_asin_from_url
+from xray_registry import find_xray_page
 
 # ---------- ASIN helpers ----------
-_ASIN_PATTERNS = [
-    re.compile(r"/dp/([A-Z0-9]{10})(?:[/?]|$)", re.I),
-    re.compile(r"/gp/product/([A-Z0-9]{10})(?:[/?]|$)", re.I),
-    re.compile(r"[?&]asin=([A-Z0-9]{10})(?:[&#]|$)", re.I),
-]
-
-def extract_asin_from_url(url: str) -> Optional[str]:
-    if not url: return None
-    for rx in _ASIN_PATTERNS:
-        m = rx.search(url)
-        if m: return m.group(1).upper()
-    return None
-
 def extract_asin_from_dom(page: Page) -> Optional[str]:
     # Try canonical <link> or any obvious meta/element with ASIN
     try:
@@ -253,27 +245,6 @@ def extract_asin_from_dom(page: Page) -> Optional[str]:
     return None  # URL route is usually enough
 
 # ---------- XRAY page locator (same strategy as competitors) ----------
-def _find_xray_page(browser: Browser, timeout_ms: int = 2000) -> Optional[Page]:
-    deadline = time.time() + (timeout_ms / 1000.0)
-    while time.time() < deadline:
-        for ctx in browser.contexts:
-            for pg in ctx.pages:
-                if "amazon." not in pg.url:
-                    continue
-                # Prefer detecting the XRAY overlay text; fall back to Export button
-                try:
-                    pg.get_by_text("Xray", exact=False).first.wait_for(timeout=400)
-                    return pg
-                except Exception:
-                    pass
-                try:
-                    pg.get_by_role("button", name=re.compile(r"\bExport\b", re.I)).first.wait_for(timeout=300)
-                    return pg
-                except Exception:
-                    pass
-        time.sleep(0.15)
-    return None
-
 # ---------- click helper ----------
 def _click_like_a_human_then_programmatic(page: Page, loc) -> bool:
     try: loc.scroll_into_view_if_needed(timeout=1500)
@@ -296,25 +267,13 @@ def scrape_parent_level_revenue_from_page(page: Page) -> Optional[Dict[str, Any]
       { "parent_level_revenue_text": str, "parent_level_revenue": float }
     or None if not found.
     """
-    # Try to ensure the column header exists (not strictly required, but helpful)
-    try:
-        page.locator(
-            "[data-table-name='xray-amazon-table'][data-field-name='estMonthlyRevenue']"
-        ).first.wait_for(timeout=4000)
-    except Exception:
-        print("[WARN] 'Parent Level Revenue' header not confirmed; continuing to value cell lookup.")
-
-    # Primary selector from your HTML
-    value_loc = page.locator("[data-testid='table-cell-estMonthlyRevenue']").first
-    try:
-        value_loc.wait_for(state="visible", timeout=5000)
-        txt = value_loc.inner_text().strip()
-        num = _parse_money_to_float(txt)
-        print(f"[SUCCESS] Scraped Parent Level Revenue from DOM: text={txt} parsed={num}")
-        return {"parent_level_revenue_text": txt, "parent_level_revenue": num}
-    except Exception as e:
-        print("[ERROR] Could not scrape Parent Level Revenue from DOM:", e)
+    txt = extract_all(page).get("parent_level_revenue") or wait_for_field(page, "parent_level_revenue", timeout_ms=8000)
+    if not txt:
+        print("[ERROR] Could not scrape Parent Level Revenue from DOM: value cell not found")
         return None
+    num = _parse_money_to_float(txt)
+    print(f"[SUCCESS] Scraped Parent Level Revenue from DOM: text={txt} parsed={num}")
+    return {"parent_level_revenue_text": txt, "parent_level_revenue": num}
 
 
 # ---------- export flow ----------
@@ -325,36 +284,43 @@ def _export_csv(page: Page, download_dir: str) -> Optional[str]:
     os.makedirs(download_dir, exist_ok=True)
 
     # Open Export
-    export_btn = page.get_by_role("button", name=re.compile(r"\bExport\b", re.I))
-    try:
-        export_btn.click(timeout=2000)
-    except Exception:
+    def open_by_role():
+        page.get_by_role("button", name=re.compile(r"\bExport\b", re.I)).click(timeout=2000)
+
+    def open_by_css():
         page.locator(
             "button:has-text('Export'), .sc-eoEtVK:has-text('Export'), "
             ".sc-ePzlA-D:has-text('Export'), :is(button,div,span,a)[role='button']:has-text('Export')"
         ).first.evaluate("el=>el.click()")
+
+    try_strategies("xray_export.open", [("role", open_by_role), ("css", open_by_css)])
     print("[INFO] Export menu opened.")
 
-    # Find CSV tile
-    menu_root = page.locator("div.sc-eWhHU").filter(has=page.locator("div.sc-brSOsn")).first
-    try:
+    # Find CSV tile (same learned order as competitors' export: same Helium menu)
+    def tile_in_menu():
+        menu_root = page.locator("div.sc-eWhHU").filter(has=page.locator("div.sc-brSOsn")).first
         menu_root.wait_for(timeout=5000)
-    except Exception:
-        menu_root = None
-        print("[WARN] .sc-eWhHU not visible; searching CSV tile globally.")
+        tile = menu_root.locator("div.sc-brSOsn", has_text=re.compile(r"\bCSV\b", re.I)).first
+        tile.wait_for(state="visible", timeout=2500)
+        return tile
 
-    try:
-        if menu_root:
-            csv_tile = menu_root.locator("div.sc-brSOsn", has_text=re.compile(r"\bCSV\b", re.I)).first
-            csv_tile.wait_for(state="visible", timeout=2500)
-        else:
-            csv_tile = page.locator("div.sc-brSOsn", has_text=re.compile(r"\bCSV\b", re.I)).first
-            csv_tile.wait_for(state="visible", timeout=3000)
-    except Exception:
-        csv_tile = page.locator(
+    def tile_global():
+        tile = page.locator("div.sc-brSOsn", has_text=re.compile(r"\bCSV\b", re.I)).first
+        tile.wait_for(state="visible", timeout=3000)
+        return tile
+
+    def tile_by_text():
+        tile = page.locator(
             ":is(div,button,span,a):has-text('as a CSV file'), :is(div,button,span,a):has-text('CSV')"
         ).first
-        csv_tile.wait_for(state="visible", timeout=3000)
+        tile.wait_for(state="visible", timeout=3000)
+        return tile
+
+    _, csv_tile = try_strategies("xray_export.csv_tile", [
+        ("menu", tile_in_menu),
+        ("tile", tile_global),
+        ("text", tile_by_text),
+    ])
 
     # Native download only (no sniff)
     try:
@@ -389,6 +355,39 @@ def _parse_money_to_float(txt: Optional[str]) -> Optional[float]:
     except Exception:
         return None
 
+def _match_asin_row(rows, fieldnames, target_asin: str) -> Optional[Dict[str, Any]]:
+    """Scan XRAY rows (CSV DictReader or captured JSON rows) for target_asin."""
+    if not fieldnames:
+        return None
+
+    # Build a normalized header map
+    header_map = { _norm(h): h for h in fieldnames }
+
+    asin_col = header_map.get('asin')
+    url_col  = header_map.get('url')
+    # Be tolerant to spacing or unicode: "Parent Level Revenue"
+    plr_col  = None
+    for k, v in header_map.items():
+        if k in ('parentlevelrevenue', 'parentrevenue', 'parentlvlrevenue'):
+            plr_col = v; break
+
+    if not (asin_col and url_col and plr_col):
+        return None
+
+    for row in rows:
+        asin_val = (row.get(asin_col) or '').strip().upper()
+        if asin_val == target_asin:
+            revenue_txt = (row.get(plr_col) or '').strip()
+            revenue_num = _parse_money_to_float(revenue_txt)
+            product_url = (row.get(url_col) or '').strip()
+            return {
+                "asin": target_asin,
+                "product_url": product_url,
+                "parent_level_revenue": revenue_num,        # numeric (float) if parseable, else None
+                "parent_level_revenue_text": revenue_txt,   # original text e.g. "$12,345"
+            }
+    return None
+
 def find_parent_level_revenue(csv_path: str, target_asin: Optional[str]) -> Optional[Dict[str, Any]]:
     """
     From the Helium XRAY CSV, find the row whose ASIN == target_asin and
@@ -400,48 +399,17 @@ def find_parent_level_revenue(csv_path: str, target_asin: Optional[str]) -> Opti
 
     with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
         dr = csv.DictReader(f)
-        if not dr.fieldnames:
-            return None
-
-        # Build a normalized header map
-        header_map = { _norm(h): h for h in dr.fieldnames }
-
-        asin_col = header_map.get('asin')
-        url_col  = header_map.get('url')
-        # Be tolerant to spacing or unicode: "Parent Level Revenue"
-        plr_col  = None
-        for k, v in header_map.items():
-            if k in ('parentlevelrevenue', 'parentrevenue', 'parentlvlrevenue'):
-                plr_col = v; break
-        if not (asin_col and url_col and plr_col):
-            # If any key is missing, try fuzzy search
-            def find_like(needle):
-                for raw in dr.fieldnames:
-                    if _norm(raw) == needle:
-                        return raw
-                return None
-            asin_col = asin_col or find_like('asin')
-            url_col  = url_col  or find_like('url')
-            plr_col  = plr_col  or find_like('parentlevelrevenue')
-
-        if not (asin_col and url_col and plr_col):
-            return None
-
-        for row in dr:
-            asin_val = (row.get(asin_col) or '').strip().upper()
-            if asin_val == target_asin:
-                revenue_txt = (row.get(plr_col) or '').strip()
-                revenue_num = _parse_money_to_float(revenue_txt)
-                product_url = (row.get(url_col) or '').strip()
-                return {
-                    "asin": target_asin,
-                    "file_name": os.path.basename(csv_path),
-                    "product_url": product_url,
-                    "parent_level_revenue": revenue_num,        # numeric (float) if parseable, else None
-                    "parent_level_revenue_text": revenue_txt,   # original text e.g. "$12,345"
-                }
-
-    return None
+        summary = _match_asin_row(dr, dr.fieldnames, target_asin)
+    if summary:
+        summary["file_name"] = os.path.basename(csv_path)
+    return summary
+
+def find_parent_level_revenue_in_rows(rows, target_asin: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Same lookup as find_parent_level_revenue, over XRAY rows captured from the network."""
+    if not target_asin or not rows:
+        return None
+    fieldnames = list({k: None for r in rows for k in r})
+    return _match_asin_row(rows, fieldnames, target_asin.strip().upper())
 
 
 
@@ -449,18 +417,20 @@ def find_parent_level_revenue(csv_path: str, target_asin: Optional[str]) -> Opti
 def run_monthlyrev(
     browser: Browser,
     *,
-    download_dir: str = None
+    download_dir: str = None,
+    page: Optional[Page] = None
 ) -> Dict[str, Any]:
     """
-    Find the XRAY product page, extract ASIN, then:
-      1) Try CSV export and parse Parent Level Revenue for this ASIN.
-      2) If CSV fails, scrape Parent Level Revenue directly from DOM.
+    Find the XRAY product page (or use `page`), extract ASIN, then:
+      1) Read Parent Level Revenue for this ASIN from captured XRAY responses.
+      2) Else try CSV export and parse it.
+      3) If CSV fails, scrape Parent Level Revenue directly from DOM.
     Return the same structure; if DOM fallback is used, keep CSV-related fields empty.
     """
     if download_dir is None:
         download_dir = os.path.join(os.getcwd(), "exports", "monthlyrev")
 
-    page = _find_xray_page(browser, timeout_ms=4000)
+    page = page or find_xray_page(browser, timeout_ms=4000)
     if not page:
         raise RuntimeError("XRAY not detected on any Amazon tab (monthlyrev).")
 
@@ -475,6 +445,25 @@ def run_monthlyrev(
             asin = extract_asin_from_url(page.url) or extract_asin_from_dom(page)
             if asin: break
 
+    # Network capture: XRAY's own JSON responses, no export round-trip
+    rows = captured_rows(page)
+    if rows:
+        summary = find_parent_level_revenue_in_rows(rows, asin)
+        if summary:
+            print("[INFO] Parent Level Revenue read from captured XRAY data for ASIN:", asin)
+            return {
+                "asin": asin,
+                "file_name": "",
+                "product_url": summary.get("product_url"),
+                "parent_level_revenue": summary.get("parent_level_revenue"),
+                "parent_level_revenue_text": summary.get("parent_level_revenue_text"),
+                "source_url": page.url,
+                "saved_csv": "",
+                "scraped_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "module": "monthlyrev",
+            }
+        print("[WARN] ASIN not in captured XRAY data; falling back to CSV export.")
+
     # Try CSV path
     csv_path = _export_csv(page, download_dir)
     if csv_path:
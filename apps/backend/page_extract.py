@@ -0,0 +1,143 @@
+# page_extract.py
+import re
+from typing import Dict, Optional, Tuple
+
+# In-page extraction library. Installed on every document of the context with
+# add_init_script (see install_extractors), so a read is one page.evaluate
+# instead of locator waits + element handles + an evaluate per metric.
+# Field names match the Python result dicts; a missing value is null.
+_LIB = "__amzExtract"
+EXTRACT_JS = r"""
+(() => {
+  if (window.__amzExtract) return true;
+  const MONEY = /^\$?\s*\d[\d,]*(?:\.\d+)?$/;
+  const LABEL_TAGS = "div,span,p,label,h1,h2,h3,h4,h5,h6";
+
+  const text = (el) => (el ? (el.innerText || el.textContent || "") : "").trim();
+  const first = (sel) => { const t = text(document.querySelector(sel)); return t || null; };
+
+  function findLabel(label, exact) {
+    for (const n of document.querySelectorAll(LABEL_TAGS)) {
+      if (n.children.length) continue;
+      const t = (n.textContent || "").trim();
+      if (exact ? t === label : t.includes(label)) return n;
+    }
+    return null;
+  }
+
+  // Closest currency-looking text around a label, climbing at most `levels` ancestors
+  function valueNear(labelEl, levels, maxLen, reject) {
+    let root = labelEl ? labelEl.parentElement : null;
+    for (let i = 0; i < levels && root; i++) {
+      const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+      while (walker.nextNode()) {
+        const n = walker.currentNode;
+        if (n === labelEl) continue;
+        const t = text(n);
+        if (!t || t.length > maxLen || !MONEY.test(t)) continue;
+        if (reject && reject.test(t)) continue;
+        return t;
+      }
+      root = root.parentElement;
+    }
+    return null;
+  }
+
+  const lib = {
+    total_revenue: () => valueNear(findLabel("Total Revenue", true), 5, 1e9, /total\s*revenue/i),
+    fba_fees: () => first("div.sc-gsnOKb.jESxTP") || valueNear(findLabel("FBA Fees", false), 6, 40, null),
+    storage_fee_jan_sep: () => first('div[data-testid="calculator-profitability-storageFeeJanSep"]'),
+    storage_fee_oct_dec: () => first('div[data-testid="calculator-profitability-storageFeeOctDec"]'),
+    product_price: () => {
+      const el = document.querySelector('input[data-testid="calculator-profitability-price"]');
+      return el && el.value.trim() ? el.value.trim() : null;
+    },
+    parent_level_revenue: () => first("[data-testid='table-cell-estMonthlyRevenue']"),
+  };
+  lib.extractAll = () => {
+    const out = {};
+    for (const [k, fn] of Object.entries(lib)) {
+      if (k === "extractAll") continue;
+      try { out[k] = fn(); } catch (e) { out[k] = null; }
+    }
+    return out;
+  };
+  window.__amzExtract = lib;
+  return true;
+})()
+"""
+
+FIELDS = (
+    "total_revenue",
+    "fba_fees",
+    "storage_fee_jan_sep",
+    "storage_fee_oct_dec",
+    "product_price",
+    "parent_level_revenue",
+)
+
+_installed = set()  # contexts that already carry the init script
+
+
+def install_extractors(ctx):
+    """Inject the library into every page/navigation of ctx from now on (idempotent)."""
+    if ctx in _installed:
+        return
+    try:
+        ctx.add_init_script(script=EXTRACT_JS)
+        _installed.add(ctx)
+    except Exception as e:
+        print("[WARN] Could not install page extractors:", e)
+        return
+    try:
+        ctx.on("close", lambda _ctx: forget_extractors(ctx))
+    except Exception:
+        pass
+
+
+def forget_extractors(ctx):
+    """Stop tracking ctx (context closed / driver disconnected); a new connection installs again."""
+    _installed.discard(ctx)
+
+
+def ensure_extractors(page) -> bool:
+    """Make sure the library is on page's current document (pages loaded before install_extractors)."""
+    try:
+        return bool(page.evaluate(EXTRACT_JS))
+    except Exception:
+        return False
+
+
+def extract_all(page) -> Dict[str, Optional[str]]:
+    """Every metric the current page shows, in one round trip ({} if the page can't be read)."""
+    js = f"() => window.{_LIB} ? window.{_LIB}.extractAll() : null"
+    try:
+        out = page.evaluate(js)
+        if out is None and ensure_extractors(page):
+            out = page.evaluate(js)
+    except Exception:
+        return {}
+    return out or {}
+
+
+def wait_for_field(page, field: str, timeout_ms: int = 5000) -> Optional[str]:
+    """Value of one field once it renders (polled in-page), or None after timeout_ms."""
+    if field not in FIELDS or not ensure_extractors(page):
+        return None
+    try:
+        handle = page.wait_for_function(
+            f"(f) => window.{_LIB} && window.{_LIB}[f]()",
+            arg=field, timeout=timeout_ms, polling=100,
+        )
+        return handle.json_value()
+    except Exception:
+        return None
+
+
+def read_total_revenue(page, *, timeout_ms: int = 5000) -> Tuple[str, str]:
+    """XRAY 'Total Revenue' as (text, digits), e.g. ('$123,456', '123456')."""
+    value = extract_all(page).get("total_revenue") or wait_for_field(page, "total_revenue", timeout_ms)
+    if not value:
+        raise RuntimeError("Couldn't locate the Total Revenue value near the label.")
+    value_text = re.sub(r"\s+", " ", value).strip()
+    return value_text, re.sub(r"[^0-9.]", "", value_text)
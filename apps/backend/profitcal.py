@@ -78,6 +78,8 @@ import re
 import time
 from typing import Dict, Optional
 from playwright.sync_api import Browser, Page
+from page_extract import extract_all, wait_for_field
+from selector_cache import try_strategies
 
 def _pick_ctx(browser: Browser):
     return browser.contexts[0] if browser.contexts else browser.new_context()
@@ -126,34 +128,30 @@ def _click_calculator(page: Page, timeout_ms: int = 15000):
     """
     Clicks the Helium 'Profitability Calculator' button.
     Primary: data-testid="calculator"
-    Fallbacks try role/text.
+    Fallbacks try role/text; whichever worked last time is tried first (see selector_cache).
     """
-    # Primary
-    btn = page.locator('div[data-testid="calculator"]').first
-    try:
+    def by_testid():
+        btn = page.locator('div[data-testid="calculator"]').first
         btn.wait_for(state="visible", timeout=timeout_ms)
         btn.click()
-        print("[info] Clicked Helium Profitability Calculator button.")
-        return
-    except Exception:
-        pass
 
-    # Fallback by button role + text
-    try:
+    def by_role():
         alt = page.get_by_role("button", name=re.compile(r"profitability|calculator", re.I)).first
         alt.wait_for(timeout=4000)
         alt.click()
-        print("[info] Clicked Profitability Calculator (fallback).")
-        return
-    except Exception:
-        pass
 
-    # Last ditch: any element with calculator text
-    try:
+    def by_text():
         any_calc = page.locator(":is(div,button,span,a):has-text('Calculator')").first
         any_calc.wait_for(state="visible", timeout=4000)
         any_calc.click()
-        print("[info] Clicked Calculator (text fallback).")
+
+    try:
+        how, _ = try_strategies("profitcal.calculator_button", [
+            ("testid", by_testid),
+            ("role", by_role),
+            ("text", by_text),
+        ])
+        print(f"[info] Clicked Helium Profitability Calculator button ({how}).")
         return
     except Exception:
         pass
@@ -162,56 +160,12 @@ def _click_calculator(page: Page, timeout_ms: int = 15000):
 
 def _get_fba_fees(page: Page) -> str:
     """
-    FBA fees are sometimes rendered with volatile classes.
-    Try your original class selector, then fall back to a proximity search
-    around 'FBA Fees'.
+    FBA fees are sometimes rendered with volatile classes; the extractor tries
+    the class selector, then the currency text nearest the 'FBA Fees' label.
     """
-    # Original class-based selector (brittle but fast if it works)
-    try:
-        el = page.locator("div.sc-gsnOKb.jESxTP").first
-        el.wait_for(timeout=2000)
-        txt = (el.inner_text() or "").strip()
-        if txt:
-            return txt
-    except Exception:
-        pass
-
-    # Proximity fallback near 'FBA Fees'
-    try:
-        label = page.get_by_text("FBA Fees", exact=False).first
-        label.wait_for(timeout=3000)
-        # climb ancestors and scan for a currency-looking piece of text
-        val = page.evaluate(
-            """
-            (labelEl) => {
-              const money = (t) => /^\\$?\\s*\\d[\\d,]*(?:\\.\\d+)?$/.test((t||"").trim());
-              function findCurrencyWithin(root) {
-                const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
-                while (walker.nextNode()) {
-                  const n = walker.currentNode;
-                  if (n === labelEl) continue;
-                  const txt = (n.innerText || "").trim();
-                  if (!txt || txt.length > 40) continue;
-                  if (money(txt)) return txt;
-                }
-                return null;
-              }
-              let root = labelEl.parentElement;
-              for (let i = 0; i < 6 && root; i++) {
-                const got = findCurrencyWithin(root);
-                if (got) return got;
-                root = root.parentElement;
-              }
-              return null;
-            }
-            """,
-            label.element_handle(),
-        )
-        if val:
-            return val.strip()
-    except Exception:
-        pass
-
+    txt = wait_for_field(page, "fba_fees", timeout_ms=5000)
+    if txt:
+        return txt.strip()
     raise RuntimeError("Could not read FBA Fees from the calculator panel.")
 
 def get_profitability_metrics(
@@ -221,6 +175,7 @@ def get_profitability_metrics(
     wait_secs: int = 60,
     close_all_tabs_first: bool = False,
     close_others_after_open: bool = True,
+    close_page_after: bool = False,
 ) -> Dict[str, Dict[str, str]]:
     """
     Navigate to product_url, open Helium Profitability Calculator, and return:
@@ -269,11 +224,12 @@ def get_profitability_metrics(
     else:
         raise RuntimeError(f"Profitability Calculator UI did not appear in {wait_secs}s. Last error: {last_err}")
 
-    # Extract values
-    storage_fee_jan_sep_text = (page.locator(selectors["storage_fee_jan_sep"]).inner_text() or "").strip()
-    storage_fee_oct_dec_text = (page.locator(selectors["storage_fee_oct_dec"]).inner_text() or "").strip()
-    product_price_text = (page.locator(selectors["product_price"]).input_value() or "").strip()
-    fba_fees_text = _get_fba_fees(page)
+    # Extract values (one round trip; per-field reads only for what the extractor missed)
+    vals = extract_all(page)
+    storage_fee_jan_sep_text = vals.get("storage_fee_jan_sep") or (page.locator(selectors["storage_fee_jan_sep"]).inner_text() or "").strip()
+    storage_fee_oct_dec_text = vals.get("storage_fee_oct_dec") or (page.locator(selectors["storage_fee_oct_dec"]).inner_text() or "").strip()
+    product_price_text = vals.get("product_price") or (page.locator(selectors["product_price"]).input_value() or "").strip()
+    fba_fees_text = vals.get("fba_fees") or _get_fba_fees(page)
 
     result = {
         "fba_fees": {
@@ -295,4 +251,7 @@ def get_profitability_metrics(
     }
 
     print("[info] Profitability metrics captured.")
+    if close_page_after:
+        try: page.close()
+        except Exception: pass
     return result
@@ -0,0 +1,288 @@
+# result_sinks.py
+import os, abc, json, time, threading, traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from local_db import connect, transaction
+
+# Comma-separated sink names each finished product is fanned out to
+RESULT_SINKS = os.getenv("RESULT_SINKS", "sheets")
+# Local outputs (JSONL file, Parquet part files) go here
+RESULTS_DIR = os.getenv("RESULTS_DIR", "results")
+
+# Optional dependency: only needed for the parquet sink
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pq = None
+
+
+# ---------------------------
+# Record helpers
+# ---------------------------
+def _num(v: Any) -> Optional[float]:
+    """'$12,345.67' / 12345.67 / None -> float or None."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    s = str(v).replace("$", "").replace(",", "").strip()
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def flatten_result(record: Dict[str, Any]) -> Dict[str, Any]:
+    """One product record -> flat scalar columns (analytics sinks); the full block rides along as JSON."""
+    block = record.get("block") or {}
+    res = block.get("result") or {}
+    monthly = (res.get("monthly_revenue") or {}).get("meta") or {}
+    best = (res.get("competitors_flow") or {}).get("picker_best") or {}
+    pm = res.get("profitability_metrics") or {}
+    gp = (res.get("gpt_projection") or {}).get("response") or {}
+
+    def metric(name):
+        return _num((pm.get(name) or {}).get("number"))
+
+    return {
+        "job_id": record.get("job_id"),
+        "seq": record.get("seq"),
+        "brand": record.get("brand") or "",
+        "country": record.get("country") or "",
+        "productname": block.get("productname") or "",
+        "url": block.get("url") or "",
+        "keyword": block.get("keyword") or "",
+        "category_url": block.get("categoryUrl") or "",
+        "asin": monthly.get("asin") or "",
+        "category_revenue": _num((res.get("category_revenue") or {}).get("number")),
+        "monthly_revenue": _num(monthly.get("parent_level_revenue")),
+        "competitor_asin": best.get("asin") or "",
+        "competitor_url": best.get("url") or "",
+        "competitor_revenue": _num(best.get("parent_level_revenue")),
+        "price": metric("product_price"),
+        "fba_fees": metric("fba_fees"),
+        "storage_fee_jan_sep": metric("storage_fee_jan_sep"),
+        "storage_fee_oct_dec": metric("storage_fee_oct_dec"),
+        "base_total_sales": _num(gp.get("base_total_sales")),
+        "base_total_revenue": _num(gp.get("base_total_revenue")),
+        "n_errors": len(res.get("errors") or []),
+        "written_at": record.get("written_at"),
+        "result_json": json.dumps(block, ensure_ascii=False, separators=(",", ":")),
+    }
+
+
+# ---------------------------
+# Sinks
+# ---------------------------
+class ResultSink(abc.ABC):
+    """
+    Receives every finished product as a record:
+      {"job_id", "seq", "brand", "country", "block", "written_at"}
+    write() is called from scraper threads and should be quick; flush() runs
+    at the end of each job, close() at shutdown.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def write(self, record: Dict[str, Any]):
+        ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class SheetsResultSink(ResultSink):
+    """Country tabs in Google Sheets, via the write-behind sink (never blocks the scraper)."""
+
+    name = "sheets"
+    flush_timeout = 60.0  # end of job: wait this long for queued rows to reach the sheet
+
+    def write(self, record):
+        from sheets_sink import get_sink
+        get_sink().submit(record.get("country") or "", record["block"])
+
+    def flush(self):
+        from sheets_sink import get_sink
+        sink = get_sink()
+        if not sink.flush(timeout=self.flush_timeout):
+            print(f"[SINK] sheets: {sink.pending()} row(s) not written yet; kept in the spool for retry")
+
+    def close(self):
+        from sheets_sink import shutdown_sink
+        shutdown_sink()
+
+
+class JsonlResultSink(ResultSink):
+    """Append-only JSONL, one compact line per product."""
+
+    name = "jsonl"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(RESULTS_DIR, "results.jsonl")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_results (
+    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id              INTEGER,
+    seq                 INTEGER,
+    brand               TEXT,
+    country             TEXT,
+    productname         TEXT,
+    url                 TEXT,
+    keyword             TEXT,
+    category_url        TEXT,
+    asin                TEXT,
+    category_revenue    REAL,
+    monthly_revenue     REAL,
+    competitor_asin     TEXT,
+    competitor_url      TEXT,
+    competitor_revenue  REAL,
+    price               REAL,
+    fba_fees            REAL,
+    storage_fee_jan_sep REAL,
+    storage_fee_oct_dec REAL,
+    base_total_sales    REAL,
+    base_total_revenue  REAL,
+    n_errors            INTEGER,
+    written_at          REAL,
+    result_json         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_product_results_job ON product_results(job_id, seq);
+CREATE INDEX IF NOT EXISTS idx_product_results_asin ON product_results(asin);
+CREATE INDEX IF NOT EXISTS idx_product_results_country ON product_results(country, keyword);
+"""
+
+
+class SQLiteResultSink(ResultSink):
+    """Flat `product_results` table in the local DB (scraper.db unless `path` is given)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        connect(self.path).executescript(_SQLITE_SCHEMA)
+
+    def write(self, record):
+        row = flatten_result(record)
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        conn = connect(self.path)
+        with transaction(conn):
+            conn.execute(f"INSERT INTO product_results({cols}) VALUES ({marks})", tuple(row.values()))
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Columnar output for analytics: rows are buffered and written as one
+    Parquet part file per flush (end of job) under RESULTS_DIR/parquet/.
+    Needs pyarrow.
+    """
+
+    name = "parquet"
+
+    def __init__(self, directory: Optional[str] = None):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+        self.directory = directory or os.path.join(RESULTS_DIR, "parquet")
+        os.makedirs(self.directory, exist_ok=True)
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._parts = 0
+
+    def write(self, record):
+        row = flatten_result(record)
+        with self._lock:
+            self._rows.append(row)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._parts += 1
+            part = self._parts
+        if not rows:
+            return
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"results-{stamp}-{os.getpid()}-{part}.parquet")
+        pq.write_table(pa.Table.from_pylist(rows), path)
+        print(f"[SINK] Wrote {len(rows)} row(s) to {path}")
+
+
+# ---------------------------
+# Registry / fan-out
+# ---------------------------
+SINK_FACTORIES: Dict[str, Callable[[], ResultSink]] = {
+    "sheets": SheetsResultSink,
+    "jsonl": JsonlResultSink,
+    "sqlite": SQLiteResultSink,
+    "parquet": ParquetResultSink,
+}
+
+_sinks: Optional[List[ResultSink]] = None
+_sinks_lock = threading.Lock()
+
+
+def register_sink(name: str, factory: Callable[[], ResultSink]):
+    """Add a custom sink type; enable it by listing `name` in RESULT_SINKS."""
+    SINK_FACTORIES[name] = factory
+
+
+def get_sinks() -> List[ResultSink]:
+    """Sinks named in RESULT_SINKS, built once; unknown or unavailable ones are skipped with a warning."""
+    global _sinks
+    with _sinks_lock:
+        if _sinks is None:
+            _sinks = []
+            for name in [n.strip().lower() for n in RESULT_SINKS.split(",") if n.strip()]:
+                factory = SINK_FACTORIES.get(name)
+                if factory is None:
+                    print(f"[SINK] Unknown result sink '{name}' (known: {', '.join(SINK_FACTORIES)})")
+                    continue
+                try:
+                    _sinks.append(factory())
+                except Exception as e:
+                    print(f"[SINK] Result sink '{name}' disabled: {e}")
+        return _sinks
+
+
+def publish(record: Dict[str, Any]):
+    """Fan one finished product out to every sink; a failing sink never affects the others."""
+    record.setdefault("written_at", time.time())
+    for sink in get_sinks():
+        try:
+            sink.write(record)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"[SINK] {sink.name} failed to write product {record.get('seq')}: {e}")
+
+
+def flush_sinks():
+    for sink in get_sinks():
+        try:
+            sink.flush()
+        except Exception as e:
+            print(f"[SINK] {sink.name} flush failed: {e}")
+
+
+def close_sinks():
+    global _sinks
+    with _sinks_lock:
+        sinks, _sinks = _sinks or [], None
+    for sink in sinks:
+        try:
+            sink.close()
+        except Exception as e:
+            print(f"[SINK] {sink.name} close failed: {e}")
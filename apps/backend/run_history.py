@@ -0,0 +1,166 @@
+# run_history.py
+import os, json, time, argparse, threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from local_db import connect, transaction
+from amazon_urls import extract_asin_from_url, normalize_keyword
+
+# One append-only JSONL file per run (job) lives here
+RUN_HISTORY_DIR = os.getenv("RUN_HISTORY_DIR", "runs")
+
+# Index over the run files: one row per product line (byte offset + length into its file)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id      INTEGER NOT NULL,
+    seq         INTEGER NOT NULL,
+    brand       TEXT    NOT NULL DEFAULT '',
+    country     TEXT    NOT NULL DEFAULT '',
+    asin        TEXT    NOT NULL DEFAULT '',
+    keyword     TEXT    NOT NULL DEFAULT '',
+    path        TEXT    NOT NULL,
+    line_offset INTEGER NOT NULL,
+    line_length INTEGER NOT NULL,
+    written_at  REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_run_history_job ON run_history(job_id, seq);
+CREATE INDEX IF NOT EXISTS idx_run_history_asin ON run_history(asin, job_id);
+CREATE INDEX IF NOT EXISTS idx_run_history_keyword ON run_history(keyword, country);
+CREATE INDEX IF NOT EXISTS idx_run_history_country ON run_history(country, job_id);
+"""
+
+_lock = threading.Lock()  # serialises appends (pool workers share the process)
+_schema_ready = False
+
+
+def _ensure_schema():
+    global _schema_ready
+    if not _schema_ready:
+        connect().executescript(_SCHEMA)
+        _schema_ready = True
+
+
+def run_path(job_id: int) -> str:
+    return os.path.join(RUN_HISTORY_DIR, f"run-{int(job_id):06d}.jsonl")
+
+
+def _asin_of(block: Dict[str, Any]) -> str:
+    meta = ((block.get("result") or {}).get("monthly_revenue") or {}).get("meta") or {}
+    return (meta.get("asin") or extract_asin_from_url(block.get("url") or "") or "").upper()
+
+
+# ---------------------------
+# Write
+# ---------------------------
+def append(job_id: int, seq: int, brand: str, country: str, block: Dict[str, Any]) -> Dict[str, Any]:
+    """Append one finished product as a compact JSON line to its run file and index it."""
+    _ensure_schema()
+    now = time.time()
+    record = {
+        "job_id": job_id,
+        "seq": seq,
+        "brand": brand or "",
+        "country": country or "",
+        "asin": _asin_of(block),
+        "written_at": now,
+        "block": block,
+    }
+    data = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    path = run_path(job_id)
+
+    with _lock:
+        os.makedirs(RUN_HISTORY_DIR, exist_ok=True)
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        conn = connect()
+        with transaction(conn):
+            conn.execute(
+                "INSERT INTO run_history(job_id, seq, brand, country, asin, keyword, path, line_offset, line_length, written_at) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (job_id, seq, record["brand"], record["country"], record["asin"],
+                 normalize_keyword(block.get("keyword") or ""), path, offset, len(data), now),
+            )
+    return {"path": path, "offset": offset, "length": len(data)}
+
+
+# ---------------------------
+# Read
+# ---------------------------
+def query(
+    *,
+    job_id: Optional[int] = None,
+    asin: Optional[str] = None,
+    keyword: Optional[str] = None,
+    country: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield matching product records (oldest first). Only the index is searched;
+    each hit is read from its run file by offset, so the history is never
+    loaded as a whole.
+    """
+    _ensure_schema()
+    where, args = [], []
+    if job_id is not None:
+        where.append("job_id=?"); args.append(job_id)
+    if asin:
+        where.append("asin=?"); args.append(asin.strip().upper())
+    if keyword:
+        where.append("keyword=?"); args.append(normalize_keyword(keyword))
+    if country:
+        where.append("country=?"); args.append(country.strip())
+    sql = "SELECT path, line_offset, line_length FROM run_history"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+    if limit:
+        sql += " LIMIT ?"; args.append(int(limit))
+
+    files: Dict[str, Any] = {}
+    try:
+        for row in connect().execute(sql, args).fetchall():
+            f = files.get(row["path"])
+            if f is None:
+                try:
+                    f = files[row["path"]] = open(row["path"], "rb")
+                except FileNotFoundError:
+                    continue  # run file deleted by hand
+            f.seek(row["line_offset"])
+            try:
+                yield json.loads(f.read(row["line_length"]))
+            except ValueError:
+                continue
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def list_runs(limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent runs with product counts and time span."""
+    _ensure_schema()
+    rows = connect().execute(
+        "SELECT job_id, COUNT(*) AS products, MIN(written_at) AS started_at, MAX(written_at) AS finished_at, "
+        "MIN(path) AS path FROM run_history GROUP BY job_id ORDER BY job_id DESC LIMIT ?",
+        (int(limit),),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Query the run history (one JSON line per product).")
+    ap.add_argument("--job", type=int)
+    ap.add_argument("--asin")
+    ap.add_argument("--keyword")
+    ap.add_argument("--country")
+    ap.add_argument("--limit", type=int)
+    ap.add_argument("--runs", action="store_true", help="list recent runs instead")
+    args = ap.parse_args()
+
+    if args.runs:
+        for r in list_runs(args.limit or 50):
+            print(json.dumps(r))
+    else:
+        for rec in query(job_id=args.job, asin=args.asin, keyword=args.keyword,
+                         country=args.country, limit=args.limit):
+            print(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
@@ -0,0 +1,194 @@
+# selector_cache.py
+import os, time, argparse, threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from local_db import connect, transaction
+
+# Remember which selector strategy worked per UI action and try it first next time
+SELECTOR_CACHE = os.getenv("SELECTOR_CACHE", "1").strip().lower() not in ("0", "false", "no")
+# A strategy that failed this many times in a row is tried after all the others
+DEMOTE_AFTER = int(os.getenv("SELECTOR_DEMOTE_AFTER", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS selector_strategies (
+    action       TEXT    NOT NULL,
+    strategy     TEXT    NOT NULL,
+    ok           INTEGER NOT NULL DEFAULT 0,
+    failed       INTEGER NOT NULL DEFAULT 0,
+    fail_streak  INTEGER NOT NULL DEFAULT 0,
+    last_ok_at   REAL,
+    PRIMARY KEY (action, strategy)
+);
+CREATE TABLE IF NOT EXISTS selector_actions (
+    action  TEXT PRIMARY KEY,
+    hits    INTEGER NOT NULL DEFAULT 0,   -- first strategy tried worked
+    misses  INTEGER NOT NULL DEFAULT 0    -- needed a fallback (or nothing worked)
+);
+"""
+
+_lock = threading.Lock()
+_loaded = False
+_strategies: Dict[Tuple[str, str], Dict[str, Any]] = {}  # (action, strategy) -> row
+_actions: Dict[str, Dict[str, int]] = {}                # action -> {"hits", "misses"}
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    conn = connect()
+    conn.executescript(_SCHEMA)
+    for r in conn.execute("SELECT * FROM selector_strategies"):
+        _strategies[(r["action"], r["strategy"])] = dict(r)
+    for r in conn.execute("SELECT * FROM selector_actions"):
+        _actions[r["action"]] = {"hits": r["hits"], "misses": r["misses"]}
+    _loaded = True
+
+
+def _row(action: str, strategy: str) -> Dict[str, Any]:
+    return _strategies.setdefault((action, strategy), {
+        "action": action, "strategy": strategy,
+        "ok": 0, "failed": 0, "fail_streak": 0, "last_ok_at": None,
+    })
+
+
+def _order(action: str, names: List[str]) -> List[str]:
+    """Last winner first, then declared order; strategies on a failing streak go last."""
+    def key(item):
+        i, name = item
+        r = _strategies.get((action, name)) or {}
+        streak = r.get("fail_streak", 0)
+        recent = r.get("last_ok_at") if streak == 0 else None
+        return (-(recent or 0), streak >= DEMOTE_AFTER, i)
+    return [name for _, name in sorted(enumerate(names), key=key)]
+
+
+def _save(action: str, names: List[str]):
+    conn = connect()
+    with transaction(conn):
+        for name in names:
+            r = _strategies[(action, name)]
+            conn.execute(
+                "INSERT OR REPLACE INTO selector_strategies(action, strategy, ok, failed, fail_streak, last_ok_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (action, name, r["ok"], r["failed"], r["fail_streak"], r["last_ok_at"]),
+            )
+        a = _actions[action]
+        conn.execute(
+            "INSERT OR REPLACE INTO selector_actions(action, hits, misses) VALUES (?,?,?)",
+            (action, a["hits"], a["misses"]),
+        )
+
+
+def try_strategies(action: str, strategies: Sequence[Tuple[str, Callable[[], Any]]]) -> Tuple[str, Any]:
+    """
+    Run (name, fn) strategies until one returns without raising; returns
+    (name, result). The order is learned per action (see _order), so a chain
+    whose first selectors broke stops paying their timeouts on every product.
+    Raises the last strategy's error if none works.
+    """
+    names = [name for name, _ in strategies]
+    fns = dict(strategies)
+    if not SELECTOR_CACHE:
+        order, tried = names, None
+    else:
+        with _lock:
+            _load()
+            order = _order(action, names)
+        tried = []
+
+    last_err: Optional[Exception] = None
+    winner, result = None, None
+    for name in order:
+        try:
+            result = fns[name]()
+            winner = name
+            break
+        except Exception as e:
+            last_err = e
+            if tried is not None:
+                tried.append(name)
+
+    if tried is not None:
+        with _lock:
+            now = time.time()
+            for name in tried:
+                r = _row(action, name)
+                r["failed"] += 1
+                r["fail_streak"] += 1
+            if winner:
+                r = _row(action, winner)
+                r["ok"] += 1
+                r["fail_streak"] = 0
+                r["last_ok_at"] = now
+            a = _actions.setdefault(action, {"hits": 0, "misses": 0})
+            a["hits" if winner and not tried else "misses"] += 1
+            try:
+                _save(action, tried + ([winner] if winner else []))
+            except Exception as e:
+                print("[WARN] Could not persist selector stats:", e)
+        if winner and tried:
+            print(f"[SELECTOR] {action}: '{winner}' worked after {len(tried)} failed ({', '.join(tried)})")
+
+    if winner is None:
+        raise last_err or RuntimeError(f"No strategy given for {action}")
+    return winner, result
+
+
+def stats() -> List[Dict[str, Any]]:
+    """Per action: hits, misses and each strategy's ok/failed counts in current try order."""
+    with _lock:
+        _load()
+        out = []
+        for action in sorted({a for a, _ in _strategies} | set(_actions)):
+            names = sorted(n for a, n in _strategies if a == action)
+            out.append({
+                "action": action,
+                **_actions.get(action, {"hits": 0, "misses": 0}),
+                "strategies": [
+                    {k: _strategies[(action, n)][k] for k in ("strategy", "ok", "failed", "fail_streak")}
+                    for n in _order(action, names)
+                ],
+            })
+        return out
+
+
+def report():
+    """One log line per action."""
+    if not SELECTOR_CACHE:
+        return
+    try:
+        rows = stats()
+    except Exception as e:
+        print("[WARN] Selector stats unavailable:", e)
+        return
+    for s in rows:
+        order = " > ".join(f"{x['strategy']}({x['ok']}/{x['ok'] + x['failed']})" for x in s["strategies"])
+        print(f"[SELECTOR] {s['action']}: hits={s['hits']} misses={s['misses']} order: {order}")
+
+
+def reset(action: Optional[str] = None):
+    """Forget learned order and stats (one action or all)."""
+    with _lock:
+        _load()
+        conn = connect()
+        with transaction(conn):
+            if action:
+                conn.execute("DELETE FROM selector_strategies WHERE action=?", (action,))
+                conn.execute("DELETE FROM selector_actions WHERE action=?", (action,))
+            else:
+                conn.execute("DELETE FROM selector_strategies")
+                conn.execute("DELETE FROM selector_actions")
+        for key in [k for k in _strategies if action is None or k[0] == action]:
+            del _strategies[key]
+        for a in [a for a in _actions if action is None or a == action]:
+            del _actions[a]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Show or reset learned selector strategies.")
+    ap.add_argument("--reset", nargs="?", const="", metavar="ACTION", help="forget one action (or all)")
+    args = ap.parse_args()
+    if args.reset is not None:
+        reset(args.reset or None)
+    report()
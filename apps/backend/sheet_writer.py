@@ -1,10 +1,14 @@
-import os
-from typing import Dict, Any, List, Optional
+import os, re, time, threading
+from typing import Dict, Any, List, NamedTuple, Optional
 from datetime import datetime
 from dotenv import load_dotenv, find_dotenv
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
+from local_db import connect, transaction
+from amazon_urls import asin_of, normalize_keyword
+from sheets_quota import execute as _execute, READ, WRITE
+
 # Load .env (override current env if present)
 load_dotenv(find_dotenv(), override=True)
 
@@ -13,6 +17,17 @@ SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "").strip()
 GOOGLE_CLIENT_EMAIL = os.getenv("GOOGLE_CLIENT_EMAIL", "").strip()
 GOOGLE_PRIVATE_KEY = (os.getenv("GOOGLE_PRIVATE_KEY", "") or "").replace("\\n", "\n")
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+# Update the existing row of a (country, ASIN, keyword) instead of inserting a new one
+SHEETS_UPSERT = os.getenv("SHEETS_UPSERT", "1").strip().lower() not in ("0", "false", "no")
+# Tab metadata (sheetId / columnCount) is reused for this long
+SHEETS_META_TTL_SECS = float(os.getenv("SHEETS_META_TTL_SECS", "300"))
+# Rolling archival: rows written more than N days ago move to "<tab> <year>-Q<n>" tabs (0 = off)
+SHEETS_ARCHIVE_AFTER_DAYS = int(os.getenv("SHEETS_ARCHIVE_AFTER_DAYS", "0"))
+# Archive tabs go to this spreadsheet (blank = the main spreadsheet)
+SHEETS_ARCHIVE_SPREADSHEET_ID = os.getenv("SHEETS_ARCHIVE_SPREADSHEET_ID", "").strip()
+# A country tab holding more rows than this is copied to "<tab> #k" and emptied (0 = no ceiling)
+SHEETS_TAB_ROW_CEILING = int(os.getenv("SHEETS_TAB_ROW_CEILING", "0"))
+ARCHIVE_CHECK_SECS = 6 * 3600  # how often a tab is checked for rows to archive
 
 # === COLUMNS (zero-indexed) ===
 COL_NO                  = 0
@@ -47,19 +62,81 @@ FILLED_COLS = [
 ]
 
 # === Google Sheets Helpers ===
+_svc = None
+_svc_lock = threading.Lock()
+
 def _sheets_service():
+    """
+    Process-wide Sheets client: credentials, the authorized HTTP session and
+    the discovery document (bundled static copy, no fetch) are built once.
+    """
+    global _svc
+    if _svc is not None:
+        return _svc
     if not (SPREADSHEET_ID and GOOGLE_CLIENT_EMAIL and GOOGLE_PRIVATE_KEY):
         raise RuntimeError("Missing SPREADSHEET_ID / GOOGLE_CLIENT_EMAIL / GOOGLE_PRIVATE_KEY.")
-    creds = service_account.Credentials.from_service_account_info(
-        {
-            "type": "service_account",
-            "client_email": GOOGLE_CLIENT_EMAIL,
-            "private_key": GOOGLE_PRIVATE_KEY,
-            "token_uri": "https://oauth2.googleapis.com/token",
-        },
-        scopes=SCOPES,
-    )
-    return build("sheets", "v4", credentials=creds)
+    with _svc_lock:
+        if _svc is None:
+            creds = service_account.Credentials.from_service_account_info(
+                {
+                    "type": "service_account",
+                    "client_email": GOOGLE_CLIENT_EMAIL,
+                    "private_key": GOOGLE_PRIVATE_KEY,
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                },
+                scopes=SCOPES,
+            )
+            _svc = build("sheets", "v4", credentials=creds, static_discovery=True, cache_discovery=False)
+    return _svc
+
+# --- tab metadata cache: title -> (sheetId, columnCount); row positions live in the tab cursors ---
+class TabMeta(NamedTuple):
+    sheet_id: int
+    column_count: int
+
+_meta: Dict[str, TabMeta] = {}
+_meta_loaded_at = 0.0
+_meta_lock = threading.Lock()
+
+def _load_metadata(svc):
+    """One spreadsheets.get (properties only) refreshes every tab at once."""
+    global _meta_loaded_at
+    meta = _execute(svc.spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID,
+        fields="sheets.properties(sheetId,title,gridProperties.columnCount)",
+    ), READ)
+    fresh = {}
+    for sh in meta.get("sheets", []):
+        props = sh.get("properties", {})
+        grid = props.get("gridProperties", {}) or {}
+        fresh[props.get("title")] = TabMeta(props.get("sheetId"), grid.get("columnCount", ROW_WIDTH))
+    _meta.clear()
+    _meta.update(fresh)
+    _meta_loaded_at = time.time()
+
+def _tab_meta(svc, title: str) -> TabMeta:
+    with _meta_lock:
+        if time.time() - _meta_loaded_at > SHEETS_META_TTL_SECS or title not in _meta:
+            _load_metadata(svc)
+        if title not in _meta:
+            raise ValueError(f'Sheet/tab "{title}" not found.')
+        return _meta[title]
+
+def invalidate_metadata(title: Optional[str] = None):
+    """
+    Forget cached tab state (metadata and row cursor) of one tab, or of every
+    tab without a title, so it is refetched on next use. Our own appends don't
+    need this: they advance the tab's cursor.
+    """
+    global _meta_loaded_at
+    with _meta_lock:
+        if title is None:
+            _meta.clear()
+            _meta_loaded_at = 0.0
+            _cursors.clear()
+        else:
+            _meta.pop(title, None)
+            _cursors.pop(title, None)
 
 def _esc(s: str) -> str:
     return str(s or "").replace('"', '""')
@@ -69,26 +146,10 @@ def _hyper(url: str, text: Optional[str] = "link") -> str:
     return f'=HYPERLINK("{_esc(url)}","{_esc(text or "link")}")' if url else ""
 
 def _get_sheet_id_and_cols(svc, title: str):
-    meta = svc.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-    for sh in meta.get("sheets", []):
-        props = sh.get("properties", {})
-        if props.get("title") == title:
-            grid = props.get("gridProperties", {}) or {}
-            return props.get("sheetId"), grid.get("columnCount", ROW_WIDTH)
-    raise ValueError(f'Sheet/tab "{title}" not found.')
-
-def _first_empty_row(svc, title: str, col_letter: str = "A") -> int:
-    """Find first empty row by scanning from row 1 down in the target column (returns 1-based index)."""
-    rng = f"{title}!{col_letter}1:{col_letter}"
-    r = svc.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=rng).execute()
-    used = len(r.get("values", []) or [])
-    return used + 1
-
-def _next_no_value(svc, title: str) -> int:
-    """Reads column A to get last numeric 'No.' and increments it. If none, starts at 1."""
-    rng = f"{title}!A1:A"
-    r = svc.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=rng).execute()
-    vals = [row[0] for row in (r.get("values", []) or []) if row]
+    meta = _tab_meta(svc, title)
+    return meta.sheet_id, meta.column_count
+
+def _last_no(vals: List[str]) -> int:
     last_num = 0
     for v in reversed(vals):
         try:
@@ -96,7 +157,114 @@ def _next_no_value(svc, title: str) -> int:
             break
         except Exception:
             continue
-    return last_num + 1 if last_num >= 0 else 1
+    return last_num
+
+# --- upsert keys: (ASIN, keyword) read back from the Products / Category hyperlinks ---
+_HYPERLINK_RX = re.compile(r'^=HYPERLINK\(\s*"((?:[^"]|"")*)"\s*[,;]\s*"((?:[^"]|"")*)"\s*\)$', re.I)
+
+def _hyperlink_parts(cell: Any):
+    """'=HYPERLINK("url","text")' -> (url, text); plain values -> ("", value)."""
+    cell = str(cell or "").strip()
+    m = _HYPERLINK_RX.match(cell)
+    if not m:
+        return "", cell
+    return m.group(1).replace('""', '"'), m.group(2).replace('""', '"')
+
+def _row_key(url: str, keyword: str):
+    asin = asin_of(url or "")
+    if not asin:
+        return None
+    return asin, normalize_keyword(keyword)
+
+def _product_key(prod: Dict[str, Any]):
+    return _row_key(prod.get("url") or "", prod.get("keyword") or "")
+
+class TabState(NamedTuple):
+    first_empty_row: int                 # 1-based; the template row
+    next_no: int
+    last_a: str                          # column A of the row above first_empty_row (conflict check)
+    rows_by_key: Optional[Dict[Any, Any]]  # (ASIN, keyword) -> (row1, existing "No."); None = not indexed
+
+def _read_tab_state(svc, title: str, *, with_index: bool = False) -> TabState:
+    """
+    One read of column A (A:C when with_index) -> first empty row, next 'No.'
+    value and, for upserts, the (ASIN, keyword) -> row index. Formulas are
+    returned raw so the hyperlinks can be parsed and values compare exactly.
+    """
+    cols = "A1:C" if with_index else "A1:A"
+    rows = _execute(svc.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=f"{title}!{cols}", valueRenderOption="FORMULA"
+    ), READ).get("values", []) or []
+
+    used = 0
+    col_a = []
+    rows_by_key: Dict[Any, Any] = {}
+    for i, row in enumerate(rows, start=1):
+        if row and str(row[0]).strip() != "":
+            used = i
+            col_a.append(row[0])
+        if with_index and len(row) > COL_PRODUCTS:
+            _, keyword = _hyperlink_parts(row[COL_CATEGORY])
+            url, _ = _hyperlink_parts(row[COL_PRODUCTS])
+            key = _row_key(url, keyword)
+            if key:
+                rows_by_key[key] = (i, str(row[0]) if row else "")  # last occurrence wins
+
+    # keep counting after archival/sharding emptied the tab
+    last_num = max(_last_no(col_a), _logged_max_no(title))
+    return TabState(
+        used + 1,
+        last_num + 1 if last_num >= 0 else 1,
+        str(col_a[-1]) if col_a else "",
+        rows_by_key if with_index else None,
+    )
+
+# --- row cursor: column A is read once per tab, then tracked locally ---
+_cursors: Dict[str, TabState] = {}
+
+def _cursor_still_valid(svc, title: str, cur: TabState) -> bool:
+    """
+    O(1) conflict check: the last row we know of still holds the same "No."
+    and the template row below it is still empty in column A.
+    """
+    used = cur.first_empty_row - 1
+    rng = f"{title}!A{max(used, 1)}:A{used + 1}"
+    rows = _execute(svc.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=rng, valueRenderOption="FORMULA"
+    ), READ).get("values", []) or []
+    cells = [str(r[0]) if r else "" for r in rows] + ["", ""]
+    if used == 0:
+        return cells[0] == ""
+    return cells[0] == cur.last_a and cells[1] == ""
+
+def _tab_cursor(svc, title: str, *, with_index: bool = False) -> TabState:
+    """Cached TabState for title; the full column read happens only the first time or after a conflict."""
+    cur = _cursors.get(title)
+    if cur is not None and (cur.rows_by_key is not None or not with_index):
+        if _cursor_still_valid(svc, title, cur):
+            return cur
+        print(f'[SHEETS] "{title}" was changed by someone else; re-reading it')
+    cur = _cursors[title] = _read_tab_state(svc, title, with_index=with_index)
+    return cur
+
+def _advance_cursor(title: str, new_rows: List[List[str]], new_keys: Optional[Dict[Any, int]] = None):
+    """Account for rows we just appended at the cursor (values already carry their "No.")."""
+    cur = _cursors.get(title)
+    if cur is None or not new_rows:
+        return
+    if cur.rows_by_key is not None:
+        for key, idx in (new_keys or {}).items():
+            cur.rows_by_key[key] = (cur.first_empty_row + idx, new_rows[idx][COL_NO])
+    n = len(new_rows)
+    _cursors[title] = cur._replace(
+        first_empty_row=cur.first_empty_row + n,
+        next_no=cur.next_no + n,
+        last_a=str(new_rows[-1][COL_NO]),
+    )
+
+def _drop_cursor(title: str):
+    """A write failed half-way: the tab's layout is unknown, re-read it next time."""
+    _cursors.pop(title, None)
 
 def _num_to_col(n0: int) -> str:
     n = n0 + 1
@@ -109,45 +277,46 @@ def _num_to_col(n0: int) -> str:
 def _write_row(svc, title: str, row1: int, row_vals: List[str]):
     last_col_letter = _num_to_col(ROW_WIDTH - 1)
     rng = f"{title}!A{row1}:{last_col_letter}{row1}"
-    svc.spreadsheets().values().update(
+    _execute(svc.spreadsheets().values().update(
         spreadsheetId=SPREADSHEET_ID,
         range=rng,
         valueInputOption="USER_ENTERED",
         body={"values": [row_vals]},
-    ).execute()
+    ), WRITE)
 
-def _insert_row_and_copy_template_format(svc, sheet_id: int, insert_row0: int, column_count: int):
+def _insert_rows_requests(sheet_id: int, insert_row0: int, column_count: int, n: int = 1) -> List[Dict[str, Any]]:
     """
-    Insert a new row at row index insert_row0 (0-based).
-    After insert, the original template row moves down to insert_row0+1.
-    We then copy only the FORMAT from the (now) template row to the inserted row.
+    Insert n rows at row index insert_row0 (0-based).
+    After insert, the original template row moves down to insert_row0+n.
+    We then copy only the FORMAT from the (now) template row into every inserted
+    row (copyPaste tiles a one-row source over a taller destination).
     """
-    requests = [
+    return [
         {
             "insertDimension": {
                 "range": {
                     "sheetId": sheet_id,
                     "dimension": "ROWS",
                     "startIndex": insert_row0,
-                    "endIndex": insert_row0 + 1
+                    "endIndex": insert_row0 + n
                 },
                 "inheritFromBefore": False
             }
         },
         {
-            # Copy ONLY FORMATTING from the row below (template) into the newly inserted row
+            # Copy ONLY FORMATTING from the row below (template) into the newly inserted rows
             "copyPaste": {
                 "source": {
                     "sheetId": sheet_id,
-                    "startRowIndex": insert_row0 + 1,
-                    "endRowIndex": insert_row0 + 2,
+                    "startRowIndex": insert_row0 + n,
+                    "endRowIndex": insert_row0 + n + 1,
                     "startColumnIndex": 0,
                     "endColumnIndex": column_count
                 },
                 "destination": {
                     "sheetId": sheet_id,
                     "startRowIndex": insert_row0,
-                    "endRowIndex": insert_row0 + 1,
+                    "endRowIndex": insert_row0 + n,
                     "startColumnIndex": 0,
                     "endColumnIndex": column_count
                 },
@@ -156,13 +325,21 @@ def _insert_row_and_copy_template_format(svc, sheet_id: int, insert_row0: int, c
             }
         }
     ]
-    svc.spreadsheets().batchUpdate(
-        spreadsheetId=SPREADSHEET_ID,
-        body={"requests": requests}
-    ).execute()
 
-def _format_cells_black_bg_white_font(svc, sheet_id: int, row0: int, col_indices: List[int]):
-    """Set background black + font white for specific cells (one row)."""
+def _undo_inserted_rows(svc, title: str, sheet_id: int, insert_row0: int, n: int):
+    """A write failed after its rows were inserted: delete them so a retry doesn't stack another set."""
+    try:
+        _execute(svc.spreadsheets().batchUpdate(spreadsheetId=SPREADSHEET_ID, body={"requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": sheet_id, "dimension": "ROWS", "startIndex": insert_row0, "endIndex": insert_row0 + n
+            }}}
+        ]}), WRITE)
+        print(f'[SHEETS] Removed {n} inserted row(s) from "{title}" after a failed write')
+    except Exception as e:
+        print(f'[WARN] Could not remove {n} inserted row(s) at row {insert_row0 + 1} of "{title}": {e}')
+
+def _black_bg_white_font_requests(sheet_id: int, row0: int, col_indices: List[int], n: int = 1) -> List[Dict[str, Any]]:
+    """Background black + font white for specific columns of rows row0..row0+n-1."""
     requests = []
     for c in col_indices:
         requests.append({
@@ -170,7 +347,7 @@ def _format_cells_black_bg_white_font(svc, sheet_id: int, row0: int, col_indices
                 "range": {
                     "sheetId": sheet_id,
                     "startRowIndex": row0,
-                    "endRowIndex": row0 + 1,
+                    "endRowIndex": row0 + n,
                     "startColumnIndex": c,
                     "endColumnIndex": c + 1,
                 },
@@ -183,10 +360,230 @@ def _format_cells_black_bg_white_font(svc, sheet_id: int, row0: int, col_indices
                 "fields": "userEnteredFormat(backgroundColor,textFormat.foregroundColor)"
             }
         })
-    svc.spreadsheets().batchUpdate(
+    return requests
+
+def _insert_row_and_copy_template_format(svc, sheet_id: int, insert_row0: int, column_count: int):
+    """Insert one row at insert_row0 and copy the template row's FORMAT into it."""
+    _execute(svc.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"requests": _insert_rows_requests(sheet_id, insert_row0, column_count)}
+    ), WRITE)
+
+def _format_cells_black_bg_white_font(svc, sheet_id: int, row0: int, col_indices: List[int]):
+    """Set background black + font white for specific cells (one row)."""
+    _execute(svc.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"requests": _black_bg_white_font_requests(sheet_id, row0, col_indices)}
+    ), WRITE)
+
+# === Archival / sharding ===
+# When each row's "No." was last written; rows carry no date column of their own.
+_ROW_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_row_log (
+    tab        TEXT    NOT NULL,
+    no         INTEGER NOT NULL,
+    written_at REAL    NOT NULL,
+    PRIMARY KEY (tab, no)
+);
+"""
+_row_log_ready = False
+_last_archive: Dict[str, float] = {}   # tab -> last archival check
+_archive_titles: set = set()           # tabs known to exist in SHEETS_ARCHIVE_SPREADSHEET_ID
+
+def _row_log():
+    global _row_log_ready
+    conn = connect()
+    if not _row_log_ready:
+        conn.executescript(_ROW_LOG_SCHEMA)
+        _row_log_ready = True
+    return conn
+
+def _log_rows_written(tab: str, nos: List[str]):
+    conn = _row_log()
+    now = time.time()
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO sheet_row_log(tab, no, written_at) VALUES (?,?,?)",
+            [(tab, int(n), now) for n in nos if str(n).strip().isdigit()],
+        )
+
+def _logged_max_no(tab: str) -> int:
+    row = _row_log().execute("SELECT MAX(no) FROM sheet_row_log WHERE tab=?", (tab,)).fetchone()
+    return int(row[0] or 0)
+
+def _row_no(row: List[Any]) -> Optional[int]:
+    try:
+        return int(str(row[0]).strip()) if row else None
+    except ValueError:
+        return None
+
+def _quote(title: str) -> str:
+    return "'" + title.replace("'", "''") + "'"
+
+def _quarter(ts: float) -> str:
+    d = datetime.fromtimestamp(ts)
+    return f"{d.year}-Q{(d.month - 1) // 3 + 1}"
+
+def _shard_titles(tab: str) -> List[str]:
+    rx = re.compile(re.escape(tab) + r" #(\d+)$")
+    with _meta_lock:
+        titles = [t for t in _meta if rx.match(t)]
+    return sorted(titles, key=lambda t: int(rx.match(t).group(1)))
+
+def _delete_rows_requests(sheet_id: int, row1s: List[int]) -> List[Dict[str, Any]]:
+    """deleteDimension per contiguous run, bottom-up so earlier deletes don't shift later ones."""
+    runs: List[List[int]] = []
+    for r in sorted(row1s):
+        if runs and runs[-1][1] + 1 == r:
+            runs[-1][1] = r
+        else:
+            runs.append([r, r])
+    return [
+        {"deleteDimension": {"range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": a - 1, "endIndex": b}}}
+        for a, b in reversed(runs)
+    ]
+
+def _ensure_tab(svc, spreadsheet_id: str, title: str, header_rows: List[List[Any]]):
+    """Create an archive tab (with the source tab's header rows) unless it exists."""
+    if spreadsheet_id == SPREADSHEET_ID:
+        try:
+            _tab_meta(svc, title)
+            return
+        except ValueError:
+            pass
+    else:
+        if title in _archive_titles:
+            return
+        meta = _execute(svc.spreadsheets().get(spreadsheetId=spreadsheet_id, fields="sheets.properties.title"), READ)
+        _archive_titles.update(sh["properties"]["title"] for sh in meta.get("sheets", []))
+        if title in _archive_titles:
+            return
+
+    _execute(svc.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id, body={"requests": [{"addSheet": {"properties": {"title": title}}}]}
+    ), WRITE)
+    if header_rows:
+        _execute(svc.spreadsheets().values().update(
+            spreadsheetId=spreadsheet_id, range=f"{_quote(title)}!A1",
+            valueInputOption="USER_ENTERED", body={"values": header_rows},
+        ), WRITE)
+    if spreadsheet_id == SPREADSHEET_ID:
+        invalidate_metadata()
+    else:
+        _archive_titles.add(title)
+    print(f'[SHEETS] Created archive tab "{title}"')
+
+def _archive_tab(svc, tab: str, title: str, written: Dict[int, float], cutoff: float) -> int:
+    """Move old data rows of `title` (the country tab or one of its shards) into per-quarter tabs."""
+    sheet_id = _tab_meta(svc, title).sheet_id
+    rows = _execute(svc.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=f"{_quote(title)}!A1:{_num_to_col(ROW_WIDTH - 1)}",
+        valueRenderOption="FORMULA",
+    ), READ).get("values", []) or []
+
+    header: List[List[Any]] = []
+    by_quarter: Dict[str, List[int]] = {}
+    seen_data = False
+    unknown_age = 0
+    for i, row in enumerate(rows, start=1):
+        no = _row_no(row)
+        if no is None:
+            if not seen_data:
+                header.append(row)
+            continue
+        seen_data = True
+        ts = written.get(no)
+        if ts is None:
+            # written before the row log existed: its age is unknown (rows carry no date), so it stays
+            unknown_age += 1
+        elif ts < cutoff:
+            by_quarter.setdefault(_quarter(ts), []).append(i)
+    if unknown_age:
+        print(f'[SHEETS] "{title}": {unknown_age} row(s) without a write time left in place (not archived)')
+    if not by_quarter:
+        return 0
+
+    # copy first, then delete: a crash in between duplicates rows rather than losing them
+    dest_sid = SHEETS_ARCHIVE_SPREADSHEET_ID or SPREADSHEET_ID
+    for quarter, row1s in sorted(by_quarter.items()):
+        dest = f"{tab} {quarter}"
+        _ensure_tab(svc, dest_sid, dest, header)
+        _execute(svc.spreadsheets().values().append(
+            spreadsheetId=dest_sid, range=f"{_quote(dest)}!A1", valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS", body={"values": [rows[r - 1] for r in row1s]},
+        ), WRITE)
+
+    moved = [r for row1s in by_quarter.values() for r in row1s]
+    _execute(svc.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID, body={"requests": _delete_rows_requests(sheet_id, moved)}
+    ), WRITE)
+    _drop_cursor(title)
+    print(f'[SHEETS] Archived {len(moved)} row(s) from "{title}" into {", ".join(sorted(by_quarter))}')
+    return len(moved)
+
+def archive_old_rows(days: int = SHEETS_ARCHIVE_AFTER_DAYS, tabs: Optional[List[str]] = None) -> int:
+    """
+    Move rows written more than `days` ago out of the country tabs (and their
+    shards) into "<tab> <year>-Q<n>" archive tabs, in bulk: one append per
+    quarter and one batched delete per tab. Returns the number of rows moved.
+    """
+    if days <= 0:
+        return 0
+    svc = _sheets_service()
+    cutoff = time.time() - days * 86400
+    if tabs is None:
+        tabs = [r[0] for r in _row_log().execute("SELECT DISTINCT tab FROM sheet_row_log").fetchall()]
+    moved = 0
+    for tab in tabs:
+        written = {r["no"]: r["written_at"] for r in _row_log().execute(
+            "SELECT no, written_at FROM sheet_row_log WHERE tab=?", (tab,)
+        ).fetchall()}
+        if not written:
+            continue
+        _tab_meta(svc, tab)
+        for title in [tab] + _shard_titles(tab):
+            moved += _archive_tab(svc, tab, title, written, cutoff)
+        _last_archive[tab] = time.time()
+    return moved
+
+def _maybe_archive(tab: str):
+    """Rolling archival: at most one check per tab every ARCHIVE_CHECK_SECS."""
+    if SHEETS_ARCHIVE_AFTER_DAYS <= 0 or time.time() - _last_archive.get(tab, 0) < ARCHIVE_CHECK_SECS:
+        return
+    _last_archive[tab] = time.time()
+    try:
+        archive_old_rows(tabs=[tab])
+    except Exception as e:
+        print(f'[WARN] Archival of "{tab}" failed: {e}')
+
+def _rotate_shard(svc, tab: str, sheet_id: int):
+    """
+    The hot tab reached SHEETS_TAB_ROW_CEILING: copy it whole (data, formats)
+    to "<tab> #k", then delete its data rows so only the header and template
+    row remain. "No." keeps counting via the row log.
+    """
+    _tab_meta(svc, tab)
+    shards = _shard_titles(tab)
+    shard = f"{tab} #{int(shards[-1].rsplit('#', 1)[1]) + 1 if shards else 1}"
+    _execute(svc.spreadsheets().batchUpdate(
         spreadsheetId=SPREADSHEET_ID,
-        body={"requests": requests}
-    ).execute()
+        body={"requests": [{"duplicateSheet": {"sourceSheetId": sheet_id, "newSheetName": shard}}]},
+    ), WRITE)
+
+    col_a = _execute(svc.spreadsheets().values().get(
+        spreadsheetId=SPREADSHEET_ID, range=f"{tab}!A1:A", valueRenderOption="FORMULA"
+    ), READ).get("values", []) or []
+    data_rows = [i for i, row in enumerate(col_a, start=1) if _row_no(row) is not None]
+    if data_rows:
+        _execute(svc.spreadsheets().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID, body={"requests": _delete_rows_requests(sheet_id, data_rows)}
+        ), WRITE)
+    invalidate_metadata()
+    _drop_cursor(tab)
+    print(f'[SHEETS] "{tab}" reached {SHEETS_TAB_ROW_CEILING} rows: moved {len(data_rows)} row(s) to "{shard}"')
+
+def _over_ceiling(cur: TabState, incoming: int) -> bool:
+    return bool(SHEETS_TAB_ROW_CEILING) and cur.first_empty_row - 1 + incoming > SHEETS_TAB_ROW_CEILING
 
 # === Row Builder ===
 def _build_row_from_product(prod: Dict[str, Any]) -> List[str]:
@@ -270,54 +667,192 @@ def _build_row_from_product(prod: Dict[str, Any]) -> List[str]:
     return row
 
 # === Public API ===
-def write_results_to_country_tabs(json_results: Dict[str, Any]):
-    """
-    For each brand -> country -> product:
-      - Select sheet by country name (tab must exist: US, UK, CAN, AUS, DE, UAE)
-      - Find first empty row (scan from row 1)
-      - INSERT a new row at that position
-      - Copy FORMAT from the (now shifted) template row below into inserted row
-      - Auto-increment 'No.' in col 0
-      - Fill target columns (with hyperlinks + fallbacks)
-      - Black background + white text on the cells we filled
-      - Leave the original template row right below for the next product
-    """
-    svc = _sheets_service()
+class SheetsWriteError(RuntimeError):
+    """Some country tabs were not written; `failed` maps tab -> error message."""
+
+    def __init__(self, failed: Dict[str, str]):
+        self.failed = failed
+        super().__init__("; ".join(f'"{tab}": {err}' for tab, err in failed.items()))
 
+def _group_by_country(json_results: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """country tab -> products in run order (a tab may appear under several brands)."""
+    by_country: Dict[str, List[Dict[str, Any]]] = {}
     for brand_block in json_results.get("runs", []):
         for country_block in brand_block.get("countries", []):
             country = country_block.get("name") or ""
             if not country:
                 continue
+            by_country.setdefault(country, []).extend(country_block.get("products", []))
+    return by_country
 
-            try:
-                sheet_id, col_count = _get_sheet_id_and_cols(svc, country)
-                if col_count < ROW_WIDTH:
-                    col_count = ROW_WIDTH
-            except Exception as e:
-                print(f'[WARN] Skipping country "{country}": {e}')
-                continue
+def _write_country_batch(
+    svc, country: str, sheet_id: int, col_count: int, products: List[Dict[str, Any]], *, upsert: bool = False
+):
+    """
+    All products of one tab in two writes: a single batchUpdate (insert new
+    rows, copy template format, black/white formatting) and a single
+    values.batchUpdate. Row positions, "No." values and, with upsert, the
+    (ASIN, keyword) -> row index come from one range read.
 
-            for prod in country_block.get("products", []):
-                # 1) Build values for this product
-                row_vals = _build_row_from_product(prod)
+    With upsert, products already in the tab are rewritten in place (keeping
+    their "No.") and only the rest are inserted.
+    """
+    if not products:
+        return
+
+    # 1) First empty row (template row), next "No." and the upsert index: read once, then tracked locally
+    state = _tab_cursor(svc, country, with_index=upsert)
+    if _over_ceiling(state, len(products)):
+        _rotate_shard(svc, country, sheet_id)
+        state = _tab_cursor(svc, country, with_index=upsert)
+    template_row1, next_no = state.first_empty_row, state.next_no
+    insert_row0 = template_row1 - 1
+
+    # 2) Build values locally; split into in-place updates and new rows
+    updates: Dict[int, List[str]] = {}   # row1 -> values
+    new_rows: List[List[str]] = []
+    new_index: Dict[Any, int] = {}       # key -> position in new_rows (same product twice in one batch)
+    for prod in products:
+        row_vals = _build_row_from_product(prod)
+        key = _product_key(prod) if upsert else None
+        if key and key in state.rows_by_key:
+            row1, no = state.rows_by_key[key]
+            row_vals[COL_NO] = no
+            updates[row1] = row_vals
+        elif key and key in new_index:
+            new_rows[new_index[key]] = row_vals
+        else:
+            if key:
+                new_index[key] = len(new_rows)
+            new_rows.append(row_vals)
+    n = len(new_rows)
+    for i, row_vals in enumerate(new_rows):
+        row_vals[COL_NO] = str(next_no + i)
+
+    inserted = False
+    try:
+        # 3) Insert n rows (at template_row1 .. template_row1+n-1), copy template FORMAT, black bg + white font
+        if n:
+            requests = _insert_rows_requests(sheet_id, insert_row0, col_count, n)
+            requests += _black_bg_white_font_requests(sheet_id, insert_row0, FILLED_COLS, n)
+            _execute(svc.spreadsheets().batchUpdate(spreadsheetId=SPREADSHEET_ID, body={"requests": requests}), WRITE)
+            inserted = True
+
+        # 4) Values for updated + inserted rows
+        last_col_letter = _num_to_col(ROW_WIDTH - 1)
+        data = [
+            {"range": f"{country}!A{row1}:{last_col_letter}{row1}", "values": [vals]}
+            for row1, vals in sorted(updates.items())
+        ]
+        if n:
+            data.append({
+                "range": f"{country}!A{template_row1}:{last_col_letter}{template_row1 + n - 1}",
+                "values": new_rows,
+            })
+        _execute(svc.spreadsheets().values().batchUpdate(
+            spreadsheetId=SPREADSHEET_ID,
+            body={"valueInputOption": "USER_ENTERED", "data": data},
+        ), WRITE)
+    except Exception:
+        if inserted:
+            _undo_inserted_rows(svc, country, sheet_id, insert_row0, n)
+        _drop_cursor(country)
+        raise
+    _advance_cursor(country, new_rows, new_index)
+    _log_rows_written(country, [r[COL_NO] for r in new_rows] + [r[COL_NO] for r in updates.values()])
+
+    if n:
+        print(f'[SHEETS] Inserted+Wrote rows {template_row1}-{template_row1 + n - 1} to "{country}" '
+              f'(No.={next_no}-{next_no + n - 1})')
+    if updates:
+        print(f'[SHEETS] Updated {len(updates)} existing row(s) in "{country}": {sorted(updates)}')
+
+def _write_country_rows(
+    svc, country: str, sheet_id: int, col_count: int, products: List[Dict[str, Any]], *, upsert: bool = False
+):
+    """Row-at-a-time writer (one small read + 3 writes per product, always inserts); kept for batch=False."""
+    for prod in products:
+        # 1) Build values for this product
+        row_vals = _build_row_from_product(prod)
+
+        # 2) First empty row (template row) + next "No." from the tab cursor, convert to 0-based
+        cur = _tab_cursor(svc, country)
+        if _over_ceiling(cur, 1):
+            _rotate_shard(svc, country, sheet_id)
+            cur = _tab_cursor(svc, country)
+        template_row1 = cur.first_empty_row
+        insert_row0   = template_row1 - 1
+        next_no       = cur.next_no
+        row_vals[COL_NO] = str(next_no)
+
+        inserted = False
+        try:
+            # 3) Insert a new row at insert_row0 and copy FORMAT from template (now at insert_row0+1)
+            _insert_row_and_copy_template_format(svc, sheet_id, insert_row0, col_count)
+            inserted = True
 
-                # 2) Find first empty row (template row), convert to 0-based
-                template_row1 = _first_empty_row(svc, country, col_letter="A")
-                insert_row0   = template_row1 - 1
+            # 4) Write values into the INSERTED row (1-based row index == template_row1)
+            _write_row(svc, country, template_row1, row_vals)
 
-                # 3) Insert a new row at insert_row0 and copy FORMAT from template (now at insert_row0+1)
-                _insert_row_and_copy_template_format(svc, sheet_id, insert_row0, col_count)
+            # 5) Apply black bg + white font on filled cells in the inserted row
+            _format_cells_black_bg_white_font(svc, sheet_id, row0=insert_row0, col_indices=FILLED_COLS)
+        except Exception:
+            if inserted:
+                _undo_inserted_rows(svc, country, sheet_id, insert_row0, 1)
+            _drop_cursor(country)
+            raise
+        _advance_cursor(country, [row_vals])
+        _log_rows_written(country, [row_vals[COL_NO]])
 
-                # 4) Determine new "No." and write values into the INSERTED row (1-based row index == template_row1)
-                next_no = _next_no_value(svc, country)
-                row_vals[COL_NO] = str(next_no)
-                _write_row(svc, country, template_row1, row_vals)
+        print(f'[SHEETS] Inserted+Wrote row {template_row1} to "{country}" (No.={next_no})')
 
-                # 5) Apply black bg + white font on filled cells in the inserted row
-                _format_cells_black_bg_white_font(svc, sheet_id, row0=insert_row0, col_indices=FILLED_COLS)
+def write_results_to_country_tabs(json_results: Dict[str, Any], *, batch: bool = True, upsert: bool = SHEETS_UPSERT):
+    """
+    For each country tab (products of every brand for that country, in order):
+      - Select sheet by country name (tab must exist: US, UK, CAN, AUS, DE, UAE)
+      - Find first empty row (column A is read once per tab, then tracked locally)
+      - INSERT new rows at that position
+      - Copy FORMAT from the (now shifted) template row below into inserted rows
+      - Auto-increment 'No.' in col 0
+      - Fill target columns (with hyperlinks + fallbacks)
+      - Black background + white text on the cells we filled
+      - Leave the original template row right below for the next run
+
+    batch=True does all of a tab's products in one batchUpdate + one
+    values.batchUpdate; batch=False writes row by row. upsert=True (batch
+    only) rewrites the existing row of a (country, ASIN, keyword) in place
+    instead of inserting another one.
+
+    Tabs are kept small: rows older than SHEETS_ARCHIVE_AFTER_DAYS move to
+    per-quarter archive tabs, and a tab past SHEETS_TAB_ROW_CEILING rows is
+    rotated into a "<tab> #k" shard before writing.
+
+    Every tab is attempted; if any tab is missing or its write fails,
+    SheetsWriteError is raised afterwards listing those tabs (their rows
+    were not written, so callers keep them for a retry).
+    """
+    svc = _sheets_service()
+    write_tab = _write_country_batch if batch else _write_country_rows
 
-                print(f'[SHEETS] Inserted+Wrote row {template_row1} to "{country}" (No.={next_no})')
+    failed: Dict[str, str] = {}
+    for country, products in _group_by_country(json_results).items():
+        try:
+            sheet_id, col_count = _get_sheet_id_and_cols(svc, country)
+            if col_count < ROW_WIDTH:
+                col_count = ROW_WIDTH
+        except Exception as e:
+            print(f'[WARN] Skipping country "{country}": {e}')
+            failed[country] = str(e)
+            continue
+
+        _maybe_archive(country)
+        try:
+            write_tab(svc, country, sheet_id, col_count, products, upsert=upsert)
+        except Exception as e:
+            print(f'[WARN] Writing country "{country}" failed: {e}')
+            failed[country] = str(e)
+    if failed:
+        raise SheetsWriteError(failed)
 
 # === Local test runner (no scraper required) ===
 def main():
@@ -0,0 +1,96 @@
+# sheets_quota.py
+import os, time, random, threading
+
+# Sheets API quota is per minute, per user; stay a little under it
+SHEETS_READS_PER_MIN  = float(os.getenv("SHEETS_READS_PER_MIN", "55"))
+SHEETS_WRITES_PER_MIN = float(os.getenv("SHEETS_WRITES_PER_MIN", "55"))
+SHEETS_MAX_RETRIES    = int(os.getenv("SHEETS_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECS     = 1.0
+BACKOFF_MAX_SECS      = 64.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+READ  = "read"
+WRITE = "write"
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate_per_min` tokens/minute, bursts up to `burst`."""
+
+    def __init__(self, rate_per_min: float, burst: float = None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = burst if burst is not None else max(1.0, rate_per_min / 6.0)  # ~10 s of quota
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0):
+        """Block until n tokens are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket (server said 429: our estimate of the remaining quota was too high)."""
+        with self._lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+_buckets = {
+    READ: TokenBucket(SHEETS_READS_PER_MIN),
+    WRITE: TokenBucket(SHEETS_WRITES_PER_MIN),
+}
+
+
+def _http_status(err: Exception):
+    resp = getattr(err, "resp", None)
+    try:
+        return int(getattr(resp, "status", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(err: Exception):
+    resp = getattr(err, "resp", None)
+    try:
+        return float(resp.get("retry-after"))
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter: random(0, min(max, base * 2^attempt))."""
+    return random.uniform(0, min(BACKOFF_MAX_SECS, BACKOFF_BASE_SECS * (2 ** attempt)))
+
+
+def execute(request, kind: str = READ, *, max_retries: int = SHEETS_MAX_RETRIES):
+    """
+    request.execute() behind the shared read/write token bucket. 429 and 5xx
+    responses (and dropped connections) are retried with exponential backoff
+    plus jitter; anything else, or running out of retries, raises.
+    """
+    bucket = _buckets[kind]
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            return request.execute()
+        except Exception as e:
+            status = _http_status(e)
+            transient = status in RETRYABLE_STATUS or (status is None and isinstance(e, (OSError, TimeoutError)))
+            if not transient or attempt >= max_retries:
+                raise
+            if status == 429:
+                bucket.drain()
+            delay = max(_retry_after(e) or 0.0, backoff_delay(attempt))
+            print(f"[SHEETS] {kind} got {status or type(e).__name__}; retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,225 @@
+# sheets_sink.py
+import os, json, time, atexit, random, threading, traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from local_db import connect, transaction
+from sheet_writer import write_results_to_country_tabs
+
+# Rows arriving within this window go out in one batched write per country tab
+SHEETS_FLUSH_WINDOW_SECS = float(os.getenv("SHEETS_FLUSH_WINDOW_SECS", "5"))
+# Wait after a failed write before trying that tab again (doubles per failure, capped)
+SHEETS_RETRY_SECS     = 30.0
+SHEETS_RETRY_MAX_SECS = 900.0
+
+# Durable retry spool: a row stays here from submit() until it is in the sheet
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets_spool (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    country    TEXT    NOT NULL,
+    block      TEXT    NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    error      TEXT,
+    created_at REAL    NOT NULL,
+    updated_at REAL    NOT NULL
+);
+"""
+
+
+def _spool_init():
+    connect().executescript(_SCHEMA)
+
+
+def _spool_add(country: str, block: Dict[str, Any]) -> int:
+    now = time.time()
+    cur = connect().execute(
+        "INSERT INTO sheets_spool(country, block, created_at, updated_at) VALUES (?,?,?,?)",
+        (country, json.dumps(block, ensure_ascii=False), now, now),
+    )
+    return cur.lastrowid
+
+
+def _spool_load() -> List[Tuple[int, str, Dict[str, Any]]]:
+    rows = connect().execute("SELECT id, country, block FROM sheets_spool ORDER BY id").fetchall()
+    return [(r["id"], r["country"], json.loads(r["block"])) for r in rows]
+
+
+def _spool_done(ids: List[int]):
+    conn = connect()
+    with transaction(conn):
+        conn.executemany("DELETE FROM sheets_spool WHERE id=?", [(i,) for i in ids])
+
+
+def _spool_failed(ids: List[int], err_msg: str):
+    conn = connect()
+    with transaction(conn):
+        conn.executemany(
+            "UPDATE sheets_spool SET attempts=attempts+1, error=?, updated_at=? WHERE id=?",
+            [(err_msg, time.time(), i) for i in ids],
+        )
+
+
+class SheetsSink:
+    """
+    Write-behind Google Sheets logger. Scraper threads `submit()` each product
+    block as soon as it is committed; a background thread coalesces rows for
+    `window_secs` and writes them per country tab, so Sheets latency and
+    failures never block scraping. Every row is spooled to SQLite on submit
+    and only removed once written, so rows of a failed tab are retried with
+    backoff, and rows left over by a crash are replayed on the next start.
+    `close()` flushes whatever is left.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_secs: float = SHEETS_FLUSH_WINDOW_SECS,
+        writer: Callable[[Dict[str, Any]], None] = write_results_to_country_tabs,
+    ):
+        self.window_secs = window_secs
+        self.writer = writer
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[int, str, Dict[str, Any]]] = []  # (spool id, country, block), arrival order
+        self._retry_at: Dict[str, float] = {}                       # country -> earliest retry time
+        self._failures: Dict[str, int] = {}                         # country -> consecutive failed writes
+        self._inflight = 0
+        self._flush_now = False
+        self._closing = False
+
+        _spool_init()
+        self._pending = _spool_load()
+        if self._pending:
+            print(f"[SHEETS] Replaying {len(self._pending)} spooled row(s) from a previous run")
+
+        self._thread = threading.Thread(target=self._run, name="sheets-sink", daemon=True)
+        self._thread.start()
+
+    # ---------- producer side ----------
+    def submit(self, country: str, block: Dict[str, Any]):
+        country = (country or "").strip()
+        if not country:
+            return
+        spool_id = _spool_add(country, block)  # durable before we return
+        with self._cond:
+            self._pending.append((spool_id, country, block))
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._inflight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write everything queued now (ignoring the window and any backoff);
+        True if drained. Each tab gets one more attempt: once only rows of
+        tabs that failed again (back on backoff) remain, stop and return False.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._retry_at.clear()
+            self._flush_now = True
+            self._cond.notify_all()
+            try:
+                while self._inflight or self._due():
+                    left = None if deadline is None else deadline - time.time()
+                    if left is not None and left <= 0:
+                        return False
+                    self._cond.wait(left if left is not None else 1.0)
+                return not self._pending
+            finally:
+                self._flush_now = False
+
+    def close(self, timeout: Optional[float] = 60.0):
+        drained = self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        if not drained:
+            print(f"[SHEETS] Shutdown with {self.pending()} row(s) unwritten; kept in the spool for next start")
+
+    # ---------- writer thread ----------
+    def _due(self) -> bool:
+        """Any queued row whose tab isn't backing off (caller holds _cond)."""
+        now = time.time()
+        return any(self._retry_at.get(entry[1], 0) <= now for entry in self._pending)
+
+    def _take_batch(self) -> Dict[str, List[Tuple[int, str, Dict[str, Any]]]]:
+        """Pop every queued row whose tab isn't backing off, grouped by country."""
+        now = time.time()
+        batch: Dict[str, List[Tuple[int, str, Dict[str, Any]]]] = {}
+        keep = []
+        for entry in self._pending:
+            country = entry[1]
+            if self._retry_at.get(country, 0) > now:
+                keep.append(entry)
+            else:
+                batch.setdefault(country, []).append(entry)
+        self._pending = keep
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if self._closing:
+                    return  # close() already flushed (or gave up after its timeout)
+                # coalesce: let more rows arrive (flush() / close() cut the window short)
+                window_end = time.time() + self.window_secs
+                while not (self._flush_now or self._closing) and time.time() < window_end:
+                    self._cond.wait(window_end - time.time())
+                batch = self._take_batch()
+                self._inflight = sum(len(v) for v in batch.values())
+                if not batch:
+                    self._cond.wait(1.0)
+                    continue
+
+            for country, entries in batch.items():
+                ids = [e[0] for e in entries]
+                blocks = [e[2] for e in entries]
+                try:
+                    self.writer({"runs": [{"brand": "", "countries": [{"name": country, "products": blocks}]}]})
+                    _spool_done(ids)
+                    self._failures.pop(country, None)
+                    print(f'[SHEETS] Logged {len(blocks)} row(s) to "{country}"')
+                except Exception as e:
+                    traceback.print_exc()
+                    _spool_failed(ids, str(e))
+                    n = self._failures[country] = self._failures.get(country, 0) + 1
+                    delay = min(SHEETS_RETRY_MAX_SECS, SHEETS_RETRY_SECS * 2 ** (n - 1)) * random.uniform(0.8, 1.2)
+                    print(f'[WARNING] Error logging to sheets ("{country}"), {len(blocks)} row(s) spooled, '
+                          f'retry in {delay:.0f}s: {e}')
+                    with self._cond:
+                        self._pending[:0] = entries
+                        self._retry_at[country] = time.time() + delay
+
+            with self._cond:
+                self._inflight = 0
+                self._cond.notify_all()
+
+
+# ---------------------------
+# Process-wide sink
+# ---------------------------
+_sink: Optional[SheetsSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> SheetsSink:
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = SheetsSink()
+        return _sink
+
+
+def shutdown_sink(timeout: Optional[float] = 60.0):
+    """Flush queued rows and stop the writer thread (FastAPI shutdown / interpreter exit)."""
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        sink.close(timeout)
+
+
+atexit.register(shutdown_sink)
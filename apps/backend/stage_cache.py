@@ -0,0 +1,174 @@
+# stage_cache.py
+import os, json, time, threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from local_db import connect, transaction
+from amazon_urls import normalize_keyword, page_key, product_key
+
+# Serve recent stage results from scraper.db instead of re-driving the browser
+STAGE_CACHE = os.getenv("STAGE_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+# Cached stages and how long an entry stays fresh (hours; override with STAGE_CACHE_TTL_<STAGE>_HOURS)
+CATEGORY_REVENUE = "category_revenue"  # key: normalized category URL
+MONTHLY_REVENUE  = "monthly_revenue"   # key: product ASIN
+COMPETITORS      = "competitors"       # key: (category, keyword)
+FEES             = "fees"              # key: competitor ASIN
+CEREBRO          = "cerebro"           # key: (ASIN, keyword)
+
+_DEFAULT_TTL_HOURS = {
+    CATEGORY_REVENUE: 24,
+    MONTHLY_REVENUE:  24,
+    COMPETITORS:      72,
+    FEES:             168,
+    CEREBRO:          72,
+}
+TTL_SECS = {
+    stage: float(os.getenv(f"STAGE_CACHE_TTL_{stage.upper()}_HOURS", str(hours))) * 3600.0
+    for stage, hours in _DEFAULT_TTL_HOURS.items()
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_cache (
+    stage     TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (stage, key)
+);
+"""
+
+_schema_ready = False
+
+
+def _ensure_schema():
+    global _schema_ready
+    if not _schema_ready:
+        connect().executescript(_SCHEMA)
+        _schema_ready = True
+
+
+# ---------- keys (canonical forms from amazon_urls) ----------
+def asin_key(url: str) -> Optional[str]:
+    return product_key(url)
+
+
+def category_key(category_url: str) -> str:
+    return page_key(category_url)
+
+
+def competitors_key(category_url: str, keyword: str) -> str:
+    return f"{page_key(category_url)}|{normalize_keyword(keyword)}"
+
+
+def cerebro_key(product_url: str, keyword: str) -> Optional[str]:
+    key = product_key(product_url)
+    return f"{key}|{normalize_keyword(keyword)}" if key else None
+
+
+# ---------- get / put ----------
+def get(stage: str, key: Optional[str]) -> Optional[Any]:
+    """Fresh cached value for (stage, key), else None."""
+    if not STAGE_CACHE or not key:
+        return None
+    _ensure_schema()
+    row = connect().execute(
+        "SELECT value, stored_at FROM stage_cache WHERE stage=? AND key=?", (stage, key)
+    ).fetchone()
+    if row is None or time.time() - row["stored_at"] > TTL_SECS.get(stage, 0):
+        return None
+    try:
+        return json.loads(row["value"])
+    except ValueError:
+        return None
+
+
+def put(stage: str, key: Optional[str], value: Any):
+    if not STAGE_CACHE or not key or value is None:
+        return
+    _ensure_schema()
+    conn = connect()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO stage_cache(stage, key, value, stored_at) VALUES (?,?,?,?)",
+            (stage, key, json.dumps(value, ensure_ascii=False), time.time()),
+        )
+
+
+def invalidate(stage: Optional[str] = None, key: Optional[str] = None) -> int:
+    """Drop cached entries (all, one stage, or one key); returns how many were removed."""
+    _ensure_schema()
+    conn = connect()
+    with transaction(conn):
+        if stage and key:
+            cur = conn.execute("DELETE FROM stage_cache WHERE stage=? AND key=?", (stage, key))
+        elif stage:
+            cur = conn.execute("DELETE FROM stage_cache WHERE stage=?", (stage,))
+        else:
+            cur = conn.execute("DELETE FROM stage_cache")
+    return cur.rowcount
+
+
+def purge_expired() -> int:
+    """Delete entries past their stage's TTL."""
+    _ensure_schema()
+    now = time.time()
+    conn = connect()
+    removed = 0
+    with transaction(conn):
+        for stage, ttl in TTL_SECS.items():
+            removed += conn.execute(
+                "DELETE FROM stage_cache WHERE stage=? AND stored_at < ?", (stage, now - ttl)
+            ).rowcount
+    return removed
+
+
+# ---------- in-run sharing ----------
+class GroupMemo:
+    """
+    Single-flight memo for work shared by products of one job (same category,
+    same category + keyword). The first caller for a key computes; callers
+    arriving meanwhile (other pool workers) wait for that result instead of
+    redoing it. A None result isn't kept, so the next caller tries again.
+    """
+
+    def __init__(self, wait_secs: float = 900.0):
+        self.wait_secs = wait_secs
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, Dict[str, Any]] = {}  # key -> {"done": Event, "value": ...}
+
+    def peek(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            e = self._entries.get(key)
+        return e["value"] if e is not None and e["done"].is_set() else None
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            e = self._entries.get(key)
+            leader = e is None
+            if leader:
+                e = self._entries[key] = {"done": threading.Event(), "value": None}
+        if not leader:
+            if e["done"].wait(self.wait_secs) and e["value"] is not None:
+                return e["value"]
+            return fn()  # leader failed or hung: do it ourselves
+
+        value = None
+        try:
+            value = fn()
+            return value
+        finally:
+            e["value"] = value
+            if value is None:
+                with self._lock:
+                    if self._entries.get(key) is e:
+                        del self._entries[key]
+            e["done"].set()
+
+    def forget(self, scope: Any):
+        """Drop every entry of one job (keys start with the job id)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == scope]:
+                del self._entries[key]
+
+
+group_memo = GroupMemo()
@@ -0,0 +1,161 @@
+# stage_graph.py
+import os, queue, threading, traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from helium_boot import connect_cdp, disconnect_cdp
+
+# Max stages in flight per product (1 = run stages in order on the caller's connection)
+STAGE_PARALLELISM = int(os.getenv("STAGE_PARALLELISM", "3"))
+
+# fn(browser, ctx, upstream) -> value ; upstream = {dep_name: value}
+StageFn = Callable[[Any, Any, Dict[str, Any]], Any]
+
+
+class Stage:
+    """One node of the per-product pipeline; runs once all `deps` have finished."""
+
+    def __init__(self, name: str, fn: StageFn, deps: Iterable[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+def _toposort(stages: List[Stage]) -> List[Stage]:
+    by_name = {s.name: s for s in stages}
+    order: List[Stage] = []
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+    def visit(s: Stage):
+        if state.get(s.name) == 2:
+            return
+        if state.get(s.name) == 1:
+            raise ValueError(f"Stage cycle at '{s.name}'")
+        state[s.name] = 1
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"Stage '{s.name}' depends on unknown stage '{d}'")
+            visit(by_name[d])
+        state[s.name] = 2
+        order.append(s)
+
+    for s in stages:
+        visit(s)
+    return order
+
+
+class _Lane(threading.Thread):
+    """
+    A stage thread with its own Playwright driver attached to the same Chrome
+    (sync Playwright objects can't cross threads). The connection stays warm
+    across products and is re-attached if Chrome was recycled.
+    """
+
+    def __init__(self, cdp_port: int, done_q: "queue.Queue", name: str):
+        super().__init__(name=name, daemon=True)
+        self.cdp_port = cdp_port
+        self.done_q = done_q
+        self.tasks: "queue.Queue" = queue.Queue()
+        self.pw = self.browser = self.ctx = None
+
+    def _connection(self):
+        try:
+            if self.browser is not None and self.browser.is_connected():
+                return self.browser, self.ctx
+        except Exception:
+            pass
+        self._disconnect()
+        self.pw, self.browser, self.ctx = connect_cdp(self.cdp_port)
+        return self.browser, self.ctx
+
+    def _disconnect(self):
+        disconnect_cdp(self.pw, self.browser, self.ctx)
+        self.pw = self.browser = self.ctx = None
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self._disconnect()
+                return
+            stage, upstream = task
+            try:
+                browser, ctx = self._connection()
+                self.done_q.put((self, stage.name, stage.fn(browser, ctx, upstream), None))
+            except Exception as e:
+                traceback.print_exc()
+                self.done_q.put((self, stage.name, None, e))
+
+
+class StageRunner:
+    """
+    Runs a product's stages as a dependency graph: every stage whose deps are
+    finished is dispatched to a free lane, so wall time is roughly the
+    critical path instead of the sum of all stages.
+    """
+
+    def __init__(self, cdp_port: int, parallelism: int = STAGE_PARALLELISM):
+        self.cdp_port = cdp_port
+        self.parallelism = max(1, parallelism)
+        self._done_q: "queue.Queue" = queue.Queue()
+        self._lanes: List[_Lane] = []
+
+    def _ensure_lanes(self):
+        while len(self._lanes) < self.parallelism:
+            lane = _Lane(self.cdp_port, self._done_q, name=f"stage-{self.cdp_port}-{len(self._lanes)}")
+            lane.start()
+            self._lanes.append(lane)
+
+    def run(self, stages: List[Stage], *, browser=None, ctx=None) -> Dict[str, Tuple[Any, Optional[Exception]]]:
+        """
+        Execute the graph. Returns {stage_name: (value, error)}; a stage whose
+        dependency failed is skipped with that error. With parallelism 1 the
+        stages run in topological order on the caller's browser/ctx.
+        """
+        order = _toposort(stages)
+        results: Dict[str, Tuple[Any, Optional[Exception]]] = {}
+
+        if self.parallelism == 1:
+            for s in order:
+                failed = [d for d in s.deps if results[d][1] is not None]
+                if failed:
+                    results[s.name] = (None, RuntimeError(f"skipped: dependency '{failed[0]}' failed"))
+                    continue
+                try:
+                    results[s.name] = (s.fn(browser, ctx, {d: results[d][0] for d in s.deps}), None)
+                except Exception as e:
+                    traceback.print_exc()
+                    results[s.name] = (None, e)
+            return results
+
+        self._ensure_lanes()
+        pending = list(order)
+        idle = list(self._lanes)
+        running = 0
+        while pending or running:
+            # dispatch everything that is ready
+            for s in list(pending):
+                if not all(d in results for d in s.deps):
+                    continue
+                failed = [d for d in s.deps if results[d][1] is not None]
+                if failed:
+                    results[s.name] = (None, RuntimeError(f"skipped: dependency '{failed[0]}' failed"))
+                    pending.remove(s)
+                    continue
+                if not idle:
+                    break
+                lane = idle.pop(0)
+                lane.tasks.put((s, {d: results[d][0] for d in s.deps}))
+                pending.remove(s)
+                running += 1
+            if not running:
+                continue
+            lane, name, value, err = self._done_q.get()
+            results[name] = (value, err)
+            idle.append(lane)
+            running -= 1
+        return results
+
+    def close(self):
+        for lane in self._lanes:
+            lane.tasks.put(None)
+        self._lanes = []
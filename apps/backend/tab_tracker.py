@@ -0,0 +1,214 @@
+# tab_tracker.py
+import time, threading
+from typing import Any, Callable, Dict, List, Optional
+
+from amazon_urls import parse as parse_amazon_url
+
+# Tab kinds kept in the registry
+AMAZON  = "amazon"   # any page on an Amazon marketplace
+XRAY    = "xray"     # Amazon page where XRAY is known to be open (see mark())
+CEREBRO = "cerebro"  # Helium Cerebro page
+
+CEREBRO_PATH_FRAGMENT = "cerebro/index-extension"
+
+PUMP_MS = 50  # longest a waiter stays inside one driver call between checks
+
+
+def _kinds(url: str) -> set:
+    kinds = set()
+    if parse_amazon_url(url).marketplace:
+        kinds.add(AMAZON)
+    if CEREBRO_PATH_FRAGMENT in (url or ""):
+        kinds.add(CEREBRO)
+    return kinds
+
+
+class TabTracker:
+    """
+    Live registry of a BrowserContext's tabs, fed by the context "page" event
+    and each page's "framenavigated" / "close" events, so nobody has to scan
+    ctx.pages in a sleep loop. Waiters are resolved from inside those event
+    handlers; the waiting thread only keeps the Playwright driver turning
+    (short wait_for_timeout slices) so the handlers get to run.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self._lock = threading.Lock()
+        self._tabs: Dict[Any, Dict[str, Any]] = {}  # page -> {"url", "kinds", "seq"}
+        self._seq = 0
+        self._waiters: List["TabWaiter"] = []
+        ctx.on("page", self._on_page)
+        for pg in list(ctx.pages):
+            self._on_page(pg)
+
+    # ---------- events ----------
+    def _on_page(self, pg):
+        try:
+            pg.on("framenavigated", self._on_nav)
+            pg.on("close", self._on_close)
+            self._update(pg, pg.url)
+        except Exception:
+            pass
+
+    def _on_nav(self, frame):
+        try:
+            if frame.parent_frame is None:
+                self._update(frame.page, frame.url)
+        except Exception:
+            pass
+
+    def _on_close(self, pg):
+        with self._lock:
+            self._tabs.pop(pg, None)
+
+    def _update(self, pg, url: str):
+        with self._lock:
+            tab = self._tabs.get(pg)
+            kinds = _kinds(url)
+            if tab and tab["url"] == url and XRAY in tab["kinds"]:
+                kinds.add(XRAY)  # the XRAY mark only survives while the tab stays on the same URL
+            self._seq += 1
+            self._tabs[pg] = {"url": url, "kinds": kinds, "seq": self._seq}
+            for w in self._waiters:
+                try:
+                    if w.page is None and w.match(url):
+                        w.page = pg
+                except Exception:
+                    pass
+
+    # ---------- registry ----------
+    def mark(self, pg, kind: str = XRAY):
+        """Record something the URL can't tell (e.g. XRAY confirmed open on this tab)."""
+        with self._lock:
+            tab = self._tabs.get(pg)
+            if tab is not None:
+                tab["kinds"].add(kind)
+
+    def tabs(self, kind: Optional[str] = None) -> List[Any]:
+        """Open tabs (optionally of one kind), least recently navigated first."""
+        with self._lock:
+            items = sorted(self._tabs.items(), key=lambda kv: kv[1]["seq"])
+        return [pg for pg, t in items if (kind is None or kind in t["kinds"]) and not pg.is_closed()]
+
+    def find(self, match: Callable[[str], bool], kind: Optional[str] = None):
+        """Most recently navigated open tab whose URL satisfies match(url), or None."""
+        with self._lock:
+            items = sorted(self._tabs.items(), key=lambda kv: kv[1]["seq"], reverse=True)
+        for pg, t in items:
+            if (kind is None or kind in t["kinds"]) and match(t["url"]) and not pg.is_closed():
+                return pg
+        return None
+
+    def expect(self, match: Callable[[str], bool]) -> "TabWaiter":
+        """
+        Arm a waiter before triggering a navigation, so the event can't be missed:
+            with tracker.expect(lambda url: ...) as w:
+                link.click()
+            page = w.wait(30)
+        Only tabs that open / navigate after arming count.
+        """
+        return TabWaiter(self, match)
+
+    def wait_for(self, match: Callable[[str], bool], timeout_s: float = 60, *, existing: bool = True):
+        """
+        Tab whose URL satisfies match(url): an existing one (if `existing`) or
+        the first to open / navigate there within timeout_s. None on timeout.
+        """
+        if existing:
+            self._pump(time.time() + PUMP_MS / 1000.0)  # take in events this connection hasn't dispatched yet
+            pg = self.find(match)
+            if pg is not None:
+                return pg
+        with self.expect(match) as w:
+            pass
+        return w.wait(timeout_s)
+
+    def _pump(self, deadline: float):
+        """Give the Playwright driver a short slice so pending events are dispatched."""
+        ms = min(PUMP_MS, max(1, (deadline - time.time()) * 1000))
+        for pg in self.tabs():
+            try:
+                pg.wait_for_timeout(ms)
+                return
+            except Exception:
+                continue  # closed under us; try another tab
+        # no open tab to pump through (e.g. a stage lane whose registry is still empty): wait on the context
+        t0 = time.time()
+        try:
+            self.ctx.wait_for_event("page", timeout=ms)
+        except Exception:
+            left = ms / 1000.0 - (time.time() - t0)
+            if left > 0:
+                time.sleep(left)
+
+    def detach(self):
+        try:
+            self.ctx.remove_listener("page", self._on_page)
+        except Exception:
+            pass
+        for pg in list(self._tabs):
+            for ev, fn in (("framenavigated", self._on_nav), ("close", self._on_close)):
+                try: pg.remove_listener(ev, fn)
+                except Exception: pass
+
+
+class TabWaiter:
+    """One pending wait on a TabTracker; resolved by the tracker's event handlers."""
+
+    def __init__(self, tracker: TabTracker, match: Callable[[str], bool]):
+        self.tracker = tracker
+        self.match = match
+        self.page = None
+
+    def __enter__(self):
+        with self.tracker._lock:
+            self.tracker._waiters.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._disarm()
+
+    def _disarm(self):
+        with self.tracker._lock:
+            if self in self.tracker._waiters:
+                self.tracker._waiters.remove(self)
+
+    def wait(self, timeout_s: float = 60):
+        """The matching tab, or None after timeout_s."""
+        try:
+            deadline = time.time() + timeout_s
+            while self.page is None and time.time() < deadline:
+                self.tracker._pump(deadline)
+            return self.page
+        finally:
+            self._disarm()
+
+
+_trackers: Dict[Any, TabTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def track_tabs(ctx) -> TabTracker:
+    """The tracker for ctx, created on first use (connect_cdp attaches it up front)."""
+    with _trackers_lock:
+        tr = _trackers.get(ctx)
+        if tr is None:
+            tr = _trackers[ctx] = TabTracker(ctx)
+            try:
+                ctx.on("close", lambda _ctx: untrack_tabs(ctx))
+            except Exception:
+                pass
+        return tr
+
+
+def untrack_tabs(ctx):
+    """Detach ctx's tracker and drop it (context closed / driver disconnected)."""
+    with _trackers_lock:
+        tr = _trackers.pop(ctx, None)
+    if tr is not None:
+        tr.detach()
+        with tr._lock:
+            tr._tabs.clear()
+            tr._waiters.clear()
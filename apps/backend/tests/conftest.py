@@ -0,0 +1,23 @@
+# tests/conftest.py
+import os, sys, tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Modules that touch scraper.db or the working directory at import time (main_loop -> job_store.init_store
+# migrates queue.json) get a scratch directory instead of the real backend state
+_SCRATCH = tempfile.mkdtemp(prefix="scraper-tests-")
+os.environ.setdefault("SCRAPER_DB_PATH", os.path.join(_SCRATCH, "scraper.db"))
+os.chdir(_SCRATCH)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point local_db (and every module's connect()) at a fresh SQLite file for this test."""
+    import local_db
+    path = str(tmp_path / "scraper.db")
+    monkeypatch.setattr(local_db, "DB_PATH", path)
+    return path
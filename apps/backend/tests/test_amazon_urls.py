@@ -0,0 +1,63 @@
+# tests/test_amazon_urls.py
+import pytest
+
+from amazon_urls import (
+    OTHER, PRODUCT, SEARCH,
+    canonical_url, extract_asin_from_url, marketplace_for, on_marketplace, page_key, parse, product_key,
+)
+
+
+@pytest.mark.parametrize("url, asin", [
+    ("https://www.amazon.com/Gummy-Bears/dp/b0aaaaaaaa/ref=sr_1_3?crid=X&th=1", "B0AAAAAAAA"),
+    ("https://amazon.co.uk/gp/product/B0BBBBBBBB?psc=1", "B0BBBBBBBB"),
+    ("https://www.amazon.de/something?asin=B0CCCCCCCC&ref=x", "B0CCCCCCCC"),
+    ("https://www.amazon.com/s?k=candy", None),
+    ("", None),
+])
+def test_extract_asin(url, asin):
+    assert extract_asin_from_url(url) == asin
+
+
+def test_product_urls_become_dp_asin():
+    p = parse("https://www.amazon.co.uk/Gummy-Bears/dp/B0AAAAAAAA/ref=sr_1_3?crid=X&qid=1")
+    assert p == (PRODUCT, "amazon.co.uk", "B0AAAAAAAA", "", "https://www.amazon.co.uk/dp/B0AAAAAAAA")
+    assert product_key(p.url) == "amazon.co.uk:B0AAAAAAAA"
+
+
+def test_search_urls_drop_only_tracking_params():
+    p = parse("https://www.amazon.com/s/ref=nb_sb_noss?i=grocery&k=Gummy+Candy&crid=1X&qid=169&"
+              "sprefix=gum%2Caps&sr=8-1&pd_rd_w=abc&rh=n%3A16322721&page=2&dc")
+    assert p.kind == SEARCH
+    assert p.keyword == "gummy candy"
+    # k first (original case and encoding), every other non-tracking parameter kept as submitted
+    assert p.url == "https://www.amazon.com/s?k=Gummy+Candy&i=grocery&rh=n%3A16322721&page=2&dc"
+
+
+def test_search_url_without_k_is_left_alone():
+    url = "https://www.amazon.com/s/ref=nb_sb_noss?url=search-alias%3Daps&field-keywords=gummy+candy"
+    p = parse(url)
+    assert (p.kind, p.keyword, p.url) == (SEARCH, "", url)
+
+
+def test_category_pages_keep_their_node():
+    p = parse("https://www.amazon.com/b/ref=dp_bc_1?ie=UTF8&node=16322721&ref_=nav")
+    assert (p.kind, p.url) == (OTHER, "https://www.amazon.com/b?ie=UTF8&node=16322721")
+
+
+def test_non_amazon_urls_pass_through():
+    url = "https://example.com/s?k=x&ref=y"
+    assert parse(url) == (OTHER, "", None, "", url)
+    assert canonical_url("  ") == ""
+
+
+def test_page_key_ignores_www_and_tracking():
+    assert page_key("https://www.amazon.com/s?k=candy&ref=a") == page_key("https://amazon.com/s?k=candy&qid=2")
+    assert page_key("https://www.amazon.com/s?k=candy") != page_key("https://www.amazon.com/s?k=candy&i=grocery")
+
+
+def test_marketplaces():
+    assert marketplace_for(url="https://www.amazon.de/s?k=x") == "amazon.de"
+    assert marketplace_for(country="uae") == "amazon.ae"
+    assert marketplace_for() == "amazon.com"
+    assert on_marketplace("https://www.amazon.com.au/dp/B0AAAAAAAA", "amazon.com.au")
+    assert not on_marketplace("https://www.amazon.com.au/dp/B0AAAAAAAA", "amazon.com")
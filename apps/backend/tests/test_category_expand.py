@@ -0,0 +1,121 @@
+# tests/test_category_expand.py
+# The competitor pick reads the category XRAY table after 'Load More'; it must be expanded
+# even when category revenue itself wasn't scraped for this product.
+import pytest
+
+main_loop = pytest.importorskip("main_loop")
+import stage_cache
+
+CATEGORY_URL = "https://www.amazon.com/s?k=gummy+candy"
+PRODUCT_URL  = "https://www.amazon.com/dp/B0AAAAAAAA"
+PICK_URL     = "https://www.amazon.com/dp/B0BBBBBBBB"
+
+
+class FakePage:
+    url = CATEGORY_URL
+
+    def bring_to_front(self):
+        pass
+
+
+class SequentialRunner:
+    def run(self, stages, *, browser, ctx):
+        outcome = {}
+        for st in stages:  # declared in dependency order
+            upstream = {d: outcome[d][0] for d in st.deps}
+            outcome[st.name] = (st.fn(browser, ctx, upstream), None)
+        return outcome
+
+
+class FakeSession:
+    def prepare(self):
+        return object(), object()
+
+    def open_xray(self, target_url, **kwargs):
+        return object(), object(), FakePage()
+
+    def stage_runner(self):
+        return SequentialRunner()
+
+    def finish_product(self):
+        pass
+
+
+@pytest.fixture
+def calls(monkeypatch, tmp_path):
+    calls = {"category": 0, "load_more": 0, "competitors": 0}
+
+    def get_category_revenue(browser, **kwargs):
+        calls["category"] += 1
+        return {"text": "$1,000", "number": "1000"}
+
+    def load_more_and_settle(page, **kwargs):
+        calls["load_more"] += 1
+        return True
+
+    def run_competitors_flow(browser, **kwargs):
+        calls["competitors"] += 1
+        calls["expanded_before_pick"] = calls["category"] + calls["load_more"] > 0
+        pick = {"url": PICK_URL, "product_details": "Gummies", "parent_level_revenue": "500"}
+        return {"picker_best": pick}
+
+    monkeypatch.setattr(main_loop, "find_tab", lambda ctx, url, **kw: FakePage())
+    monkeypatch.setattr(main_loop, "get_category_revenue", get_category_revenue)
+    monkeypatch.setattr(main_loop, "load_more_and_settle", load_more_and_settle)
+    monkeypatch.setattr(main_loop, "run_competitors_flow", run_competitors_flow)
+    monkeypatch.setattr(main_loop, "get_gpt_response", lambda *a: None)
+    monkeypatch.setattr(stage_cache, "put", lambda *a, **kw: None)
+
+    # Only the category stages are under test: everything else is a cache hit
+    others = {
+        stage_cache.MONTHLY_REVENUE: {"parent_level_revenue": "1"},
+        stage_cache.CEREBRO: {"user_prompt": "p", "search_volumes": [1]},
+        stage_cache.FEES: {"fba_fees": {"text": "$1", "number": "1"}},
+    }
+    calls["cache"] = dict(others)
+    monkeypatch.setattr(stage_cache, "get", lambda stage, key: calls["cache"].get(stage))
+
+    for name in ("competitors", "monthlyrev", "cerebro"):
+        (tmp_path / name).mkdir()
+    calls["dirs"] = {name: str(tmp_path / name) for name in ("competitors", "monthlyrev", "cerebro")}
+    return calls
+
+
+def _run(calls, keyword, memo_scope=None):
+    return main_loop.run_single_product(
+        category_url=CATEGORY_URL, product_url=PRODUCT_URL, keyword=keyword,
+        session=FakeSession(), dirs=calls["dirs"], memo_scope=memo_scope,
+    )
+
+
+def test_scraped_category_is_not_expanded_twice(calls):
+    _run(calls, "gummies")
+    assert (calls["category"], calls["load_more"], calls["competitors"]) == (1, 0, 1)
+
+
+def test_memo_shared_category_still_expands_for_another_keyword(calls):
+    scope = object()
+    try:
+        _run(calls, "gummies", memo_scope=scope)
+        _run(calls, "sour gummies", memo_scope=scope)  # category revenue from the memo, competitors is new
+    finally:
+        stage_cache.group_memo.forget(scope)
+    assert calls["category"] == 1
+    assert calls["load_more"] == 1
+    assert calls["competitors"] == 2 and calls["expanded_before_pick"]
+
+
+def test_cached_category_with_expired_competitors_expands(calls):
+    calls["cache"][stage_cache.CATEGORY_REVENUE] = {"text": "$1,000", "number": "1000"}
+    result = _run(calls, "gummies")
+    assert calls["category"] == 0
+    assert calls["load_more"] == 1
+    assert calls["competitors"] == 1 and calls["expanded_before_pick"]
+    assert result["competitors_flow"]["picker_best"]["url"] == PICK_URL
+
+
+def test_cached_category_and_competitors_skip_the_category_tab(calls):
+    calls["cache"][stage_cache.CATEGORY_REVENUE] = {"text": "$1,000", "number": "1000"}
+    calls["cache"][stage_cache.COMPETITORS] = {"picker_best": {"url": PICK_URL}, "raw_result": None}
+    _run(calls, "gummies")
+    assert (calls["category"], calls["load_more"], calls["competitors"]) == (0, 0, 0)
@@ -0,0 +1,66 @@
+# tests/test_csv_picker.py
+from datetime import datetime, timedelta
+
+from csv_picker import _DateParser, _parse_date, find_top_recent_product
+
+HEADER = "Product Details,URL,Parent Level Revenue,Creation Date,Review Count,ASIN\n"
+
+
+def _days_ago(n, fmt="%Y-%m-%d"):
+    return (datetime.now() - timedelta(days=n)).strftime(fmt)
+
+
+def _row(details, url, revenue, created, reviews="10", asin=""):
+    return {"Product Details": details, "URL": url, "Parent Level Revenue": revenue,
+            "Creation Date": created, "Review Count": reviews, "ASIN": asin}
+
+
+def test_picks_highest_revenue_among_recent_matches():
+    rows = [
+        _row("Sour Candy Mix", "u1", "$1,000.00", _days_ago(30)),
+        _row("Candy Jar", "u2", "$5,000.00", _days_ago(60)),
+        _row("Old Candy", "u3", "$9,000.00", _days_ago(365 * 3)),          # too old
+        _row("Candy Bulk", "u4", "$8,000.00", _days_ago(30), "1,500"),     # too many reviews
+        _row("Chocolate", "u5", "$7,000.00", _days_ago(30)),               # keyword missing
+        _row("Candy ???", "u6", "", _days_ago(30)),                        # no revenue
+    ]
+    best = find_top_recent_product(rows, "candy")
+    assert best["url"] == "u2" and best["parent_level_revenue"] == "$5,000.00"
+
+
+def test_revenue_tie_goes_to_the_newer_product():
+    rows = [
+        _row("candy a", "older", "100", _days_ago(200)),
+        _row("candy b", "newer", "100", _days_ago(20)),
+    ]
+    assert find_top_recent_product(rows, "Candy")["url"] == "newer"
+
+
+def test_reads_csv_paths_and_bytes_the_same(tmp_path):
+    body = HEADER + f"Candy Box,u1,$10,{_days_ago(10)},5,B0AAAAAAAA\n" + f"Candy Tin,u2,$20,{_days_ago(10)},5,B0BBBBBBBB\n"
+    path = tmp_path / "xray.csv"
+    path.write_text(" " + body.replace(",URL,", ", URL ,"), encoding="utf-8")  # header whitespace is stripped
+    from_file = find_top_recent_product(str(path), "candy")
+    from_bytes = find_top_recent_product(("﻿" + body).encode("utf-8"), "candy")
+    assert from_file["asin"] == from_bytes["asin"] == "B0BBBBBBBB"
+
+
+def test_no_qualifying_row_returns_none():
+    assert find_top_recent_product([_row("Chocolate", "u1", "10", _days_ago(1))], "candy") is None
+
+
+def test_date_parser_caches_the_format():
+    parse = _DateParser()
+    assert parse("2025-08-01") == datetime(2025, 8, 1)
+    assert parse.fmt == "%Y-%m-%d"
+    assert parse("Aug 03, 2025") == datetime(2025, 8, 3)  # another format still parses
+    assert parse(" ") is None and parse(None) is None
+
+
+def test_date_parser_keeps_month_first_for_ambiguous_dates():
+    parse = _DateParser()
+    assert parse("25/12/2024") == datetime(2024, 12, 25)  # only d/m reads it: d/m gets cached
+    assert parse.fmt == "%d/%m/%Y"
+    # 03/04/2025 reads both ways; like _parse_date, the m/d reading wins
+    assert parse("03/04/2025") == _parse_date("03/04/2025") == datetime(2025, 3, 4)
+    assert parse("13/04/2025") == datetime(2025, 4, 13)
@@ -0,0 +1,76 @@
+# tests/test_group_memo.py
+import threading, time
+
+from stage_cache import GroupMemo
+
+
+def test_first_caller_computes_later_callers_reuse():
+    memo, calls = GroupMemo(), []
+    key = (1, "competitors", "cat|candy")
+    assert memo.peek(key) is None
+    assert memo.do(key, lambda: calls.append(1) or "pick") == "pick"
+    assert memo.do(key, lambda: calls.append(2) or "other") == "pick"
+    assert memo.peek(key) == "pick"
+    assert calls == [1]
+
+
+def test_concurrent_callers_wait_for_the_leader():
+    memo, calls = GroupMemo(), []
+    started = threading.Event()
+
+    def slow():
+        calls.append("leader")
+        started.set()
+        time.sleep(0.1)
+        return "value"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(memo.do(("job", "k"), slow)))
+    leader.start()
+    started.wait(1)
+    results.append(memo.do(("job", "k"), lambda: calls.append("follower") or "dup"))
+    leader.join()
+    assert results == ["value", "value"]
+    assert calls == ["leader"]
+
+
+def test_none_result_is_not_kept():
+    memo = GroupMemo()
+    assert memo.do(("job", "k"), lambda: None) is None
+    assert memo.peek(("job", "k")) is None
+    assert memo.do(("job", "k"), lambda: "retry") == "retry"
+
+
+def test_follower_computes_itself_when_the_leader_fails():
+    memo = GroupMemo(wait_secs=1)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(1)
+        raise RuntimeError("XRAY not detected")
+
+    errors = []
+
+    def lead():
+        try:
+            memo.do(("job", "k"), failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(1)
+    threading.Timer(0.05, release.set).start()
+    assert memo.do(("job", "k"), lambda: "mine") == "mine"
+    leader.join()
+    assert len(errors) == 1
+
+
+def test_forget_drops_one_job_only():
+    memo = GroupMemo()
+    memo.do((1, "category", "a"), lambda: "one")
+    memo.do((2, "category", "a"), lambda: "two")
+    memo.forget(1)
+    assert memo.peek((1, "category", "a")) is None
+    assert memo.peek((2, "category", "a")) == "two"
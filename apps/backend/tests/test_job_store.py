@@ -0,0 +1,80 @@
+# tests/test_job_store.py
+import pytest
+
+import job_store
+
+
+@pytest.fixture
+def store(db_path):
+    job_store.init_store(migrate=False)
+    return job_store
+
+
+def _payload(*names):
+    return {"brands": [{"brand": "B", "countries": [{"name": "US", "products": [{"productname": n} for n in names]}]}]}
+
+
+def test_lease_is_fifo_and_exclusive(store):
+    first = store.enqueue(_payload("a"))
+    second = store.enqueue(_payload("b"))
+    assert store.count() == 2
+
+    job_id, payload = store.lease_next()
+    assert job_id == first and payload["brands"][0]["countries"][0]["products"][0]["productname"] == "a"
+    assert store.get_job(first)["status"] == store.STATUS_LEASED
+    assert store.lease_next()[0] == second
+    assert store.lease_next() is None
+
+
+def test_done_and_failed_leave_the_queue(store):
+    a = store.enqueue(_payload("a"))
+    b = store.enqueue(_payload("b"))
+    store.lease_next(); store.lease_next()
+    store.mark_done(a)
+    store.mark_failed(b, "boom")
+    assert store.count(store.STATUS_PENDING) == 0
+    assert store.get_job(a)["status"] == store.STATUS_DONE
+    assert store.list_payloads(store.STATUS_FAILED)[0]["error"] == "boom"
+
+
+def test_leased_jobs_are_requeued_after_a_crash(store):
+    job_id = store.enqueue(_payload("a"))
+    store.lease_next()
+    assert store.lease_next() is None
+
+    job_store.init_store(migrate=False)  # next process start
+    assert store.get_job(job_id)["status"] == store.STATUS_PENDING
+    assert store.lease_next()[0] == job_id
+
+
+def test_items_checkpoint_and_resume_at_first_unfinished(store):
+    job_id = store.enqueue(_payload("a", "b", "c"))
+    items = store.unfinished_items(job_id)
+    assert [it["seq"] for it in items] == [0, 1, 2]
+    assert items[0]["country"] == "US" and items[0]["product"]["productname"] == "a"
+
+    store.complete_item(items[0]["id"], {"productname": "a", "result": {}})
+    # crash here: the restarted run only sees the products without a committed result
+    job_store.init_store(migrate=False)
+    assert [it["seq"] for it in store.unfinished_items(job_id)] == [1, 2]
+    assert store.item_results(job_id) == {0: {"productname": "a", "result": {}}}
+
+
+def test_ensure_items_is_idempotent(store):
+    payload = _payload("a", "b")
+    job_id = store.enqueue(payload)
+    store.ensure_items(job_id, payload)
+    assert len(store.unfinished_items(job_id)) == 2
+
+
+def test_job_closes_from_item_counts(store):
+    job_id = store.enqueue(_payload("a", "b"))
+    first, second = store.unfinished_items(job_id)
+    store.complete_item(first["id"], {})
+    assert store.close_job_if_finished(job_id) is False
+
+    store.fail_item(second["id"], "boom")
+    assert store.close_job_if_finished(job_id) is True
+    assert store.close_job_if_finished(job_id) is False  # only one caller finalizes
+    job = store.get_job(job_id)
+    assert job["status"] == store.STATUS_FAILED and job["error"] == "1 product(s) failed"
@@ -0,0 +1,62 @@
+# tests/test_run_history.py
+import os
+
+import pytest
+
+import run_history
+
+
+@pytest.fixture
+def history(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(run_history, "RUN_HISTORY_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(run_history, "_schema_ready", False)
+    return run_history
+
+
+def _block(asin, keyword, revenue):
+    return {"url": f"https://www.amazon.com/dp/{asin}", "keyword": keyword,
+            "result": {"category_revenue": {"number": revenue}}}
+
+
+def test_lines_are_read_back_by_offset(history):
+    first = history.append(1, 0, "Brand", "US", _block("B0AAAAAAAA", "Gummy  Candy", "1"))
+    second = history.append(1, 1, "Brand", "UK", _block("B0BBBBBBBB", "chocolate", "2"))
+    assert first["path"] == second["path"] == history.run_path(1)
+    assert second["offset"] == first["offset"] + first["length"]
+
+    recs = list(history.query(job_id=1))
+    assert [r["seq"] for r in recs] == [0, 1]
+    assert recs[1]["block"]["result"]["category_revenue"]["number"] == "2"
+
+
+def test_filters_use_the_index(history):
+    history.append(1, 0, "Brand", "US", _block("B0AAAAAAAA", "Gummy Candy", "1"))
+    history.append(2, 0, "Brand", "US", _block("B0AAAAAAAA", "chocolate", "2"))
+    history.append(2, 1, "Brand", "UK", _block("B0BBBBBBBB", "gummy candy", "3"))
+
+    assert [(r["job_id"], r["seq"]) for r in history.query(asin="b0aaaaaaaa")] == [(1, 0), (2, 0)]
+    # keywords are matched in their normalized form
+    assert [r["job_id"] for r in history.query(keyword=" GUMMY   candy ")] == [1, 2]
+    assert [r["asin"] for r in history.query(job_id=2, country="UK")] == ["B0BBBBBBBB"]
+    assert len(list(history.query(limit=2))) == 2
+
+
+def test_asin_prefers_the_scraped_one(history):
+    block = _block("B0AAAAAAAA", "k", "1")
+    block["result"]["monthly_revenue"] = {"meta": {"asin": "b0cccccccc"}}
+    history.append(3, 0, "Brand", "US", block)
+    assert next(history.query(job_id=3))["asin"] == "B0CCCCCCCC"
+
+
+def test_list_runs_counts_products(history):
+    history.append(1, 0, "Brand", "US", _block("B0AAAAAAAA", "k", "1"))
+    history.append(2, 0, "Brand", "US", _block("B0AAAAAAAA", "k", "1"))
+    history.append(2, 1, "Brand", "US", _block("B0BBBBBBBB", "k", "1"))
+    assert [(r["job_id"], r["products"]) for r in history.list_runs()] == [(2, 2), (1, 1)]
+
+
+def test_missing_run_file_is_skipped(history):
+    info = history.append(1, 0, "Brand", "US", _block("B0AAAAAAAA", "k", "1"))
+    history.append(2, 0, "Brand", "US", _block("B0BBBBBBBB", "k", "1"))
+    os.remove(info["path"])
+    assert [r["job_id"] for r in history.query()] == [2]
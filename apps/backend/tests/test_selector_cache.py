@@ -0,0 +1,73 @@
+# tests/test_selector_cache.py
+import pytest
+
+import selector_cache
+from selector_cache import _order, try_strategies
+
+
+@pytest.fixture
+def cache(db_path, monkeypatch):
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE", True)
+    monkeypatch.setattr(selector_cache, "DEMOTE_AFTER", 3)
+    monkeypatch.setattr(selector_cache, "_loaded", False)
+    monkeypatch.setattr(selector_cache, "_strategies", {})
+    monkeypatch.setattr(selector_cache, "_actions", {})
+    return selector_cache
+
+
+def _set(cache, name, **row):
+    cache._row("act", name).update(row)
+
+
+def test_order_defaults_to_declared(cache):
+    assert _order("act", ["a", "b", "c"]) == ["a", "b", "c"]
+
+
+def test_last_winner_goes_first(cache):
+    _set(cache, "c", last_ok_at=200.0)
+    _set(cache, "b", last_ok_at=100.0)
+    assert _order("act", ["a", "b", "c"]) == ["c", "b", "a"]
+
+
+def test_failing_streak_demotes_after_threshold(cache):
+    _set(cache, "a", fail_streak=3, last_ok_at=300.0)  # used to win, now broken
+    _set(cache, "b", fail_streak=2)                      # below the threshold: keeps its place
+    assert _order("act", ["a", "b", "c"]) == ["b", "c", "a"]
+
+
+def _strategy(name, calls, ok):
+    def fn():
+        calls.append(name)
+        if not ok:
+            raise RuntimeError(f"{name} selector broke")
+        return name.upper()
+    return name, fn
+
+
+def test_try_strategies_learns_the_working_one(cache):
+    calls = []
+    strategies = [_strategy("role", calls, False), _strategy("css", calls, True)]
+    assert try_strategies("act", strategies) == ("css", "CSS")
+    assert calls == ["role", "css"]
+
+    calls.clear()
+    assert try_strategies("act", strategies) == ("css", "CSS")
+    assert calls == ["css"]  # the broken selector isn't tried first any more
+    stats = {s["action"]: s for s in cache.stats()}["act"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_learned_order_survives_a_restart(cache, monkeypatch):
+    calls = []
+    try_strategies("act", [_strategy("a", calls, False), _strategy("b", calls, True)])
+    monkeypatch.setattr(selector_cache, "_loaded", False)
+    monkeypatch.setattr(selector_cache, "_strategies", {})
+    monkeypatch.setattr(selector_cache, "_actions", {})
+    calls.clear()
+    try_strategies("act", [_strategy("a", calls, True), _strategy("b", calls, True)])
+    assert calls == ["b"]
+
+
+def test_all_failing_raises_the_last_error(cache):
+    with pytest.raises(RuntimeError, match="b selector broke"):
+        try_strategies("act", [_strategy("a", [], False), _strategy("b", [], False)])
@@ -0,0 +1,96 @@
+# tests/test_sheets_quota.py
+import pytest
+
+import sheets_quota
+from sheets_quota import TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() just moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.slept.append(secs)
+        self.now += secs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sheets_quota, "time", clock)
+    return clock
+
+
+def test_burst_then_paced_at_rate(clock):
+    bucket = TokenBucket(rate_per_min=60, burst=3)  # 1 token/s
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(1.0)]
+    clock.now += 0.5
+    bucket.acquire()
+    assert clock.slept[-1] == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate_per_min=60, burst=2)
+    bucket.acquire(); bucket.acquire()
+    clock.now += 3600
+    bucket.acquire(); bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_default_burst_is_about_ten_seconds_of_quota(clock):
+    assert TokenBucket(rate_per_min=60).capacity == 10
+    assert TokenBucket(rate_per_min=3).capacity == 1.0
+
+
+def test_drain_forces_a_wait(clock):
+    bucket = TokenBucket(rate_per_min=120, burst=5)  # 2 tokens/s
+    bucket.drain()
+    bucket.acquire()
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+class Resp(dict):
+    @property
+    def status(self):
+        return self["status"]
+
+
+class FlakyRequest:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if self.statuses:
+            err = Exception("http")
+            err.resp = Resp(status=self.statuses.pop(0))
+            raise err
+        return {"ok": True}
+
+
+def test_execute_retries_429_and_5xx(clock, monkeypatch):
+    monkeypatch.setattr(sheets_quota, "_buckets", {sheets_quota.READ: TokenBucket(6000, burst=100)})
+    req = FlakyRequest(429, 503)
+    assert sheets_quota.execute(req) == {"ok": True}
+    assert req.calls == 3
+
+
+def test_execute_raises_other_errors_at_once(clock, monkeypatch):
+    monkeypatch.setattr(sheets_quota, "_buckets", {sheets_quota.READ: TokenBucket(6000, burst=100)})
+    req = FlakyRequest(400)
+    with pytest.raises(Exception):
+        sheets_quota.execute(req)
+    assert req.calls == 1
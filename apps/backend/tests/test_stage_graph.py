@@ -0,0 +1,101 @@
+# tests/test_stage_graph.py
+import threading, time
+
+import pytest
+
+stage_graph = pytest.importorskip("stage_graph")
+from stage_graph import Stage, StageRunner, _toposort
+
+
+@pytest.fixture(autouse=True)
+def no_chrome(monkeypatch):
+    """Lanes 'connect' to a fake Chrome: browser/ctx are plain markers."""
+    class Browser:
+        def is_connected(self):
+            return True
+    monkeypatch.setattr(stage_graph, "connect_cdp", lambda port: (object(), Browser(), "ctx"))
+    monkeypatch.setattr(stage_graph, "disconnect_cdp", lambda pw, browser, ctx: None)
+
+
+def _graph(log, fail=()):
+    def make(name):
+        def fn(browser, ctx, upstream):
+            log.append(("start", name, dict(upstream)))
+            time.sleep(0.02)
+            if name in fail:
+                raise RuntimeError(f"{name} broke")
+            log.append(("end", name))
+            return f"{name}-value"
+        return fn
+    return [
+        Stage("profit", make("profit"), deps=("competitors",)),
+        Stage("competitors", make("competitors"), deps=("category",)),
+        Stage("category", make("category")),
+        Stage("monthly", make("monthly")),
+    ]
+
+
+def test_toposort_puts_deps_first():
+    names = [s.name for s in _toposort(_graph([]))]
+    assert names.index("category") < names.index("competitors") < names.index("profit")
+
+
+def test_toposort_rejects_cycles_and_unknown_deps():
+    noop = lambda b, c, u: None
+    with pytest.raises(ValueError, match="cycle"):
+        _toposort([Stage("a", noop, deps=("b",)), Stage("b", noop, deps=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        _toposort([Stage("a", noop, deps=("missing",))])
+
+
+@pytest.mark.parametrize("parallelism", [1, 3])
+def test_stages_run_after_their_deps_with_upstream_values(parallelism):
+    log = []
+    runner = StageRunner(cdp_port=0, parallelism=parallelism)
+    try:
+        out = runner.run(_graph(log), browser="browser", ctx="ctx")
+    finally:
+        runner.close()
+    assert {k: v for k, (v, err) in out.items()} == {
+        "category": "category-value", "competitors": "competitors-value",
+        "profit": "profit-value", "monthly": "monthly-value",
+    }
+    events = [e[:2] for e in log]
+    assert events.index(("end", "category")) < events.index(("start", "competitors"))
+    assert events.index(("end", "competitors")) < events.index(("start", "profit"))
+    starts = {e[1]: e[2] for e in log if e[0] == "start"}
+    assert starts["profit"] == {"competitors": "competitors-value"}
+
+
+@pytest.mark.parametrize("parallelism", [1, 3])
+def test_failure_skips_dependents_only(parallelism):
+    log = []
+    runner = StageRunner(cdp_port=0, parallelism=parallelism)
+    try:
+        out = runner.run(_graph(log, fail=("category",)))
+    finally:
+        runner.close()
+    assert str(out["category"][1]) == "category broke"
+    assert "dependency 'category' failed" in str(out["competitors"][1])
+    assert "dependency 'competitors' failed" in str(out["profit"][1])
+    assert out["monthly"] == ("monthly-value", None)
+    assert {e[1] for e in log if e[0] == "start"} == {"category", "monthly"}
+
+
+def test_independent_stages_overlap():
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def slow(browser, ctx, upstream):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+
+    runner = StageRunner(cdp_port=0, parallelism=3)
+    try:
+        runner.run([Stage(n, slow) for n in ("a", "b", "c")])
+    finally:
+        runner.close()
+    assert peak[0] == 3
@@ -0,0 +1,149 @@
+# worker_pool.py
+import os, shutil, threading, traceback
+from typing import Dict, Any, Callable, List, Optional
+
+import job_store
+from browser_session import BrowserSession
+
+# 0 => legacy single-runner mode (one payload at a time, queue drained by run_scraper_main)
+POOL_SIZE      = int(os.getenv("SCRAPER_POOL_SIZE", "0"))
+POOL_BASE_PORT = int(os.getenv("SCRAPER_POOL_BASE_PORT", "28001"))  # worker i -> BASE + i
+IDLE_POLL_SECS = 5.0
+
+# Profile files that must not be copied into a clone (held by a running Chrome / disposable caches)
+_PROFILE_IGNORE = shutil.ignore_patterns(
+    "Singleton*", "lockfile", "LOCK", "Cache", "Code Cache", "GPUCache", "Crashpad", "ShaderCache"
+)
+
+
+def _clone_profile(template_dir: str, clone_dir: str):
+    """Copy the logged-in automation profile once per worker (Chrome refuses to share a user-data-dir)."""
+    if os.path.isdir(clone_dir):
+        return
+    if os.path.isdir(template_dir):
+        print(f"[POOL] Cloning profile {template_dir} -> {clone_dir}")
+        shutil.copytree(template_dir, clone_dir, ignore=_PROFILE_IGNORE)
+    else:
+        os.makedirs(clone_dir, exist_ok=True)
+
+
+def worker_dirs(base_export_dir: str, index: int) -> Dict[str, str]:
+    """Per-worker download dirs so CSV cleanup in one worker never deletes another's export."""
+    base = os.path.join(base_export_dir, f"w{index}")
+    dirs = {
+        "competitors": base,
+        "monthlyrev": os.path.join(base, "monthlyrev"),
+        "cerebro": os.path.join(base, "cerebro"),
+    }
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+
+class WorkerPool:
+    """
+    N independent Chrome instances (own CDP port, cloned profile, download dirs),
+    each pulling per-product items from the job store concurrently.
+
+    run_item(item, session, dirs) -> product block   (committed by the pool)
+    on_item_done(item, block)                        (optional, after the commit)
+    finalize_job(job_id)                             (called once, after its last item)
+    """
+
+    def __init__(
+        self,
+        size: int,
+        *,
+        run_item: Callable[[Dict[str, Any], BrowserSession, Dict[str, str]], Dict[str, Any]],
+        finalize_job: Callable[[int], None],
+        chrome_path: str,
+        user_data_dir: str,
+        profile_dir: str,
+        ext_id: str,
+        base_export_dir: str,
+        base_port: int = POOL_BASE_PORT,
+        on_item_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+    ):
+        self.size = size
+        self.run_item = run_item
+        self.finalize_job = finalize_job
+        self.on_item_done = on_item_done
+        self.chrome_path = chrome_path
+        self.user_data_dir = user_data_dir
+        self.profile_dir = profile_dir
+        self.ext_id = ext_id
+        self.base_export_dir = base_export_dir
+        self.base_port = base_port
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._busy: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- control ----------
+    def start(self):
+        for i in range(self.size):
+            t = threading.Thread(target=self._worker_main, args=(i,), name=f"scraper-w{i}", daemon=True)
+            self._threads.append(t)
+            t.start()
+        print(f"[POOL] Started {self.size} worker(s)")
+
+    def notify(self):
+        """Wake idle workers (new items were enqueued)."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            active = [
+                {"worker": i, "job_id": it["job_id"], "seq": it["seq"]}
+                for i, it in self._busy.items() if it
+            ]
+        return {"pool_size": self.size, "active_workers": len(active), "active_items": active}
+
+    # ---------- worker loop ----------
+    def _worker_main(self, index: int):
+        clone_dir = f"{self.user_data_dir}-w{index}"
+        _clone_profile(self.user_data_dir, clone_dir)
+        dirs = worker_dirs(self.base_export_dir, index)
+        session = BrowserSession(
+            chrome_path=self.chrome_path,
+            user_data_dir=clone_dir,
+            profile_dir=self.profile_dir,
+            ext_id=self.ext_id,
+            cdp_port=self.base_port + index,
+        )
+
+        while not self._stop.is_set():
+            item = job_store.lease_next_item()
+            if item is None:
+                self._wake.wait(IDLE_POLL_SECS)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                self._busy[index] = item
+            print(f"[POOL] w{index} -> job {item['job_id']} product {item['seq'] + 1}")
+            try:
+                block = self.run_item(item, session, dirs)
+                job_store.complete_item(item["id"], block)
+                if self.on_item_done:
+                    self.on_item_done(item, block)
+            except Exception as e:
+                traceback.print_exc()
+                job_store.fail_item(item["id"], str(e))
+            finally:
+                with self._lock:
+                    self._busy[index] = None
+
+            if job_store.close_job_if_finished(item["job_id"]):
+                try:
+                    self.finalize_job(item["job_id"])
+                except Exception as e:
+                    print(f"[POOL] Finalizing job {item['job_id']} failed: {e}")
+
+        session.release()
@@ -0,0 +1,209 @@
+# xray_capture.py
+import os, re, json, threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# Turn off to always use the CSV export round-trip
+XRAY_NETWORK_CAPTURE = os.getenv("XRAY_NETWORK_CAPTURE", "1").strip().lower() not in ("0", "false", "no")
+
+# Hosts whose JSON responses may carry the XRAY product table
+_CAPTURE_HOSTS = ("helium10.com",)
+
+# CSV column name -> JSON keys seen for the same field (compared after _norm)
+_FIELD_ALIASES = {
+    "ASIN":                 ("asin",),
+    "Product Details":      ("title", "productTitle", "productDetails", "name"),
+    "URL":                  ("url", "productUrl", "link"),
+    "Parent Level Revenue": ("estMonthlyRevenue", "parentLevelRevenue", "parentRevenue", "monthlyRevenue"),
+    "Creation Date":        ("creationDate", "dateFirstAvailable", "firstAvailable", "createdAt"),
+    "Review Count":         ("reviewCount", "reviewsCount", "reviews", "ratingsTotal"),
+    "Brand":                ("brand", "brandName"),
+    "Price  $":             ("price", "buyBoxPrice"),
+}
+
+_ASIN_RX = re.compile(r"^[A-Z0-9]{10}$", re.I)
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", (s or "").lower())
+
+
+_ALIAS_LOOKUP = {_norm(a): col for col, aliases in _FIELD_ALIASES.items() for a in aliases}
+
+
+# ---------- decoding ----------
+def _fmt_date(v: Any) -> str:
+    """Epoch (s/ms) or ISO timestamps -> YYYY-MM-DD (a format csv_picker parses)."""
+    if v is None or v == "":
+        return ""
+    if isinstance(v, (int, float)):
+        ts = v / 1000.0 if v > 10**11 else float(v)
+        return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+    s = str(v).strip()
+    if re.match(r"^\d{4}-\d{2}-\d{2}T", s):
+        return s[:10]
+    return s
+
+
+def _to_row(obj: Dict[str, Any], host: str) -> Optional[Dict[str, str]]:
+    row: Dict[str, str] = {}
+    for k, v in obj.items():
+        col = _ALIAS_LOOKUP.get(_norm(k))
+        if not col or col in row or isinstance(v, (dict, list)):
+            continue
+        row[col] = _fmt_date(v) if col == "Creation Date" else ("" if v is None else str(v))
+    asin = (row.get("ASIN") or "").strip().upper()
+    if not _ASIN_RX.match(asin):
+        return None
+    row["ASIN"] = asin
+    if not row.get("URL"):
+        row["URL"] = f"https://{host}/dp/{asin}"
+    return row
+
+
+def _product_lists(node: Any) -> Iterable[List[Dict[str, Any]]]:
+    """Yield every list of dicts in a JSON document whose items carry an ASIN."""
+    if isinstance(node, list):
+        if node and all(isinstance(x, dict) for x in node[:5]) and any(
+            any(_norm(k) == "asin" for k in x) for x in node[:5]
+        ):
+            yield node
+        for x in node:
+            if isinstance(x, (dict, list)):
+                yield from _product_lists(x)
+    elif isinstance(node, dict):
+        for v in node.values():
+            if isinstance(v, (dict, list)):
+                yield from _product_lists(v)
+
+
+def decode_product_rows(doc: Any, *, host: str = "www.amazon.com") -> List[Dict[str, str]]:
+    """Flatten XRAY JSON into CSV-shaped rows (same column names as the XRAY CSV export)."""
+    rows: List[Dict[str, str]] = []
+    for lst in _product_lists(doc):
+        for obj in lst:
+            row = _to_row(obj, host)
+            if row:
+                rows.append(row)
+    return rows
+
+
+# ---------- capture ----------
+class XrayCapture:
+    """
+    Records Helium JSON responses per page on a BrowserContext, so the XRAY
+    table can be decoded in memory instead of exporting a CSV. The handler
+    only keeps the Response objects; bodies are read lazily by the caller
+    (on the thread that owns the Playwright connection).
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self._lock = threading.Lock()
+        self._by_page: Dict[Any, List[Any]] = {}
+        ctx.on("response", self._on_response)
+
+    def _on_response(self, resp):
+        try:
+            host = urlparse(resp.url).hostname or ""
+            if not host.endswith(_CAPTURE_HOSTS):
+                return
+            if "json" not in (resp.headers.get("content-type", "") or "").lower():
+                return
+            try:
+                page = resp.frame.page
+            except Exception:
+                page = None  # service worker / no frame
+            with self._lock:
+                # drop closed pages so long-lived sessions don't accumulate responses
+                for pg in [p for p in self._by_page if p is not None and p.is_closed()]:
+                    self._by_page.pop(pg, None)
+                self._by_page.setdefault(page, []).append(resp)
+        except Exception:
+            pass
+
+    def product_rows(self, page) -> List[Dict[str, str]]:
+        """Decoded product rows seen for `page`, de-duplicated by ASIN (latest response wins, order kept)."""
+        with self._lock:
+            responses = list(self._by_page.get(page, []))
+        host = urlparse(page.url).hostname or "www.amazon.com"
+        by_asin: Dict[str, Dict[str, str]] = {}
+        for resp in responses:
+            try:
+                doc = json.loads(resp.body())
+            except Exception:
+                continue
+            for row in decode_product_rows(doc, host=host):
+                by_asin[row["ASIN"]] = {**by_asin.get(row["ASIN"], {}), **row}
+        return list(by_asin.values())
+
+    def detach(self):
+        try:
+            self.ctx.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+
+
+_captures: Dict[Any, XrayCapture] = {}
+
+# Rendered XRAY table rows (one Parent Level Revenue cell each); see _table_row_count
+_TABLE_ROW_SELECTOR = "[data-testid='table-cell-estMonthlyRevenue']"
+
+
+def attach_capture(ctx) -> Optional[XrayCapture]:
+    """Start capturing on ctx (idempotent). No-op when XRAY_NETWORK_CAPTURE is off."""
+    if not XRAY_NETWORK_CAPTURE:
+        return None
+    cap = _captures.get(ctx)
+    if cap is None:
+        cap = _captures[ctx] = XrayCapture(ctx)
+        try:
+            ctx.on("close", lambda _ctx: detach_capture(ctx))
+        except Exception:
+            pass
+    return cap
+
+
+def detach_capture(ctx):
+    """Stop capturing on ctx and drop its recorded responses (context closed / driver disconnected)."""
+    cap = _captures.pop(ctx, None)
+    if cap is not None:
+        cap.detach()
+        with cap._lock:
+            cap._by_page.clear()
+
+
+def _table_row_count(page) -> int:
+    try:
+        return int(page.evaluate(f"() => document.querySelectorAll(\"{_TABLE_ROW_SELECTOR}\").length"))
+    except Exception:
+        return 0
+
+
+def captured_rows(page, *, min_rows: int = 1, required: Iterable[str] = ()) -> Optional[List[Dict[str, str]]]:
+    """
+    Rows captured for page's context, or None if capture is off or the data
+    can't stand in for the export: fewer than min_rows, a `required` column
+    missing from some row (an alias guessed wrong), or fewer rows than the
+    XRAY table currently renders (only part of the table was seen, e.g.
+    before Load More, or the rows came from another Helium endpoint).
+    """
+    try:
+        cap = _captures.get(page.context)
+    except Exception:
+        cap = None
+    if cap is None:
+        return None
+    rows = cap.product_rows(page)
+    if len(rows) < min_rows:
+        return None
+    missing = [c for c in required if any(c not in r for r in rows)]
+    if missing:
+        print(f"[CAPTURE] Captured rows lack {', '.join(missing)}; using the export instead.")
+        return None
+    shown = _table_row_count(page)
+    if shown == 0 or len(rows) < shown:
+        print(f"[CAPTURE] Captured {len(rows)} row(s) but the XRAY table shows {shown}; using the export instead.")
+        return None
+    return rows
@@ -0,0 +1,121 @@
+# xray_registry.py
+import re, time, threading
+from typing import Any, Callable, Dict, List, Optional
+
+from playwright.sync_api import Browser, Page
+
+from tab_tracker import track_tabs, AMAZON, XRAY
+
+# Set on <html> once XRAY is confirmed on a page; a navigation (new document) drops it,
+# so a cached page whose marker is gone is stale
+_MARKER_ATTR = "data-xray-ready"
+_SET_MARKER_JS = f"() => {{ document.documentElement.setAttribute('{_MARKER_ATTR}', '1'); return true; }}"
+_HAS_MARKER_JS = f"() => document.documentElement.getAttribute('{_MARKER_ATTR}') === '1'"
+
+_EXPORT_RX = re.compile(r"\bExport\b", re.I)
+
+_lock = threading.Lock()
+_pages: Dict[Any, List[Page]] = {}  # browser -> XRAY pages, most recently confirmed last
+
+
+def _has_overlay(pg: Page) -> bool:
+    """Non-blocking check for the XRAY overlay (its title text or Export button)."""
+    try:
+        if pg.get_by_text("Xray", exact=False).first.is_visible():
+            return True
+        return pg.get_by_role("button", name=_EXPORT_RX).first.is_visible()
+    except Exception:
+        return False
+
+
+def _is_live(pg: Page) -> bool:
+    try:
+        return not pg.is_closed() and bool(pg.evaluate(_HAS_MARKER_JS))
+    except Exception:
+        return False
+
+
+def remember(browser: Browser, pg: Page):
+    """Record pg as hosting a live XRAY overlay (marker injected; tab_tracker tagged XRAY)."""
+    try:
+        pg.evaluate(_SET_MARKER_JS)
+    except Exception:
+        return
+    try:
+        track_tabs(pg.context).mark(pg, XRAY)
+    except Exception:
+        pass
+    with _lock:
+        pages = [p for p in _pages.get(browser, []) if p is not pg and not p.is_closed()]
+        pages.append(pg)
+        _pages[browser] = pages
+
+
+def forget(browser: Browser, pg: Optional[Page] = None):
+    with _lock:
+        if pg is None:
+            _pages.pop(browser, None)
+        else:
+            _pages[browser] = [p for p in _pages.get(browser, []) if p is not pg]
+
+
+def _cached(browser: Browser, match: Optional[Callable[[str], bool]]) -> Optional[Page]:
+    with _lock:
+        pages = list(reversed(_pages.get(browser, [])))
+    for pg in pages:
+        try:
+            if match is not None and not match(pg.url):
+                continue
+        except Exception:
+            continue
+        if _is_live(pg):
+            return pg
+        forget(browser, pg)  # closed, navigated away, or overlay gone
+    return None
+
+
+def _candidates(browser: Browser) -> List[Page]:
+    """Amazon tabs to scan: tab_tracker's XRAY-tagged tabs first, newest first."""
+    out: List[Page] = []
+    for ctx in browser.contexts:
+        tracker = track_tabs(ctx)
+        xray = list(reversed(tracker.tabs(XRAY)))
+        rest = [p for p in reversed(tracker.tabs(AMAZON)) if p not in xray]
+        out.extend(xray + rest)
+    return out
+
+
+def find_xray_page(
+    browser: Browser,
+    *,
+    timeout_ms: int = 1500,
+    match: Optional[Callable[[str], bool]] = None,
+) -> Optional[Page]:
+    """
+    The page hosting a live XRAY overlay (optionally whose URL satisfies
+    match(url)). The last confirmed page is returned straight away while its
+    marker is intact; otherwise Amazon tabs are checked without blocking on
+    each one, repeating until one shows the overlay or timeout_ms passes.
+    """
+    pg = _cached(browser, match)
+    if pg is not None:
+        return pg
+
+    deadline = time.time() + timeout_ms / 1000.0
+    while True:
+        for pg in _candidates(browser):
+            try:
+                if match is not None and not match(pg.url):
+                    continue
+            except Exception:
+                continue
+            if _has_overlay(pg):
+                remember(browser, pg)
+                return pg
+        left_ms = (deadline - time.time()) * 1000
+        if left_ms <= 0:
+            return None
+        try:
+            next(iter(_candidates(browser))).wait_for_timeout(min(150, left_ms))  # let the overlay render
+        except Exception:
+            time.sleep(min(0.15, left_ms / 1000))
@@ -284,7 +284,10 @@ export default function App() {
         if (result.message && result.message.includes("queue")) {
           alert("✅ " + result.message);
         } else {
-          alert("✅ Submitted successfully! The scraper is now running in the background.");
+          const skipped = result.duplicates?.length
+            ? ` (${result.duplicates.length} duplicate product(s) skipped)`
+            : "";
+          alert("✅ Submitted successfully! The scraper is now running in the background." + skipped);
         }
         
         // Reset to step 1 after successful submission